@@ -0,0 +1,6 @@
+"""
+Shared building blocks for the local artifact processors.
+
+The processor entry points (local-artifact-processor.py and friends) are
+plain scripts; anything they need to share lives in this package.
+"""
@@ -0,0 +1,110 @@
+"""
+Fan a list of /process-artifact payloads out over a thread pool.
+
+Results come back in completion order so callers can either collect them
+or stream each one as soon as it is ready.
+
+An item whose handler raises Deferred (detection backend down) is reported
+with status 'deferred' and, given a defer callback, parked as a job the
+caller can poll, the same as a single /process-artifact request.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from artifact_pipeline.jobs import Deferred, QueueFull
+
+logger = logging.getLogger(__name__)
+
+# Item fields that can be given once for the whole batch
+SHARED_FIELDS = ('userId', 'twinId', 'contentType', 'detector', 'faceAttributes')
+
+
+def expand_items(data):
+    """Return the item payloads from a batch request, applying shared fields
+
+    Raises ValueError unless the items are a non-empty list of objects.
+    """
+    if isinstance(data, list):
+        items, shared = data, {}
+    elif isinstance(data, dict):
+        items = data.get('items')
+        shared = {field: data[field] for field in SHARED_FIELDS if field in data}
+    else:
+        raise ValueError("Body must be a JSON object with 'items' or a list of items")
+    if not isinstance(items, list) or not items:
+        raise ValueError("'items' must be a non-empty list")
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"Item {index} must be an object, not {type(item).__name__}")
+    return [{**shared, **item} for item in items]
+
+
+def parse_concurrency(value, default, maximum):
+    """Concurrency from a query arg / body field, capped at maximum; raises ValueError"""
+    if value is None or value == '':
+        return min(default, maximum)
+    try:
+        concurrency = int(value)
+    except (TypeError, ValueError):
+        concurrency = 0
+    if concurrency < 1 or (isinstance(value, float) and value != concurrency):
+        raise ValueError(f"concurrency must be a whole number of at least 1, not {value!r}")
+    return min(concurrency, maximum)
+
+
+def run_item(handler, index, item, defer=None):
+    started = time.time()
+    result = {'index': index, 'fileId': None}
+    try:
+        result['fileId'] = item.get('fileId')
+        result['data'] = handler(item)
+        result['success'] = True
+    except Deferred as e:
+        logger.warning(f"⏸️ Batch item {index} ({result['fileId']}) deferred: {e}")
+        result['success'] = False
+        result['status'] = 'deferred'
+        result['error'] = str(e)
+        result['retryAfter'] = max(1, int(e.retry_after or 30))
+        if defer is not None:
+            try:
+                job = defer(item, e)
+                result['jobId'] = job.id
+                result['statusUrl'] = f'/jobs/{job.id}'
+            except QueueFull as full:
+                result['error'] = str(full)
+    except Exception as e:
+        logger.error(f"❌ Batch item {index} ({result['fileId']}) failed: {e}")
+        result['success'] = False
+        result['error'] = str(e)
+    result['seconds'] = round(time.time() - started, 3)
+    return result
+
+
+def run_batch(items, handler, concurrency=8, defer=None):
+    """Run handler over items concurrently, yielding per-item results as they finish
+
+    defer(item, error) parks a deferred item and returns its Job.
+    """
+    concurrency = max(1, min(concurrency, len(items) or 1))
+    logger.info(f"📦 Processing batch of {len(items)} items ({concurrency} at a time)")
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as executor:
+        futures = [
+            executor.submit(run_item, handler, index, item, defer)
+            for index, item in enumerate(items)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(results, started):
+    succeeded = sum(1 for r in results if r['success'])
+    deferred = sum(1 for r in results if r.get('status') == 'deferred')
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'deferred': deferred,
+        'failed': len(results) - succeeded - deferred,
+        'seconds': round(time.time() - started, 3)
+    }
@@ -0,0 +1,184 @@
+"""
+Circuit breakers around the detection backends.
+
+A breaker watches the last BREAKER_WINDOW calls to a backend. It opens when
+BREAKER_FAILURE_RATE of them failed (with at least BREAKER_MIN_CALLS calls)
+or after BREAKER_CONSECUTIVE_FAILURES failures in a row. Calls slower than
+BREAKER_SLOW_SECONDS count as failures too, so a backend that has become
+uselessly slow trips the breaker the same way an erroring one does.
+
+While open, callers fail fast instead of waiting out a timeout. After
+BREAKER_OPEN_SECONDS the breaker goes half-open and lets one trial call
+through: success closes it, failure opens it again. State changes are
+broadcast to on_state_change listeners (the job queues use this to
+re-queue work that was deferred during the outage).
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+BREAKER_ENABLED = os.environ.get('BREAKER_ENABLED', 'true').lower() == 'true'
+BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', '20'))
+BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', '5'))
+BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_CONSECUTIVE_FAILURES = int(os.environ.get('BREAKER_CONSECUTIVE_FAILURES', '5'))
+BREAKER_SLOW_SECONDS = float(os.environ.get('BREAKER_SLOW_SECONDS', '20'))
+BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', '30'))
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a backend whose breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} backend unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+_listeners = []
+
+
+def on_state_change(callback):
+    """Call callback(name, state) whenever any breaker changes state"""
+    _listeners.append(callback)
+    return callback
+
+
+class CircuitBreaker:
+    def __init__(self, name, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_rate=BREAKER_FAILURE_RATE, consecutive_failures=BREAKER_CONSECUTIVE_FAILURES,
+                 slow_seconds=BREAKER_SLOW_SECONDS, open_seconds=BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.consecutive_failures = consecutive_failures
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._timer = None
+        self._lock = threading.Lock()
+        self._counts = {'calls': 0, 'failures': 0, 'slowCalls': 0, 'rejected': 0, 'opened': 0}
+
+    def retry_after(self):
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self):
+        """Reserve a call; raises CircuitOpen when the backend shouldn't be called"""
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            self._counts['rejected'] += 1
+            retry_after = self.retry_after() or self.open_seconds
+        raise CircuitOpen(self.name, retry_after)
+
+    def record(self, seconds, failed=False):
+        """Report the outcome of a call allowed by allow()"""
+        slow = seconds > self.slow_seconds
+        with self._lock:
+            self._counts['calls'] += 1
+            self._counts['slowCalls'] += slow
+            failed = failed or slow
+            self._counts['failures'] += failed
+            self._outcomes.append(failed)
+            self._consecutive = self._consecutive + 1 if failed else 0
+
+            if self.state == HALF_OPEN:
+                self._trial_running = False
+                self._set_state(OPEN if failed else CLOSED)
+            elif self.state == CLOSED and failed and self._should_open():
+                self._set_state(OPEN)
+
+    def release(self):
+        """Give back a reserved call that never reached the backend"""
+        with self._lock:
+            self._trial_running = False
+
+    def _should_open(self):
+        if self._consecutive >= self.consecutive_failures:
+            return True
+        if len(self._outcomes) < self.min_calls:
+            return False
+        return sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+
+    def _set_state(self, state):
+        # Called with self._lock held
+        if state == self.state:
+            return
+        self.state = state
+        if state == OPEN:
+            self._counts['opened'] += 1
+            self._opened_at = time.monotonic()
+            logger.warning(f"🔌 {self.name} circuit OPEN for {self.open_seconds:.0f}s")
+            # Go half-open on time even if no request arrives to notice
+            self._timer = threading.Timer(self.open_seconds, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+        elif state == CLOSED:
+            self._opened_at = None
+            self._outcomes.clear()
+            self._consecutive = 0
+            logger.info(f"✅ {self.name} circuit closed, backend recovered")
+        else:
+            logger.info(f"🔍 {self.name} circuit half-open, trying one call")
+        threading.Thread(target=self._notify, args=(state,), daemon=True).start()
+
+    def _expire(self):
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._set_state(HALF_OPEN)
+
+    def _notify(self, state):
+        for callback in list(_listeners):
+            try:
+                callback(self.name, state)
+            except Exception as e:
+                logger.error(f"❌ Breaker listener failed: {e}", exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            outcomes = list(self._outcomes)
+            return {
+                'state': self.state,
+                'retryAfter': round(self.retry_after(), 1) if self.state != CLOSED else None,
+                'windowFailureRate': round(sum(outcomes) / len(outcomes), 3) if outcomes else None,
+                **self._counts,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(name):
+    """The process-wide breaker for a backend, or None when BREAKER_ENABLED=false"""
+    if not BREAKER_ENABLED:
+        return None
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def stats():
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in breakers.items()}
@@ -0,0 +1,170 @@
+"""
+Content-addressed cache for content_router results.
+
+Results are keyed by a hash of the image bytes plus the processing options,
+so the same photo processed the same way is only sent through the router
+once. Two tiers: a size-bounded in-memory LRU in front of a JSON-file store
+on disk that survives restarts.
+
+Entries aren't tied to a file: the pipeline relabels a hit with the
+requesting file/user/twin ids.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(image_sha256, options, content_type=None):
+    """sha256 over the image hash and the options that shape the result"""
+    digest = hashlib.sha256(image_sha256.encode('utf-8'))
+    digest.update(json.dumps(options or {}, sort_keys=True).encode('utf-8'))
+    digest.update((content_type or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_memory_bytes=64 * 1024 * 1024, disk_dir=None,
+                 max_disk_bytes=1024 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counts = {
+            'memoryHits': 0, 'diskHits': 0, 'misses': 0,
+            'stores': 0, 'evictions': 0, 'diskEvictions': 0
+        }
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    def get(self, key):
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self._counts['memoryHits'] += 1
+                return json.loads(encoded)
+
+        encoded = self._read_disk(key)
+        if encoded is None:
+            with self._lock:
+                self._counts['misses'] += 1
+            return None
+
+        with self._lock:
+            self._counts['diskHits'] += 1
+            self._remember(key, encoded)
+        return json.loads(encoded)
+
+    def put(self, key, value):
+        encoded = json.dumps(value, default=str).encode('utf-8')
+        with self._lock:
+            self._counts['stores'] += 1
+            self._remember(key, encoded)
+        self._write_disk(key, encoded)
+
+    def _remember(self, key, encoded):
+        # Caller holds the lock
+        if len(encoded) > self.max_memory_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._entries[key] = encoded
+        self._memory_bytes += len(encoded)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counts['evictions'] += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                encoded = f.read()
+            os.utime(path)  # keep recently used entries off the prune list
+            return encoded
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"⚠️ Could not read cached result {key}: {e}")
+            return None
+
+    def _write_disk(self, key, encoded):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(encoded)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write cached result {key}: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += len(encoded) - replaced
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._prune_disk()
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _prune_disk(self):
+        # Oldest first, down to 90% of the budget so we don't prune every write
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._counts['diskEvictions'] += evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counts['memoryHits'] + self._counts['diskHits'] + self._counts['misses']
+            hits = self._counts['memoryHits'] + self._counts['diskHits']
+            return {
+                **self._counts,
+                'hitRate': round(hits / lookups, 3) if lookups else None,
+                'memoryEntries': len(self._entries),
+                'memoryBytes': self._memory_bytes,
+                'maxMemoryBytes': self.max_memory_bytes,
+                'diskDir': self.disk_dir,
+                'diskBytes': self._disk_bytes,
+                'maxDiskBytes': self.max_disk_bytes,
+            }
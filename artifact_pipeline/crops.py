@@ -0,0 +1,239 @@
+"""
+Face crops and image thumbnails, made once at detection time.
+
+The browser used to download the full-resolution original and cut every
+face out on a canvas (js/face-extractor.js), and to draw its own 150x150
+thumbnail on upload (js/thumbnail-generator.js). Instead, right after
+detection we crop each face from the image we already decoded and write:
+
+- a CROP_SIZE x CROP_SIZE JPEG per face: a square around the bounding box
+  with CROP_MARGIN padding, so faces aren't stretched
+- a CROP_SIZE x CROP_SIZE thumbnail of the whole image, letterboxed on white
+  like the client-side thumbnails
+
+Files are content-addressed (image hash + box + size), so their URLs are
+stable and can be cached forever. They're stored under CROP_DIR with a
+CROP_DISK_MB budget, oldest evicted first, and served by the processor at
+/faces/<key>.jpg and /thumbnails/<key>.jpg. URLs are prefixed with
+CROP_BASE_URL.
+
+Needs Pillow; without it results simply carry no crop URLs.
+"""
+
+import io
+import os
+import json
+import hashlib
+import logging
+import threading
+
+from flask import Blueprint, abort, send_file
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+CROPS_ENABLED = os.environ.get('CROPS_ENABLED', 'true').lower() == 'true' and Image is not None
+CROP_SIZE = int(os.environ.get('CROP_SIZE', '150'))
+CROP_MARGIN = float(os.environ.get('CROP_MARGIN', '0.2'))
+CROP_QUALITY = int(os.environ.get('CROP_QUALITY', '85'))
+CROP_BASE_URL = os.environ.get('CROP_BASE_URL', 'http://localhost:8080').rstrip('/')
+
+
+class CropStore:
+    """Content-addressed JPEG files on disk with a size budget"""
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counts = {'written': 0, 'reused': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._entries())
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.jpg')
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, key, data):
+        path = self.path(key)
+        if os.path.exists(path):
+            with self._lock:
+                self._counts['reused'] += 1
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._counts['written'] += 1
+            self._bytes += len(data)
+            over = self._bytes > self.max_bytes
+        if over:
+            self._prune()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.jpg'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _prune(self):
+        # Oldest first, down to 90% of the budget
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._bytes = total
+            self._counts['evictions'] += evicted
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, 'bytes': self._bytes, 'maxBytes': self.max_bytes, 'dir': self.directory}
+
+
+store = CropStore(
+    os.environ.get('CROP_DIR', os.path.expanduser('~/.cache/infitwin/crops')),
+    max_bytes=int(os.environ.get('CROP_DISK_MB', '512')) * 1024 * 1024
+) if CROPS_ENABLED else None
+
+
+def crop_key(kind, image_sha256, box=None):
+    """Stable key for one crop of one image"""
+    digest = hashlib.sha256(f'{kind}:{image_sha256}:{CROP_SIZE}:{CROP_MARGIN}'.encode('utf-8'))
+    if box is not None:
+        digest.update(json.dumps(box, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def crop_url(kind, key):
+    return f'{CROP_BASE_URL}/{kind}/{key}.jpg'
+
+
+def _encode(image):
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, format='JPEG', quality=CROP_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def face_crop(image, box):
+    """Square CROP_SIZE crop around a ratio bounding box"""
+    width, height = image.size
+    center_x = (box.get('Left', 0) + box.get('Width', 0) / 2) * width
+    center_y = (box.get('Top', 0) + box.get('Height', 0) / 2) * height
+    side = max(box.get('Width', 0) * width, box.get('Height', 0) * height) * (1 + 2 * CROP_MARGIN)
+    side = max(side, 1)
+    region = (
+        round(center_x - side / 2), round(center_y - side / 2),
+        round(center_x + side / 2), round(center_y + side / 2)
+    )
+    # crop() pads regions past the edge with black; pad with white instead
+    face = Image.new('RGB', (region[2] - region[0], region[3] - region[1]), (255, 255, 255))
+    clipped = image.crop((max(region[0], 0), max(region[1], 0), min(region[2], width), min(region[3], height)))
+    face.paste(clipped.convert('RGB'), (max(-region[0], 0), max(-region[1], 0)))
+    return face.resize((CROP_SIZE, CROP_SIZE), Image.LANCZOS)
+
+
+def thumbnail(image):
+    """Whole image scaled into CROP_SIZE x CROP_SIZE, centered on white"""
+    scaled = image.convert('RGB')
+    scaled.thumbnail((CROP_SIZE, CROP_SIZE), Image.LANCZOS)
+    canvas = Image.new('RGB', (CROP_SIZE, CROP_SIZE), (255, 255, 255))
+    canvas.paste(scaled, ((CROP_SIZE - scaled.width) // 2, (CROP_SIZE - scaled.height) // 2))
+    return canvas
+
+
+def _open(prepared):
+    """The decoded, upright image detection saw"""
+    if getattr(prepared, 'image', None) is not None:
+        return prepared.image
+    with Image.open(prepared.path) as image:
+        return ImageOps.exif_transpose(image).copy()
+
+
+def attach(result, prepared, image_sha256):
+    """Write crops for a detection result and add their URLs to it
+
+    Adds thumbnailUrl to every face with a bounding box, and thumbnailUrl
+    for the whole image to the analysis.
+    """
+    analysis = result.get('analysis') if isinstance(result, dict) else None
+    if store is None or not isinstance(analysis, dict):
+        return result
+    try:
+        image = _open(prepared)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not decode image for crops: {e}")
+        return result
+
+    key = crop_key('thumbnails', image_sha256)
+    if not store.exists(key):
+        store.put(key, _encode(thumbnail(image)))
+    analysis['thumbnailUrl'] = crop_url('thumbnails', key)
+
+    for face in analysis.get('faces') or []:
+        box = face.get('boundingBox') or face.get('BoundingBox')
+        if not isinstance(box, dict):
+            continue
+        key = crop_key('faces', image_sha256, box)
+        try:
+            if not store.exists(key):
+                store.put(key, _encode(face_crop(image, box)))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not crop {face.get('faceId')}: {e}")
+            continue
+        face['thumbnailUrl'] = crop_url('faces', key)
+    return result
+
+
+def available(result):
+    """True if every crop a (cached) result points to is still on disk"""
+    analysis = result.get('analysis') if isinstance(result, dict) else None
+    if store is None or not isinstance(analysis, dict):
+        return True
+    urls = [analysis.get('thumbnailUrl')] + [face.get('thumbnailUrl') for face in analysis.get('faces') or []]
+    for url in urls:
+        if url and not store.exists(url.rsplit('/', 1)[-1][:-len('.jpg')]):
+            return False
+    return True
+
+
+def stats():
+    return store.stats() if store is not None else {'enabled': False}
+
+
+# GET /faces/<key>.jpg and /thumbnails/<key>.jpg
+blueprint = Blueprint('crops', __name__)
+
+
+@blueprint.route('/<any(faces, thumbnails):kind>/<key>.jpg', methods=['GET'])
+def serve(kind, key):
+    if store is None or len(key) != 64 or not all(c in '0123456789abcdef' for c in key):
+        abort(404)
+    path = store.path(key)
+    if not os.path.exists(path):
+        abort(404)
+    response = send_file(path, mimetype='image/jpeg', etag=key, max_age=31536000, conditional=True)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
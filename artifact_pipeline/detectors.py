@@ -0,0 +1,323 @@
+"""
+Pluggable face-detection backends.
+
+Every backend exposes route_content(file_path, content_type, options,
+metadata) and returns content_router's result shape:
+{'analysis': {'faces': [{'faceId', 'confidence', 'boundingBox',
+'landmarks', 'embedding', ...}], ...}}.
+
+- router: the ArtifactProcessor content_router (Rekognition behind it)
+- mock:   the offline MockBackend (MOCK_* settings)
+- rekognition: DetectFaces through the shared client in rekognition.py
+  (pooled, rate limited, record/replay). faceAttributes=ALL on a request
+  asks for emotions/age/gender, DEFAULT (REKOGNITION_ATTRIBUTES) otherwise
+- local:  on-CPU detection with OpenCV. Uses YuNet (LOCAL_FACE_DETECTOR_MODEL)
+          if configured, otherwise OpenCV 4's bundled Haar cascade. Adds SFace
+          embeddings when LOCAL_FACE_EMBEDDER_MODEL is set. These are 128-d
+          and not comparable with the router's 512-d embeddings: results
+          name their embedding space in embeddingModel/embeddingDimension
+
+ARTIFACT_BACKEND picks the deployment default. A request can pick another
+backend with its 'detector' field unless DETECTOR_PER_REQUEST=false.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+
+from artifact_pipeline import rekognition
+from artifact_pipeline.mock_backend import MockBackend
+from artifact_pipeline.router import router
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    cv2 = np = None
+
+logger = logging.getLogger(__name__)
+
+DETECTORS = ('router', 'mock', 'rekognition', 'local')
+DEFAULT_DETECTOR = os.environ.get('ARTIFACT_BACKEND', 'router').lower()
+DETECTOR_PER_REQUEST = os.environ.get('DETECTOR_PER_REQUEST', 'true').lower() == 'true'
+ROUTER_WAIT_SECONDS = float(os.environ.get('ROUTER_WAIT_SECONDS', '60'))
+
+REKOGNITION_ATTRIBUTES = os.environ.get('REKOGNITION_ATTRIBUTES', 'DEFAULT')
+
+LOCAL_DETECTOR_MODEL = os.environ.get('LOCAL_FACE_DETECTOR_MODEL')
+LOCAL_EMBEDDER_MODEL = os.environ.get('LOCAL_FACE_EMBEDDER_MODEL')
+LOCAL_SCORE_THRESHOLD = float(os.environ.get('LOCAL_FACE_SCORE_THRESHOLD', '0.8'))
+LOCAL_MIN_FACE_PIXELS = int(os.environ.get('LOCAL_MIN_FACE_PIXELS', '40'))
+
+# Name of the local embedding space, tagged on results so it isn't mixed with others
+LOCAL_EMBEDDING_MODEL = 'opencv-sface'
+SFACE_DIMENSION = 128
+
+# YuNet's five landmarks, in output order, with Rekognition's names
+YUNET_LANDMARKS = ('eyeRight', 'eyeLeft', 'nose', 'mouthRight', 'mouthLeft')
+
+
+class UnknownDetector(ValueError):
+    """Raised for a detector name that isn't configured."""
+
+
+class DetectorUnavailable(RuntimeError):
+    """Raised when a backend's dependencies or models are missing."""
+
+
+# A typo in ARTIFACT_BACKEND would otherwise only show up as a 400 on every request
+if DEFAULT_DETECTOR not in DETECTORS:
+    raise UnknownDetector(
+        f"ARTIFACT_BACKEND={DEFAULT_DETECTOR!r} is not a detector (expected one of {', '.join(DETECTORS)})"
+    )
+
+
+class RouterDetector:
+    """content_router, waiting for the warm-up instead of importing inline"""
+
+    name = 'router'
+
+    def route_content(self, **kwargs):
+        router.start_warmup()
+        if not router.wait(ROUTER_WAIT_SECONDS):
+            raise router.unavailable()
+        # Raises RouterUnavailable while a failed import waits for its retry
+        return router.route_content(**kwargs)
+
+    def status(self):
+        return router.status()
+
+
+class MockDetector(MockBackend):
+    name = 'mock'
+
+    def status(self):
+        return {'ready': True, **self.stats()}
+
+
+class RekognitionDetector:
+    """DetectFaces directly, without content_router's extra analysis"""
+
+    name = 'rekognition'
+
+    def __init__(self, client=rekognition.client):
+        self.client = client
+
+    def route_content(self, file_path, content_type, options, metadata):
+        with open(file_path, 'rb') as f:
+            image_bytes = f.read()
+        attributes = (options or {}).get('face_attributes') or REKOGNITION_ATTRIBUTES
+        response = self.client.detect_faces(image_bytes, attributes=attributes)
+        faces = rekognition.faces_from_response(response)
+        return {
+            'analysis': {
+                'faces': faces,
+                'faceCount': len(faces),
+                'metadata': {
+                    'processed_by': 'rekognition',
+                    'artifact_id': (metadata or {}).get('artifact_id')
+                }
+            }
+        }
+
+    def status(self):
+        return {'ready': True, **self.client.stats()}
+
+
+class LocalDetector:
+    """CPU face detection with OpenCV; models are loaded once per thread"""
+
+    name = 'local'
+
+    def __init__(self, detector_model=LOCAL_DETECTOR_MODEL, embedder_model=LOCAL_EMBEDDER_MODEL,
+                 score_threshold=LOCAL_SCORE_THRESHOLD, min_face_pixels=LOCAL_MIN_FACE_PIXELS):
+        if cv2 is None:
+            raise DetectorUnavailable("The local detector needs opencv-python (pip install opencv-python-headless)")
+        for path in (detector_model, embedder_model):
+            if path and not os.path.exists(path):
+                raise DetectorUnavailable(f"Model file not found: {path}")
+        if not detector_model and not hasattr(cv2, 'CascadeClassifier'):
+            # OpenCV 5 moved the cascades out of the main package
+            raise DetectorUnavailable("Set LOCAL_FACE_DETECTOR_MODEL to a YuNet .onnx file")
+        self.detector_model = detector_model
+        self.embedder_model = embedder_model
+        self.score_threshold = score_threshold
+        self.min_face_pixels = min_face_pixels
+        # OpenCV's DNN objects aren't safe to share between threads
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts = {'calls': 0, 'faces': 0, 'seconds': 0.0}
+        self.embedding_model = LOCAL_EMBEDDING_MODEL if embedder_model else None
+        self.embedding_dimension = SFACE_DIMENSION if embedder_model else None
+        if not embedder_model:
+            logger.warning(
+                "⚠️ Local detector has no LOCAL_FACE_EMBEDDER_MODEL: faces will come back without embeddings"
+            )
+
+    @property
+    def model(self):
+        return 'yunet' if self.detector_model else 'haar'
+
+    def _models(self):
+        models = getattr(self._local, 'models', None)
+        if models is None:
+            if self.detector_model:
+                detector = cv2.FaceDetectorYN.create(
+                    self.detector_model, '', (320, 320), self.score_threshold
+                )
+            else:
+                detector = cv2.CascadeClassifier(
+                    os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+                )
+            embedder = cv2.FaceRecognizerSF.create(self.embedder_model, '') if self.embedder_model else None
+            models = self._local.models = (detector, embedder)
+        return models
+
+    def _detect_yunet(self, detector, image):
+        height, width = image.shape[:2]
+        detector.setInputSize((width, height))
+        _, rows = detector.detect(image)
+        faces = []
+        for row in rows if rows is not None else []:
+            x, y, w, h = (float(v) for v in row[:4])
+            if min(w, h) < self.min_face_pixels:
+                continue
+            landmarks = [
+                {'Type': name, 'X': float(row[4 + 2 * i]) / width, 'Y': float(row[5 + 2 * i]) / height}
+                for i, name in enumerate(YUNET_LANDMARKS)
+            ]
+            faces.append(((x, y, w, h), float(row[14]) * 100, landmarks, row))
+        return faces
+
+    def _detect_haar(self, detector, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        boxes = detector.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5,
+            minSize=(self.min_face_pixels, self.min_face_pixels)
+        )
+        # The cascade has no calibrated score
+        return [(tuple(float(v) for v in box), None, [], None) for box in boxes]
+
+    def _embed(self, embedder, image, box, row):
+        if row is not None:
+            aligned = embedder.alignCrop(image, row)
+        else:
+            x, y, w, h = (int(v) for v in box)
+            aligned = cv2.resize(image[max(y, 0):y + h, max(x, 0):x + w], (112, 112))
+        vector = embedder.feature(aligned).flatten()
+        norm = math.sqrt(float(np.dot(vector, vector))) or 1.0
+        return [float(v) / norm for v in vector]
+
+    def detect(self, image, embeddings=True):
+        """Faces in a BGR image, Rekognition-style (ratios of the image size)"""
+        detector, embedder = self._models()
+        height, width = image.shape[:2]
+        if self.detector_model:
+            found = self._detect_yunet(detector, image)
+        else:
+            found = self._detect_haar(detector, image)
+
+        faces = []
+        for index, (box, confidence, landmarks, row) in enumerate(found):
+            x, y, w, h = box
+            face = {
+                'faceId': f'face_{index}',
+                'confidence': round(confidence, 4) if confidence is not None else None,
+                'boundingBox': {'Width': w / width, 'Height': h / height, 'Left': x / width, 'Top': y / height},
+                'landmarks': landmarks,
+            }
+            if embeddings and embedder is not None:
+                face['embedding'] = self._embed(embedder, image, box, row)
+                face['embeddingModel'] = self.embedding_model
+            faces.append(face)
+        return faces
+
+    def route_content(self, file_path, content_type, options, metadata):
+        """Same call signature and result shape as content_router.route_content"""
+        started = time.time()
+        image = cv2.imread(file_path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Local detector could not decode {content_type} image")
+        wants_embeddings = (options or {}).get('generate_embeddings', True)
+        faces = self.detect(image, embeddings=wants_embeddings)
+        with self._lock:
+            self._counts['calls'] += 1
+            self._counts['faces'] += len(faces)
+            self._counts['seconds'] += time.time() - started
+        analysis = {
+            'faces': faces,
+            'faceCount': len(faces),
+            'embeddingModel': self.embedding_model if wants_embeddings else None,
+            'embeddingDimension': self.embedding_dimension if wants_embeddings else None,
+            'metadata': {
+                'processed_by': f'local-{self.model}',
+                'artifact_id': (metadata or {}).get('artifact_id')
+            }
+        }
+        if wants_embeddings and self.embedding_model is None:
+            analysis['embeddingWarning'] = (
+                "Embeddings were requested but the local detector has none (set LOCAL_FACE_EMBEDDER_MODEL)"
+            )
+        return {'analysis': analysis}
+
+    def status(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['seconds'] = round(counts['seconds'], 3)
+        return {
+            'ready': True,
+            'model': self.model,
+            'embeddings': self.embedder_model is not None,
+            'embeddingModel': self.embedding_model,
+            'embeddingDimension': self.embedding_dimension,
+            **counts,
+        }
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def resolve(name=None):
+    """Validated detector name for a request (None = deployment default)"""
+    if not name or not DETECTOR_PER_REQUEST:
+        return DEFAULT_DETECTOR
+    name = str(name).lower()
+    if name not in DETECTORS:
+        raise UnknownDetector(f"Unknown detector '{name}' (expected one of {', '.join(DETECTORS)})")
+    return name
+
+
+def get(name=None):
+    """The (process-wide) backend instance for a detector name"""
+    name = resolve(name)
+    with _instances_lock:
+        backend = _instances.get(name)
+        if backend is None:
+            if name == 'router':
+                backend = RouterDetector()
+            elif name == 'mock':
+                backend = MockDetector.from_env()
+            elif name == 'rekognition':
+                backend = RekognitionDetector()
+            elif name == 'local':
+                backend = LocalDetector()
+            else:
+                raise UnknownDetector(f"Unknown detector '{name}'")
+            _instances[name] = backend
+        return backend
+
+
+def status():
+    """Default backend's readiness, plus any other backends in use"""
+    try:
+        current = {'backend': DEFAULT_DETECTOR, **get(DEFAULT_DETECTOR).status()}
+    except (DetectorUnavailable, UnknownDetector) as e:
+        current = {'backend': DEFAULT_DETECTOR, 'ready': False, 'error': str(e)}
+    with _instances_lock:
+        others = {name: backend for name, backend in _instances.items() if name != DEFAULT_DETECTOR}
+    if others:
+        current['others'] = {name: backend.status() for name, backend in others.items()}
+    return current
@@ -0,0 +1,106 @@
+"""
+Compact wire encodings for embedding vectors.
+
+By default embeddings go out as JSON float lists. Clients can ask for a
+packed form instead with ?embedding=<name> or an Accept parameter
+(Accept: application/json; embedding=<name>):
+
+  f32   base64 of little-endian float32            (exact)
+  f16   base64 of little-endian float16            (~1e-3 relative error)
+  int8  base64 of int8 values, x ~= value * scale  (smallest)
+
+Packed vectors look like
+  {"encoding": "f16", "length": 512, "data": "..."}
+with an extra "scale" for int8.
+"""
+
+import base64
+import struct
+
+ENCODINGS = ('json', 'f32', 'f16', 'int8')
+
+
+class UnknownEncoding(ValueError):
+    """Raised for an embedding encoding we don't support."""
+
+
+# Keys whose numeric lists are treated as embeddings
+EMBEDDING_KEYS = ('embedding', 'embeddings', 'vector')
+
+
+def negotiate(args, accept_header):
+    """Pick the encoding from ?embedding= or the Accept header's embedding param"""
+    requested = args.get('embedding')
+    if not requested and accept_header:
+        for media_range in accept_header.split(','):
+            for param in media_range.split(';')[1:]:
+                name, _, value = param.strip().partition('=')
+                if name.strip() == 'embedding':
+                    requested = value.strip().strip('"')
+                    break
+    requested = (requested or 'json').lower()
+    if requested not in ENCODINGS:
+        raise UnknownEncoding(f"Unknown embedding encoding '{requested}' (use one of {', '.join(ENCODINGS)})")
+    return requested
+
+
+def encode_vector(vector, encoding):
+    n = len(vector)
+    if encoding == 'f32':
+        packed = struct.pack(f'<{n}f', *vector)
+        return {'encoding': 'f32', 'length': n, 'data': base64.b64encode(packed).decode('ascii')}
+    if encoding == 'f16':
+        packed = struct.pack(f'<{n}e', *vector)
+        return {'encoding': 'f16', 'length': n, 'data': base64.b64encode(packed).decode('ascii')}
+    if encoding == 'int8':
+        peak = max((abs(v) for v in vector), default=0.0)
+        scale = peak / 127 if peak else 1.0
+        packed = struct.pack(f'<{n}b', *(round(v / scale) for v in vector))
+        return {
+            'encoding': 'int8', 'length': n, 'scale': scale,
+            'data': base64.b64encode(packed).decode('ascii')
+        }
+    raise UnknownEncoding(f"Unknown embedding encoding '{encoding}'")
+
+
+def decode_vector(packed):
+    """Inverse of encode_vector; plain lists are returned unchanged"""
+    if isinstance(packed, list):
+        return packed
+    raw = base64.b64decode(packed['data'])
+    n = packed['length']
+    encoding = packed['encoding']
+    if encoding == 'f32':
+        return list(struct.unpack(f'<{n}f', raw))
+    if encoding == 'f16':
+        return list(struct.unpack(f'<{n}e', raw))
+    if encoding == 'int8':
+        scale = packed['scale']
+        return [q * scale for q in struct.unpack(f'<{n}b', raw)]
+    raise UnknownEncoding(f"Unknown embedding encoding '{encoding}'")
+
+
+def _is_vector(value):
+    return (
+        isinstance(value, list) and value
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+    )
+
+
+def encode_embeddings(value, encoding):
+    """Return a copy of value with embedding vectors packed; 'json' is a no-op"""
+    if encoding == 'json':
+        return value
+    if isinstance(value, dict):
+        encoded = {}
+        for key, item in value.items():
+            if key in EMBEDDING_KEYS and _is_vector(item):
+                encoded[key] = encode_vector(item, encoding)
+            elif key in EMBEDDING_KEYS and isinstance(item, list) and item and all(_is_vector(v) for v in item):
+                encoded[key] = [encode_vector(v, encoding) for v in item]
+            else:
+                encoded[key] = encode_embeddings(item, encoding)
+        return encoded
+    if isinstance(value, list):
+        return [encode_embeddings(item, encoding) for item in value]
+    return value
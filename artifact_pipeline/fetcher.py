@@ -0,0 +1,238 @@
+"""
+Shared HTTP downloader for fileUrl images.
+
+One requests.Session per process so connections to Firebase Storage are
+pooled and kept alive. Bodies stream straight into a ScratchImage (size
+capped, hashed as they arrive) with connect/read/total timeouts and
+retry-with-backoff on transient errors. Responses with an ETag or
+Last-Modified are kept in a local blob cache and revalidated with
+If-None-Match / If-Modified-Since, so an unchanged blob is only downloaded
+once.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from artifact_pipeline.uploads import ScratchImage, MAX_UPLOAD_BYTES, CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadError(Exception):
+    """Raised when an image URL can't be fetched."""
+
+
+def _content_length(value):
+    """Content-Length as an int, or None when missing or malformed"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+class Fetcher:
+    def __init__(self, pool_size=16, retries=3, backoff=0.5, connect_timeout=5,
+                 read_timeout=30, total_timeout=60, max_bytes=MAX_UPLOAD_BYTES,
+                 cache_dir=None, max_cache_bytes=512 * 1024 * 1024):
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self._lock = threading.Lock()
+        self._counts = {
+            'requests': 0, 'downloaded': 0, 'notModified': 0,
+            'failed': 0, 'bytes': 0, 'cacheEvictions': 0
+        }
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._cache_bytes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._cache_bytes = sum(size for _, size, _ in self._cache_entries())
+
+    def fetch(self, url):
+        """Download url into a ScratchImage, revalidating any cached copy"""
+        with self._lock:
+            self._counts['requests'] += 1
+
+        blob_path, meta = self._cached(url)
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('lastModified'):
+                headers['If-Modified-Since'] = meta['lastModified']
+
+        started = time.time()
+        try:
+            response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+        except requests.RequestException as e:
+            self._count('failed')
+            raise DownloadError(f"Failed to download image: {e}")
+
+        with response:
+            if response.status_code == 304 and meta:
+                logger.info(f"♻️ Not modified, using cached blob for {url[:80]}")
+                self._count('notModified')
+                os.utime(blob_path)
+                with open(blob_path, 'rb') as f:
+                    return ScratchImage.from_stream(f, max_bytes=None)
+
+            if response.status_code != 200:
+                self._count('failed')
+                raise DownloadError(f"Failed to download image: {response.status_code}")
+
+            # A malformed Content-Length is ignored; max_bytes still caps the stream
+            length = _content_length(response.headers.get('Content-Length'))
+            if length is not None and length > self.max_bytes:
+                self._count('failed')
+                raise DownloadError(f"Image too large: {length} bytes")
+
+            scratch = ScratchImage(max_bytes=self.max_bytes)
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    scratch.write(chunk)
+                    if time.time() - started > self.total_timeout:
+                        raise DownloadError(f"Download exceeded {self.total_timeout}s")
+                scratch.close()
+            except Exception as e:
+                scratch.cleanup()
+                self._count('failed')
+                if isinstance(e, DownloadError):
+                    raise
+                raise DownloadError(f"Failed to download image: {e}")
+
+        with self._lock:
+            self._counts['downloaded'] += 1
+            self._counts['bytes'] += scratch.size
+        logger.info(f"📥 Downloaded {scratch.size} bytes in {time.time() - started:.2f}s")
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if self.cache_dir and (etag or last_modified):
+            self._store(url, scratch, {'etag': etag, 'lastModified': last_modified})
+        return scratch
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f'{base}.blob', f'{base}.json'
+
+    def _cached(self, url):
+        if not self.cache_dir:
+            return None, None
+        blob_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        if not os.path.exists(blob_path):
+            return None, None
+        return blob_path, meta
+
+    def _store(self, url, scratch, meta):
+        blob_path, meta_path = self._paths(url)
+        try:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            replaced = os.path.getsize(blob_path) if os.path.exists(blob_path) else 0
+            tmp_path = f'{blob_path}.{threading.get_ident()}.tmp'
+            try:
+                # The scratch file is removed after processing; a hard link
+                # keeps the bytes without a second copy when on the same disk
+                os.link(scratch.path, tmp_path)
+            except OSError:
+                shutil.copyfile(scratch.path, tmp_path)
+            os.replace(tmp_path, blob_path)
+            with open(f'{meta_path}.tmp', 'w') as f:
+                json.dump({**meta, 'url': url, 'sha256': scratch.sha256, 'size': scratch.size}, f)
+            os.replace(f'{meta_path}.tmp', meta_path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not cache downloaded blob: {e}")
+            return
+
+        with self._lock:
+            self._cache_bytes += scratch.size - replaced
+            over_budget = self._cache_bytes > self.max_cache_bytes
+        if over_budget:
+            self._prune()
+
+    def _cache_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.blob'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _prune(self):
+        # Oldest first, down to 90% of the budget
+        entries = sorted(self._cache_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_cache_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            for stale in (path, path[:-len('.blob')] + '.json'):
+                try:
+                    os.unlink(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._cache_bytes = total
+            self._counts['cacheEvictions'] += evicted
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                'cacheDir': self.cache_dir,
+                'cacheBytes': self._cache_bytes,
+                'maxCacheBytes': self.max_cache_bytes,
+            }
+
+
+# One pooled fetcher per process
+fetcher = Fetcher(
+    pool_size=int(os.environ.get('FETCH_POOL_SIZE', '16')),
+    retries=int(os.environ.get('FETCH_RETRIES', '3')),
+    connect_timeout=float(os.environ.get('FETCH_CONNECT_TIMEOUT', '5')),
+    read_timeout=float(os.environ.get('FETCH_READ_TIMEOUT', '30')),
+    total_timeout=float(os.environ.get('FETCH_TOTAL_TIMEOUT', '60')),
+    cache_dir=os.environ.get(
+        'FETCH_CACHE_DIR', os.path.expanduser('~/.cache/infitwin/blobs')
+    ) or None,
+    max_cache_bytes=int(os.environ.get('FETCH_CACHE_MB', '512')) * 1024 * 1024
+)
@@ -0,0 +1,268 @@
+"""
+Bounded background job queue for artifact processing.
+
+POST handlers enqueue a payload and return a job id straight away; a fixed
+pool of worker threads drains the queue. Finished jobs are kept (up to a
+limit) so clients can poll GET /jobs/<id> for the result.
+
+A handler that raises Deferred parks its job instead of failing it;
+requeue_deferred() puts parked jobs back on the queue (e.g. once the
+detection backend has recovered).
+"""
+
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Deferred(Exception):
+    """Raised by a handler to park its job until requeue_deferred()
+
+    kwargs replace the handler keyword arguments for the retry.
+    """
+
+    def __init__(self, message, retry_after=None, **kwargs):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.kwargs = kwargs
+
+
+class Job:
+    def __init__(self, payload, kwargs=None):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.kwargs = kwargs or {}
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.queued_at = time.time()
+        self.enqueued_at = self.queued_at  # last time it went on the queue
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        job = {
+            'jobId': self.id,
+            'fileId': self.payload.get('fileId'),
+            'status': self.status,
+            'timings': {
+                'queuedAt': self.queued_at,
+                'startedAt': self.started_at,
+                'finishedAt': self.finished_at,
+                'waitSeconds': _elapsed(self.queued_at, self.started_at),
+                'runSeconds': _elapsed(self.started_at, self.finished_at),
+            }
+        }
+        if self.status == 'completed':
+            job['result'] = {'success': True, 'data': self.result}
+        elif self.status == 'failed':
+            job['result'] = {'success': False, 'error': self.error}
+        elif self.status == 'deferred':
+            job['result'] = {'success': False, 'status': 'deferred', 'error': self.error}
+        return job
+
+
+def _elapsed(start, end):
+    if start is None or end is None:
+        return None
+    return round(end - start, 3)
+
+
+class JobQueue:
+    """Fixed worker pool fed from a bounded FIFO queue."""
+
+    def __init__(self, handler, workers=4, max_queue=100, retain=1000, max_deferred=1000, name='jobs'):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retain = retain
+        self.max_deferred = max_deferred
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._deferred = OrderedDict()
+        self._draining = False
+        self._lock = threading.Lock()
+        self._active = 0
+        self._accepting = True
+        self._threads = []
+        self._counts = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'deferred': 0, 'requeued': 0}
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, name=f'{self.name}-worker-{i}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"🧵 Started {self.workers} {self.name} workers (queue size {self.max_queue})")
+
+    def submit(self, payload, **kwargs):
+        """Queue a payload and return its Job; raises QueueFull at capacity
+
+        Extra keyword arguments are passed through to the handler.
+        """
+        self.start()
+        job = Job(payload, kwargs)
+        with self._lock:
+            if not self._accepting:
+                self._counts['rejected'] += 1
+                raise QueueFull(f"{self.name} queue is shutting down")
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._counts['rejected'] += 1
+                raise QueueFull(f"{self.name} queue is full ({self.max_queue} pending)")
+            self._jobs[job.id] = job
+            self._counts['submitted'] += 1
+            self._evict()
+        return job
+
+    def defer(self, payload, error=None, **kwargs):
+        """Park a payload as a deferred job without running it; raises QueueFull at capacity"""
+        job = Job(payload, kwargs)
+        job.status = 'deferred'
+        job.error = error
+        with self._lock:
+            if len(self._deferred) >= self.max_deferred:
+                self._counts['rejected'] += 1
+                raise QueueFull(f"{self.name} has {self.max_deferred} deferred jobs already")
+            self._jobs[job.id] = job
+            self._deferred[job.id] = job
+            self._counts['submitted'] += 1
+            self._counts['deferred'] += 1
+            self._evict()
+        return job
+
+    def requeue_deferred(self, limit=None):
+        """Move up to limit deferred jobs (oldest first) back onto the queue
+
+        Without a limit, whatever doesn't fit now follows as workers free up,
+        until a job is deferred again.
+        """
+        self.start()
+        with self._lock:
+            if limit is None:
+                self._draining = True
+            moved = self._requeue(limit)
+        if moved:
+            logger.info(f"🔁 Re-queued {moved} deferred {self.name} jobs")
+        return moved
+
+    def _requeue(self, limit=None):
+        # Called with self._lock held
+        moved = 0
+        for job_id in list(self._deferred):
+            if limit is not None and moved >= limit:
+                break
+            job = self._deferred[job_id]
+            job.status = 'queued'
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                job.status = 'deferred'
+                break
+            del self._deferred[job_id]
+            # The deferral's error and timings don't describe the retry
+            job.error = None
+            job.finished_at = None
+            job.enqueued_at = time.time()
+            moved += 1
+        self._counts['requeued'] += moved
+        return moved
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict(self):
+        # Drop the oldest finished jobs once we're over the retention limit
+        excess = len(self._jobs) - self.retain
+        if excess <= 0:
+            return
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].status in ('completed', 'failed'):
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._active += 1
+                job.status = 'running'
+                job.started_at = time.time()
+            try:
+                job.result = self.handler(job.payload, **job.kwargs)
+                job.status = 'completed'
+            except Deferred as e:
+                logger.warning(f"⏸️ Job {job.id} deferred: {e}")
+                job.error = str(e)
+                job.kwargs.update(e.kwargs)
+                job.status = 'deferred'
+            except Exception as e:
+                logger.error(f"❌ Job {job.id} failed: {e}", exc_info=True)
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._active -= 1
+                    self._counts[job.status] += 1
+                    if job.status != 'deferred':
+                        # Averages are over finished jobs, so only their runs count
+                        self._wait_total += job.started_at - job.enqueued_at
+                        self._run_total += job.finished_at - job.started_at
+                    if job.status == 'deferred':
+                        # Backend went away again: stop feeding parked jobs back in
+                        self._deferred[job.id] = job
+                        self._draining = False
+                    elif self._draining and self._deferred:
+                        self._requeue(1)
+                    else:
+                        self._draining = False
+                self._queue.task_done()
+
+    def shutdown(self, timeout=30):
+        """Stop taking jobs and wait up to timeout seconds for queued ones to finish"""
+        with self._lock:
+            self._accepting = False
+            if self._deferred:
+                logger.warning(f"⚠️ {self.name}: dropping {len(self._deferred)} deferred jobs at shutdown")
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if self._queue.qsize() == 0 and self._active == 0:
+                    return True
+            time.sleep(0.1)
+        logger.warning(f"⚠️ {self.name}: {self._queue.qsize()} jobs still queued at shutdown")
+        return False
+
+    def stats(self):
+        with self._lock:
+            finished = self._counts['completed'] + self._counts['failed']
+            return {
+                'workers': self.workers,
+                'activeWorkers': self._active,
+                'queueDepth': self._queue.qsize(),
+                'deferredJobs': len(self._deferred),
+                'maxQueue': self.max_queue,
+                'jobs': dict(self._counts),
+                'avgWaitSeconds': round(self._wait_total / finished, 3) if finished else None,
+                'avgRunSeconds': round(self._run_total / finished, 3) if finished else None,
+            }
@@ -0,0 +1,164 @@
+"""
+Logging setup for the artifact processors.
+
+- LOG_FORMAT=json switches to one JSON object per line, with extra= fields
+  carried through as keys.
+- Every record is capped at LOG_MAX_BYTES; payload dumps go through
+  log_payload(), which truncates long strings (base64 images) and collapses
+  number lists (embeddings) before anything is serialized.
+- Payload dumps are sampled (LOG_PAYLOAD_SAMPLE_RATE) and formatted lazily,
+  so a disabled level or a skipped sample costs nothing.
+- LOG_ASYNC=true (the default) hands records to a queue drained by a
+  background thread; formatting and disk I/O happen there, not on the
+  request thread. Don't mutate a payload after logging it.
+"""
+
+import os
+import sys
+import json
+import atexit
+import queue
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_FILE = os.environ.get('LOG_FILE')
+LOG_ASYNC = os.environ.get('LOG_ASYNC', 'true').lower() == 'true'
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', '8192'))
+LOG_MAX_FIELD_CHARS = int(os.environ.get('LOG_MAX_FIELD_CHARS', '256'))
+LOG_MAX_LIST_ITEMS = int(os.environ.get('LOG_MAX_LIST_ITEMS', '20'))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '1.0'))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+
+
+def truncate(text, limit):
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+def summarize(value, depth=0):
+    """Shrink a payload for logging: long strings cut, number lists collapsed"""
+    if isinstance(value, str):
+        return truncate(value, LOG_MAX_FIELD_CHARS)
+    if isinstance(value, dict):
+        if depth > 6:
+            return f"<dict with {len(value)} keys>"
+        return {key: summarize(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, (int, float)) for item in value) and len(value) > 8:
+            return f"<{len(value)} numbers>"
+        items = [summarize(item, depth + 1) for item in value[:LOG_MAX_LIST_ITEMS]]
+        if len(value) > LOG_MAX_LIST_ITEMS:
+            items.append(f"...(+{len(value) - LOG_MAX_LIST_ITEMS} items)")
+        return items
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+class LazyPayload:
+    """Serializes a summarized payload only when the record is formatted"""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        indent = None if LOG_FORMAT == 'json' else 2
+        return json.dumps(summarize(self.payload), indent=indent, default=str)
+
+
+def log_payload(logger, label, payload, level=logging.INFO):
+    """Log a (possibly huge) payload: level-checked, sampled, truncated, lazy"""
+    if not logger.isEnabledFor(level):
+        return
+    if LOG_PAYLOAD_SAMPLE_RATE < 1.0 and random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.log(level, '%s: %s', label, LazyPayload(payload))
+
+
+class CappedTextFormatter(logging.Formatter):
+    def format(self, record):
+        return truncate(super().format(record), LOG_MAX_BYTES)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, capped at LOG_MAX_BYTES"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': truncate(record.getMessage(), LOG_MAX_BYTES),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = summarize(value)
+        if record.exc_info:
+            entry['exception'] = truncate(self.formatException(record.exc_info), LOG_MAX_BYTES)
+
+        line = json.dumps(entry, default=str, ensure_ascii=False)
+        if len(line) > LOG_MAX_BYTES:
+            entry = {k: entry[k] for k in ('timestamp', 'level', 'logger', 'thread')}
+            entry['message'] = truncate(record.getMessage(), LOG_MAX_BYTES // 2)
+            entry['truncated'] = True
+            line = json.dumps(entry, default=str, ensure_ascii=False)
+        return line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread"""
+
+    def prepare(self, record):
+        # The stock prepare() formats the message here, on the caller's thread
+        return record
+
+
+def _stop_listener():
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging():
+    """Install the processor log handler on the root logger"""
+    global _listener
+
+    _stop_listener()
+
+    if LOG_FILE:
+        handler = logging.FileHandler(LOG_FILE)
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(CappedTextFormatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+
+    if LOG_ASYNC:
+        log_queue = queue.SimpleQueue()
+        root.addHandler(DeferredQueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.unregister(_stop_listener)
+        atexit.register(_stop_listener)
+    else:
+        root.addHandler(handler)
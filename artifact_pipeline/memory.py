@@ -0,0 +1,259 @@
+"""
+Per-request memory high-water marks (opt-in).
+
+A /process-artifact call holds the JSON body, the base64 string, the
+decoded bytes, the scratch file and the result with its embeddings all at
+once. MEMORY_PROFILE turns on attribution of that:
+
+- rss: a sampler thread reads the process RSS every MEMORY_SAMPLE_MS and
+  keeps each request's peak (cheap, but only sees what the OS sees)
+- tracemalloc: also traces Python allocations (slow, several times the
+  CPU). Gives the exact peak of traced memory during the request and the
+  top MEMORY_TOP_SITES source lines holding memory at the stage boundary
+  where the most was live
+
+Results go out as response headers (X-Memory-Peak, X-Memory-Rss-Peak,
+X-Memory-Rss-Growth, X-Memory-Peak-Stage, X-Memory-Top) and into /metrics
+(artifact_request_memory_bytes, artifact_memory_site_bytes).
+
+The process is shared, so concurrent requests see each other's memory;
+X-Memory-Overlap says how many other requests were running. For clean
+numbers profile one request at a time (JOB_WORKERS=1, --concurrency 1).
+"""
+
+import os
+import time
+import logging
+import threading
+import tracemalloc
+
+from artifact_pipeline.metrics import SIZE_BUCKETS, on_stage_end, registry
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'rss', 'tracemalloc')
+MEMORY_PROFILE = os.environ.get('MEMORY_PROFILE', 'off').lower()
+MEMORY_SAMPLE_MS = float(os.environ.get('MEMORY_SAMPLE_MS', '5'))
+MEMORY_TOP_SITES = int(os.environ.get('MEMORY_TOP_SITES', '5'))
+MEMORY_TRACE_FRAMES = int(os.environ.get('MEMORY_TRACE_FRAMES', '1'))
+
+if MEMORY_PROFILE not in MODES:
+    raise ValueError(f"MEMORY_PROFILE must be one of {', '.join(MODES)}")
+
+REQUEST_MEMORY = registry.histogram(
+    'artifact_request_memory_bytes', 'Per-request memory high-water mark',
+    buckets=SIZE_BUCKETS, labels=('endpoint', 'kind')
+)
+SITE_MEMORY = registry.peak_gauge(
+    'artifact_memory_site_bytes', 'Most memory seen held by a source line at a stage boundary',
+    labels=('site',)
+)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB = os.path.dirname(os.__file__)
+
+
+def rss_bytes():
+    """Current resident set size, or None where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _site_name(filename, lineno):
+    if filename.startswith(_ROOT + os.sep):
+        filename = os.path.relpath(filename, _ROOT)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    elif filename.startswith(_STDLIB + os.sep):
+        filename = os.path.relpath(filename, _STDLIB)
+    return f'{filename}:{lineno}'
+
+
+def _format_size(size):
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GiB'
+
+
+class Tracker:
+    """Memory seen during one request"""
+
+    def __init__(self, overlap):
+        self.overlap = overlap
+        self.rss_start = self.rss_peak = rss_bytes()
+        self.traced_start = self.traced_peak = None
+        self.live_peak = 0
+        self.live_stage = None
+        self.sites = []
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            if overlap == 0:
+                # Alone in the process: the traced peak is all ours
+                tracemalloc.reset_peak()
+            self.traced_start = tracemalloc.get_traced_memory()[0]
+
+    def take_baseline(self):
+        if self.traced_start is not None:
+            self._baseline = tracemalloc.take_snapshot()
+
+    def sample(self):
+        rss = rss_bytes()
+        if rss is not None and (self.rss_peak is None or rss > self.rss_peak):
+            self.rss_peak = rss
+
+    def checkpoint(self, name):
+        """At a stage boundary: note where memory is held if it's the most so far"""
+        self.sample()
+        if self._baseline is None:
+            return
+        live = tracemalloc.get_traced_memory()[0] - self.traced_start
+        if live <= self.live_peak:
+            return
+        self.live_peak = live
+        self.live_stage = name
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        self.sites = [
+            (_site_name(stat.traceback[0].filename, stat.traceback[0].lineno), stat.size_diff)
+            for stat in snapshot.compare_to(self._baseline, 'lineno')[:MEMORY_TOP_SITES]
+            if stat.size_diff > 0
+        ]
+
+    def finish(self):
+        self.sample()
+        if self._baseline is not None:
+            self.traced_peak = tracemalloc.get_traced_memory()[1] - self.traced_start
+            self._baseline = None
+
+    def headers(self):
+        headers = {'X-Memory-Overlap': str(self.overlap)}
+        if self.traced_peak is not None:
+            headers['X-Memory-Peak'] = str(self.traced_peak)
+        if self.rss_peak is not None:
+            headers['X-Memory-Rss-Peak'] = str(self.rss_peak)
+            headers['X-Memory-Rss-Growth'] = str(self.rss_peak - self.rss_start)
+        if self.live_stage:
+            headers['X-Memory-Peak-Stage'] = self.live_stage
+        if self.sites:
+            headers['X-Memory-Top'] = ', '.join(f'{site}={_format_size(size)}' for site, size in self.sites)
+        return headers
+
+
+class Profiler:
+    """Tracks every in-flight request and samples RSS for them"""
+
+    def __init__(self, mode=MEMORY_PROFILE, sample_seconds=MEMORY_SAMPLE_MS / 1000):
+        self.mode = mode
+        self.sample_seconds = sample_seconds
+        self._active = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._sampler = None
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def start(self):
+        """Begin tracking a request in this thread"""
+        if self.mode == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+            logger.info(f"🧠 tracemalloc started ({MEMORY_TRACE_FRAMES} frames)")
+        with self._lock:
+            tracker = Tracker(overlap=len(self._active))
+            for other in self._active:
+                other.overlap += 1
+            self._active.add(tracker)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name='memory-sampler', daemon=True)
+                self._sampler.start()
+            self._wake.notify()
+        tracker.take_baseline()
+        self._local.tracker = tracker
+        return tracker
+
+    def current(self):
+        return getattr(self._local, 'tracker', None)
+
+    def checkpoint(self, name):
+        tracker = self.current()
+        if tracker is not None:
+            tracker.checkpoint(name)
+
+    def finish(self):
+        """Stop tracking this thread's request; returns its Tracker"""
+        tracker = self.current()
+        if tracker is None:
+            return None
+        self._local.tracker = None
+        with self._lock:
+            self._active.discard(tracker)
+        tracker.finish()
+        return tracker
+
+    def _sample_loop(self):
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._wake.wait()
+                trackers = list(self._active)
+            for tracker in trackers:
+                tracker.sample()
+            time.sleep(self.sample_seconds)
+
+
+profiler = Profiler()
+
+
+def record(tracker, endpoint):
+    """Export a finished request's numbers to /metrics"""
+    if tracker.traced_peak is not None:
+        REQUEST_MEMORY.observe(tracker.traced_peak, endpoint=endpoint, kind='traced')
+    if tracker.rss_peak is not None:
+        REQUEST_MEMORY.observe(tracker.rss_peak - tracker.rss_start, endpoint=endpoint, kind='rss_growth')
+    for site, size in tracker.sites:
+        SITE_MEMORY.observe(size, site=site)
+
+
+def instrument_app(app):
+    """Attach per-request memory tracking to a Flask app (no-op unless MEMORY_PROFILE is set)"""
+    from flask import request
+
+    if not profiler.enabled:
+        return
+    logger.info(f"🧠 Per-request memory profiling: {profiler.mode}")
+
+    @app.before_request
+    def _start_memory():
+        if request.endpoint != 'metrics':
+            profiler.start()
+
+    @app.after_request
+    def _finish_memory(response):
+        if profiler.current() is None:
+            return response
+        profiler.checkpoint('response')
+        tracker = profiler.finish()
+        record(tracker, request.endpoint or 'unknown')
+        # A streamed body is still being produced; its headers would be premature
+        if not response.is_streamed:
+            response.headers.update(tracker.headers())
+        return response
+
+    @app.teardown_request
+    def _drop_memory(exc):
+        # Requests that failed before after_request ran
+        if profiler.current() is not None:
+            profiler.finish()
+
+
+on_stage_end(profiler.checkpoint)
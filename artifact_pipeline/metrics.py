@@ -0,0 +1,301 @@
+"""
+Per-stage latency, payload size and error metrics for the processors.
+
+Wrap each step of a request in `with stage('download'):` to record its
+duration in a histogram (and count it as an error if it raises). Metrics
+are served in Prometheus text format at /metrics by instrument_app().
+
+When opentelemetry is installed and OTEL_EXPORTER_OTLP_ENDPOINT is set
+(start-local-artifact-processor.sh sets both OTEL_* variables), every
+request and stage also becomes a span exported over OTLP.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import context as otel_context, trace
+except ImportError:  # tracing is optional
+    otel_context = trace = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_bound(bound):
+    return f'{bound:g}' if isinstance(bound, float) else str(bound)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.label_names, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.label_names, key, ('le', _format_bound(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.label_names, key, ('le', '+Inf'))
+                lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+                labels = _format_labels(self.label_names, key)
+                lines.append(f'{self.name}_sum{labels} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class Gauge:
+    """Read at scrape time from a callback returning a number"""
+
+    def __init__(self, name, help, callback):
+        self.name, self.help, self.callback = name, help, callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning(f"⚠️ Gauge {self.name} failed: {e}")
+            return []
+        if value is None:
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge', f'{self.name} {value}']
+
+
+class PeakGauge:
+    """Largest value seen per label set, keeping only the `limit` largest series"""
+
+    def __init__(self, name, help, labels=(), limit=50):
+        self.name, self.help, self.label_names = name, help, labels
+        self.limit = limit
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.label_names)
+        with self._lock:
+            if value <= self._values.get(key, float('-inf')):
+                return
+            self._values[key] = value
+            if len(self._values) > self.limit:
+                del self._values[min(self._values, key=self._values.get)]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.label_names, key)} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        return self._add(Histogram(name, help, buckets, labels))
+
+    def peak_gauge(self, name, help, labels=(), limit=50):
+        return self._add(PeakGauge(name, help, labels, limit))
+
+    def gauge(self, name, help, callback):
+        with self._lock:
+            self._metrics[name] = Gauge(name, help, callback)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'artifact_stage_seconds', 'Time spent in each processing stage', labels=('stage',)
+)
+STAGE_ERRORS = registry.counter(
+    'artifact_stage_errors_total', 'Errors raised by each processing stage', labels=('stage',)
+)
+PAYLOAD_BYTES = registry.histogram(
+    'artifact_payload_bytes', 'Size of request bodies, images and responses',
+    buckets=SIZE_BUCKETS, labels=('kind',)
+)
+REQUEST_SECONDS = registry.histogram(
+    'artifact_request_seconds', 'End-to-end request latency', labels=('endpoint', 'status')
+)
+
+
+# --- Tracing ---------------------------------------------------------------
+
+_tracer = None
+
+
+def setup_tracing(service_name):
+    """Export spans over OTLP if opentelemetry is installed and configured"""
+    global _tracer
+
+    if trace is None or not os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT'):
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        logger.warning(f"⚠️ OTEL endpoint set but exporter not installed: {e}")
+        return False
+
+    service_name = os.environ.get('OTEL_SERVICE_NAME', service_name)
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer('artifact_pipeline')
+    logger.info(f"📡 OTEL tracing enabled for {service_name}")
+    return True
+
+
+@contextmanager
+def _span(name, **attributes):
+    if _tracer is None:
+        yield
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes):
+        yield
+
+
+# --- Recording -------------------------------------------------------------
+
+_stage_listeners = []
+
+
+def on_stage_end(callback):
+    """Call callback(name) in the stage's thread whenever a stage finishes"""
+    _stage_listeners.append(callback)
+    return callback
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage; exceptions are counted against it and re-raised"""
+    started = time.perf_counter()
+    try:
+        with _span(f'artifact.{name}'):
+            yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+        for callback in _stage_listeners:
+            callback(name)
+
+
+def observe_bytes(kind, size):
+    if size is not None:
+        PAYLOAD_BYTES.observe(size, kind=kind)
+
+
+def instrument_app(app, service_name):
+    """Time every request, trace it when OTEL is on, and serve /metrics"""
+    from flask import Response, g, request
+    from artifact_pipeline import memory
+
+    setup_tracing(service_name)
+    # Per-request memory high-water marks when MEMORY_PROFILE is set
+    memory.instrument_app(app)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        observe_bytes('request', request.content_length)
+        if _tracer is not None:
+            span = _tracer.start_span(f'{request.method} {request.url_rule or request.path}')
+            g.metrics_span = span
+            g.metrics_token = otel_context.attach(trace.set_span_in_context(span))
+
+    @app.after_request
+    def _record(response):
+        started = g.pop('metrics_started', None)
+        if started is not None and request.endpoint != 'metrics':
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                endpoint=request.endpoint or 'unknown',
+                status=str(response.status_code)
+            )
+            if not response.is_streamed:
+                observe_bytes('response', response.content_length)
+        return response
+
+    @app.teardown_request
+    def _end_span(exc):
+        token = g.pop('metrics_token', None)
+        span = g.pop('metrics_span', None)
+        if span is not None:
+            span.end()
+        if token is not None:
+            otel_context.detach(token)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus text exposition of processor metrics"""
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
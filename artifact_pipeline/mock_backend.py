@@ -0,0 +1,159 @@
+"""
+Offline stand-in for content_router / Rekognition with realistic behaviour.
+
+Selected with ARTIFACT_BACKEND=mock. Unlike the fixed mock faces the
+debug processors return, this backend:
+
+- sleeps for a lognormal latency (MOCK_LATENCY_MEDIAN_MS, MOCK_LATENCY_SIGMA)
+- fails MOCK_ERROR_RATE of calls and hangs MOCK_TIMEOUT_RATE of them for
+  MOCK_TIMEOUT_SECONDS before raising a timeout
+- returns MOCK_FACES faces per image ("2" or a range like "0-6"), each with
+  Rekognition-style ALL attributes and a MOCK_EMBEDDING_DIM embedding, so
+  payload sizes match real responses
+
+Faces are seeded from the image hash, so the same image always gets the
+same faces. The latency defaults are only a starting point: fit them to
+the route_content histogram on /metrics from a real run.
+"""
+
+import os
+import math
+import time
+import random
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+EMOTIONS = ('HAPPY', 'CALM', 'SURPRISED', 'CONFUSED', 'SAD', 'ANGRY', 'DISGUSTED', 'FEAR')
+LANDMARKS = (
+    'eyeLeft', 'eyeRight', 'mouthLeft', 'mouthRight', 'nose', 'leftEyeBrowLeft',
+    'leftEyeBrowRight', 'leftEyeBrowUp', 'rightEyeBrowLeft', 'rightEyeBrowRight',
+    'rightEyeBrowUp', 'leftEyeLeft', 'leftEyeRight', 'leftEyeUp', 'leftEyeDown',
+    'rightEyeLeft', 'rightEyeRight', 'rightEyeUp', 'rightEyeDown', 'noseLeft',
+    'noseRight', 'mouthUp', 'mouthDown', 'leftPupil', 'rightPupil', 'upperJawlineLeft',
+    'midJawlineLeft', 'chinBottom', 'midJawlineRight', 'upperJawlineRight'
+)
+
+
+class MockBackendError(Exception):
+    """Injected backend failure."""
+
+
+class MockBackendTimeout(TimeoutError):
+    """Injected backend timeout."""
+
+
+def _parse_range(value):
+    low, _, high = str(value).partition('-')
+    low = int(low)
+    return low, int(high) if high else low
+
+
+class MockBackend:
+    def __init__(self, latency_median_ms=400, latency_sigma=0.35, error_rate=0.0,
+                 timeout_rate=0.0, timeout_seconds=30, faces='0-4', embedding_dim=512,
+                 seed=None):
+        self.latency_median = latency_median_ms / 1000
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.faces = _parse_range(faces)
+        self.embedding_dim = embedding_dim
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {'calls': 0, 'errors': 0, 'timeouts': 0}
+
+    @classmethod
+    def from_env(cls):
+        seed = os.environ.get('MOCK_SEED')
+        return cls(
+            latency_median_ms=float(os.environ.get('MOCK_LATENCY_MEDIAN_MS', '400')),
+            latency_sigma=float(os.environ.get('MOCK_LATENCY_SIGMA', '0.35')),
+            error_rate=float(os.environ.get('MOCK_ERROR_RATE', '0')),
+            timeout_rate=float(os.environ.get('MOCK_TIMEOUT_RATE', '0')),
+            timeout_seconds=float(os.environ.get('MOCK_TIMEOUT_SECONDS', '30')),
+            faces=os.environ.get('MOCK_FACES', '0-4'),
+            embedding_dim=int(os.environ.get('MOCK_EMBEDDING_DIM', '512')),
+            seed=int(seed) if seed else None,
+        )
+
+    def _roll(self):
+        """Pick this call's outcome and latency"""
+        with self._lock:
+            self._counts['calls'] += 1
+            outcome = self._rng.random()
+            latency = self._rng.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+            if outcome < self.timeout_rate:
+                self._counts['timeouts'] += 1
+                return 'timeout', self.timeout_seconds
+            if outcome < self.timeout_rate + self.error_rate:
+                self._counts['errors'] += 1
+                return 'error', latency
+        return 'ok', latency
+
+    def detect(self, image_sha256):
+        """Simulate one detection call; returns Rekognition-style faces"""
+        outcome, latency = self._roll()
+        time.sleep(latency)
+        if outcome == 'timeout':
+            raise MockBackendTimeout(f"Mock backend timed out after {latency:.1f}s")
+        if outcome == 'error':
+            raise MockBackendError("Mock backend injected failure (ThrottlingException)")
+
+        rng = random.Random(f"{self.seed}:{image_sha256}")
+        count = rng.randint(*self.faces)
+        return [self._face(rng, i) for i in range(count)]
+
+    def _face(self, rng, index):
+        width, height = rng.uniform(0.08, 0.3), rng.uniform(0.1, 0.4)
+        left, top = rng.uniform(0, 1 - width), rng.uniform(0, 1 - height)
+        vector = [rng.gauss(0, 1) for _ in range(self.embedding_dim)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        emotions = sorted(
+            ({'Type': e, 'Confidence': round(rng.uniform(0, 100), 3)} for e in EMOTIONS),
+            key=lambda e: -e['Confidence']
+        )
+        age_low = rng.randint(5, 70)
+        return {
+            'faceId': f'face_{index}',
+            'confidence': round(rng.uniform(90, 99.99), 4),
+            'boundingBox': {'Width': width, 'Height': height, 'Left': left, 'Top': top},
+            'landmarks': [
+                {'Type': name, 'X': left + rng.uniform(0, width), 'Y': top + rng.uniform(0, height)}
+                for name in LANDMARKS
+            ],
+            'pose': {k: rng.uniform(-30, 30) for k in ('Roll', 'Yaw', 'Pitch')},
+            'quality': {'Brightness': rng.uniform(40, 90), 'Sharpness': rng.uniform(40, 95)},
+            'emotions': emotions,
+            'ageRange': {'Low': age_low, 'High': age_low + rng.randint(4, 12)},
+            'gender': {'Value': rng.choice(('Male', 'Female')), 'Confidence': round(rng.uniform(80, 99.9), 3)},
+            'embedding': [v / norm for v in vector],
+        }
+
+    def route_content(self, file_path, content_type, options, metadata):
+        """Same call signature and result shape as content_router.route_content"""
+        with open(file_path, 'rb') as f:
+            image_sha256 = hashlib.sha256(f.read()).hexdigest()
+        faces = self.detect(image_sha256)
+        return {
+            'analysis': {
+                'faces': faces,
+                'faceCount': len(faces),
+                'metadata': {'processed_by': 'mock-backend', 'artifact_id': metadata.get('artifact_id')}
+            }
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                'latencyMedianMs': self.latency_median * 1000,
+                'latencySigma': self.latency_sigma,
+                'errorRate': self.error_rate,
+                'timeoutRate': self.timeout_rate,
+                'faces': '-'.join(map(str, self.faces)),
+            }
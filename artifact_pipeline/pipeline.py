@@ -0,0 +1,255 @@
+"""
+The /process-artifact pipeline: stage the image, run content_router,
+return its result.
+
+Shared by the synchronous endpoint and the background job workers so both
+paths behave the same.
+"""
+
+import os
+import time
+import base64
+import hashlib
+import logging
+
+from artifact_pipeline import crops, detectors, preprocess
+from artifact_pipeline.breaker import CircuitOpen, breaker_for
+from artifact_pipeline.cache import ResultCache, cache_key
+from artifact_pipeline.fetcher import fetcher
+from artifact_pipeline.jobs import Deferred
+from artifact_pipeline.metrics import observe_bytes, stage
+from artifact_pipeline.router import RouterUnavailable
+from artifact_pipeline.singleflight import SingleFlight
+from artifact_pipeline.uploads import ScratchImage
+
+logger = logging.getLogger(__name__)
+
+# Results of identical image + options are reused instead of re-running the
+# router. The key is content only; a hit gets this request's file/user/twin ids
+# (see with_owner), so a duplicate upload never reports another file's ids.
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+result_cache = ResultCache(
+    max_memory_bytes=int(os.environ.get('RESULT_CACHE_MEMORY_MB', '64')) * 1024 * 1024,
+    disk_dir=os.environ.get(
+        'RESULT_CACHE_DIR', os.path.expanduser('~/.cache/infitwin/artifact-results')
+    ) or None,
+    max_disk_bytes=int(os.environ.get('RESULT_CACHE_DISK_MB', '1024')) * 1024 * 1024
+) if RESULT_CACHE_ENABLED else None
+
+# ARTIFACT_BACKEND picks the detector (router, mock, local); see detectors.py
+ARTIFACT_BACKEND = detectors.DEFAULT_DETECTOR
+
+# How long to defer work when content_router failed to load / is still warming up
+ROUTER_RETRY_SECONDS = float(os.environ.get('ROUTER_RETRY_SECONDS', '30'))
+
+# Concurrent requests for the same fileId + content are coalesced
+in_flight = SingleFlight()
+
+# Process options
+DEFAULT_OPTIONS = {
+    'extract_text': False,
+    'analyze_content': True,
+    'generate_embeddings': True
+}
+
+
+def load_image_bytes(data):
+    """Return the image bytes from a payload's base64 imageData"""
+    logger.info("📥 Using provided base64 image data...")
+    try:
+        image_bytes = base64.b64decode(data['imageData'])
+        logger.info(f"📊 Decoded image: {len(image_bytes)} bytes")
+    except Exception as e:
+        raise Exception(f"Failed to decode base64 image: {e}")
+    return image_bytes
+
+
+def build_metadata(data):
+    """Metadata for content_router"""
+    return {
+        'artifact_id': data.get('fileId'),
+        'user_id': data.get('userId'),
+        'twin_id': data.get('twinId'),
+        'name': data.get('fileName', 'image.jpg'),
+        'contentType': data.get('contentType', 'image/jpeg'),
+        'uploadedAt': data.get('uploadedAt')
+    }
+
+
+def with_owner(result, data):
+    """A cached result relabelled with this request's file/user/twin ids"""
+    analysis = result.get('analysis') if isinstance(result, dict) else None
+    if isinstance(analysis, dict) and isinstance(analysis.get('metadata'), dict):
+        metadata = analysis['metadata']
+        owner = build_metadata(data)
+        for field in ('artifact_id', 'user_id', 'twin_id'):
+            if field == 'artifact_id' or field in metadata:
+                metadata[field] = owner[field]
+    return result
+
+
+class DetectionDeferred(Deferred):
+    """The detection backend is unavailable; retry the payload later.
+
+    Carries the caller's upload (if any) so the retry doesn't need the body again.
+    """
+
+
+def process_artifact(data, upload=None):
+    """Run one request payload through content_router and return its result
+
+    upload is a ScratchImage already staged from a binary request body; without
+    it the image comes from the payload's imageData, or is downloaded from
+    fileUrl. The scratch file is removed before returning, except when the
+    call is deferred: then the caller's upload travels on DetectionDeferred.
+    """
+    caller_upload = upload
+    deferred = False
+    file_id = data.get('fileId')
+    content_type = data.get('contentType', 'image/jpeg')
+    detector = detectors.resolve(data.get('detector'))
+
+    logger.info(f"🔍 Processing: {file_id}")
+    logger.info(f"🔍 User: {data.get('userId')}, Twin: {data.get('twinId')}")
+
+    try:
+        if upload is None and not data.get('imageData'):
+            if not data.get('fileUrl'):
+                raise Exception("No image data provided (need fileUrl or imageData)")
+            logger.info(f"📥 Downloading image from: {data['fileUrl']}")
+            with stage('download'):
+                upload = fetcher.fetch(data['fileUrl'])
+
+        if upload is None:
+            with stage('decode'):
+                image_bytes = load_image_bytes(data)
+                image_sha256 = hashlib.sha256(image_bytes).hexdigest()
+            observe_bytes('image', len(image_bytes))
+        else:
+            image_bytes = None
+            image_sha256 = upload.sha256
+            observe_bytes('image', upload.size)
+        options = dict(DEFAULT_OPTIONS)
+        if detector == 'rekognition':
+            # DEFAULT or ALL face attributes for this call
+            options['face_attributes'] = data.get('faceAttributes') or detectors.REKOGNITION_ATTRIBUTES
+
+        key = cache_key(
+            image_sha256,
+            {
+                **options,
+                'preprocess': preprocess.settings(),
+                'detector': detector
+            },
+            content_type
+        )
+        use_cache = result_cache is not None and not data.get('noCache')
+        if use_cache:
+            with stage('cache_lookup'):
+                cached = result_cache.get(key)
+            if cached is not None and crops.available(cached):
+                logger.info(f"♻️ Cache hit for {file_id} ({key[:12]})")
+                return with_owner(cached, data)
+
+        def run():
+            nonlocal upload, image_bytes
+
+            backend = detectors.get(detector)
+            # Fail fast while the backend is known to be down
+            breaker = breaker_for(detector)
+            if breaker is not None:
+                breaker.allow()
+
+            try:
+                if upload is None:
+                    # Save to temp file
+                    with stage('write'):
+                        upload = ScratchImage.from_bytes(image_bytes)
+                    image_bytes = None
+                    logger.info(f"📁 Image saved to: {upload.path}")
+
+                # Downscale / normalize what detection sees
+                with stage('preprocess'):
+                    prepared = preprocess.prepare(upload, content_type)
+            except Exception:
+                if breaker is not None:
+                    breaker.release()
+                raise
+
+            metadata = build_metadata(data)
+
+            logger.info(f"🚀 Calling {detector} route_content...")
+            logger.info(f"📋 Metadata: {metadata}")
+            logger.info(f"⚙️ Options: {options}")
+
+            started = time.monotonic()
+            try:
+                # Call the real content router
+                with stage('route_content'):
+                    result = backend.route_content(
+                        file_path=prepared.path,
+                        content_type=prepared.content_type,
+                        options=options,
+                        metadata=metadata
+                    )
+            except Exception as e:
+                if breaker is not None:
+                    # Bad input isn't a backend outage
+                    outage = not isinstance(e, (ValueError, LookupError))
+                    breaker.record(time.monotonic() - started, failed=outage)
+                if isinstance(e, RouterUnavailable):
+                    # Never stand in mock faces: they would be saved as real results
+                    logger.error(f"❌ content_router unavailable: {e}")
+                    raise CircuitOpen(detector, e.retry_after or ROUTER_RETRY_SECONDS) from e
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record(time.monotonic() - started)
+                result = preprocess.restore_faces(result, prepared)
+                # Face crops + thumbnail from the image we already have decoded
+                with stage('crops'):
+                    result = crops.attach(result, prepared, image_sha256)
+            finally:
+                prepared.cleanup()
+
+            if use_cache:
+                with stage('cache_store'):
+                    result_cache.put(key, result)
+            return result
+
+        # Retries of the same file with the same bytes share one router run
+        try:
+            result, shared = in_flight.do(f"{file_id}:{key}", run)
+        except CircuitOpen as e:
+            logger.warning(f"⏸️ Deferring {file_id}: {e}")
+            deferred = True
+            kwargs = {'upload': caller_upload} if caller_upload is not None else {}
+            raise DetectionDeferred(str(e), retry_after=e.retry_after, **kwargs) from e
+        if shared:
+            logger.info(f"🔗 Joined in-flight processing of {file_id} ({key[:12]})")
+        return result
+    finally:
+        # Clean up temp file (a deferred caller's upload is kept for the retry)
+        if upload is not None and not (deferred and upload is caller_upload):
+            upload.cleanup()
+
+
+def crop_stats():
+    return crops.stats()
+
+
+def cache_stats():
+    return result_cache.stats() if result_cache is not None else {'enabled': False}
+
+
+def fetch_stats():
+    return fetcher.stats()
+
+
+def in_flight_stats():
+    return in_flight.stats()
+
+
+def backend_status():
+    """Readiness of whichever detection backend is configured"""
+    return detectors.status()
@@ -0,0 +1,244 @@
+"""
+Normalize images before detection.
+
+Phone photos arrive as 4-12 MB JPEGs (or PNG/WebP/HEIC, whatever the
+contentType says). Before route_content sees them we:
+
+- sniff the real format from the file header
+- decode JPEGs in draft mode, letting libjpeg downscale by 1/2, 1/4 or 1/8
+  while decoding instead of building the full-resolution bitmap
+- apply the EXIF orientation so detection sees the photo the way a browser
+  shows it
+- resize to PREPROCESS_MAX_DIMENSION and re-encode as JPEG, lowering the
+  quality until the file fits PREPROCESS_MAX_BYTES
+
+Small, upright JPEGs are passed through untouched. Detection results are
+mapped back to the original image afterwards (see restore_faces).
+
+Pillow is optional: without it images pass through with only the format
+sniffed.
+"""
+
+import io
+import os
+import logging
+
+from artifact_pipeline.uploads import ScratchImage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+PREPROCESS_ENABLED = os.environ.get('PREPROCESS_ENABLED', 'true').lower() == 'true'
+MAX_DIMENSION = int(os.environ.get('PREPROCESS_MAX_DIMENSION', '1920'))
+MAX_BYTES = int(float(os.environ.get('PREPROCESS_MAX_MB', '1.5')) * 1024 * 1024)
+JPEG_QUALITY = int(os.environ.get('PREPROCESS_QUALITY', '85'))
+MIN_JPEG_QUALITY = int(os.environ.get('PREPROCESS_MIN_QUALITY', '60'))
+
+EXIF_ORIENTATION = 0x0112
+# Orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+FORMATS = {
+    'jpeg': ('image/jpeg', '.jpg'),
+    'png': ('image/png', '.png'),
+    'gif': ('image/gif', '.gif'),
+    'webp': ('image/webp', '.webp'),
+    'heic': ('image/heic', '.heic'),
+    'bmp': ('image/bmp', '.bmp'),
+    'tiff': ('image/tiff', '.tif'),
+}
+
+if Image is None and PREPROCESS_ENABLED:
+    logger.warning("⚠️ Pillow not installed; images go to detection without preprocessing")
+
+
+def sniff_format(header):
+    """Image format from the first bytes of the file, or None"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    if header[4:8] == b'ftyp' and header[8:12] in (b'heic', b'heix', b'mif1', b'msf1', b'hevc'):
+        return 'heic'
+    if header.startswith(b'BM'):
+        return 'bmp'
+    if header[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    return None
+
+
+def settings():
+    """Preprocessing parameters that change what detection sees (for cache keys)"""
+    if not PREPROCESS_ENABLED or Image is None:
+        return None
+    return {'maxDimension': MAX_DIMENSION, 'maxBytes': MAX_BYTES, 'quality': JPEG_QUALITY}
+
+
+class PreparedImage:
+    """The image handed to detection and how it relates to the upload"""
+
+    def __init__(self, scratch, format, content_type, original_size=None,
+                 size=None, orientation=1, reencoded=False, image=None):
+        self.scratch = scratch
+        # The decoded, upright image when we had to decode it anyway
+        self.image = image
+        self.format = format
+        self.content_type = content_type
+        self.original_size = original_size
+        self.size = size or original_size
+        self.orientation = orientation
+        self.reencoded = reencoded
+
+    @property
+    def path(self):
+        return self.scratch.path
+
+    @property
+    def scale(self):
+        """Processed / original width (1.0 when untouched)"""
+        if not self.original_size or not self.size:
+            return 1.0
+        return self.size[0] / self.original_size[0]
+
+    def describe(self):
+        info = {
+            'format': self.format,
+            'reencoded': self.reencoded,
+            'bytes': self.scratch.size,
+        }
+        if self.original_size:
+            info.update({
+                'originalWidth': self.original_size[0],
+                'originalHeight': self.original_size[1],
+                'width': self.size[0],
+                'height': self.size[1],
+                'scale': round(self.scale, 6),
+                'orientation': self.orientation,
+            })
+        return info
+
+    def cleanup(self):
+        """Remove the re-encoded copy (the upload itself belongs to the caller)"""
+        self.image = None
+        if self.reencoded:
+            self.scratch.cleanup()
+
+
+def _read_header(path, length=32):
+    with open(path, 'rb') as f:
+        return f.read(length)
+
+
+def _encode_jpeg(image):
+    """JPEG bytes at the highest quality that fits MAX_BYTES"""
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    quality = JPEG_QUALITY
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+        if buffer.tell() <= MAX_BYTES or quality <= MIN_JPEG_QUALITY:
+            return buffer.getvalue(), quality
+        quality = max(MIN_JPEG_QUALITY, quality - 10)
+
+
+def prepare(upload, content_type=None):
+    """Return a PreparedImage for an upload ScratchImage
+
+    Never raises for undecodable images: they pass through and detection
+    decides what to do with them.
+    """
+    format = sniff_format(_read_header(upload.path))
+    if format is None:
+        logger.warning(f"⚠️ Unrecognized image format (declared {content_type})")
+        return PreparedImage(upload, None, content_type or 'image/jpeg')
+
+    real_type, suffix = FORMATS[format]
+    if content_type and content_type != real_type:
+        logger.info(f"🔎 Declared {content_type} but file is {format}")
+    upload.set_suffix(suffix)
+    passthrough = PreparedImage(upload, format, real_type)
+
+    if not PREPROCESS_ENABLED or Image is None:
+        return passthrough
+
+    try:
+        with Image.open(upload.path) as image:
+            width, height = image.size
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+            if orientation in TRANSPOSED_ORIENTATIONS:
+                original_size = (height, width)
+            else:
+                original_size = (width, height)
+            passthrough.original_size = passthrough.size = original_size
+            passthrough.orientation = orientation
+
+            if (format == 'jpeg' and orientation == 1 and max(width, height) <= MAX_DIMENSION
+                    and upload.size <= MAX_BYTES):
+                return passthrough
+
+            if format == 'jpeg':
+                # libjpeg scales by 1/2..1/8 during decode; it never goes below the request
+                image.draft('RGB', (MAX_DIMENSION, MAX_DIMENSION))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                # Flatten transparency onto white rather than black
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            encoded, quality = _encode_jpeg(image)
+            size = image.size
+    except Exception as e:
+        logger.warning(f"⚠️ Could not preprocess {format} image, sending as-is: {e}")
+        return passthrough
+
+    scratch = ScratchImage.from_bytes(encoded, suffix='.jpg')
+    logger.info(
+        f"🖼️ Preprocessed {format} {original_size[0]}x{original_size[1]} ({upload.size} bytes) "
+        f"-> {size[0]}x{size[1]} JPEG q{quality} ({len(encoded)} bytes)"
+    )
+    return PreparedImage(
+        scratch, format, 'image/jpeg', original_size=original_size, size=size,
+        orientation=orientation, reencoded=True, image=image
+    )
+
+
+def restore_faces(result, prepared):
+    """Map detection output back to the original image
+
+    Rekognition-style boxes and landmarks are ratios of the image they were
+    detected on. A uniform resize of the EXIF-oriented photo keeps those
+    ratios, which is also the frame browsers display, so they carry over
+    unchanged. Each face additionally gets boundingBoxPixels in original
+    pixel coordinates, and the result records the preprocessing applied.
+    """
+    analysis = result.get('analysis') if isinstance(result, dict) else None
+    if not isinstance(analysis, dict):
+        return result
+
+    analysis['preprocessing'] = prepared.describe()
+    if not prepared.original_size:
+        return result
+
+    width, height = prepared.original_size
+    for face in analysis.get('faces') or []:
+        box = face.get('boundingBox') or face.get('BoundingBox')
+        if not isinstance(box, dict):
+            continue
+        face['boundingBoxPixels'] = {
+            'Left': round(box.get('Left', 0) * width),
+            'Top': round(box.get('Top', 0) * height),
+            'Width': round(box.get('Width', 0) * width),
+            'Height': round(box.get('Height', 0) * height),
+        }
+    return result
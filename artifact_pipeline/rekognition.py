@@ -0,0 +1,251 @@
+"""
+Shared AWS Rekognition client.
+
+One boto3 client per process, with:
+
+- a connection pool sized for the worker threads (REKOGNITION_POOL_SIZE)
+- botocore's adaptive retry mode, which backs off on ThrottlingException
+- a client-side token bucket (REKOGNITION_TPS, REKOGNITION_BURST) so we stay
+  under the account's TPS quota instead of finding it through throttling
+- per-call face attributes: DEFAULT unless the caller asks for ALL (ALL is
+  slower and returns a much heavier payload)
+- record/replay (REKOGNITION_MODE): 'record' saves every response under
+  REKOGNITION_RECORD_DIR keyed by image hash, 'replay' answers only from
+  those recordings, so the pipeline runs offline
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+from artifact_pipeline.metrics import stage
+
+try:
+    import boto3
+    from botocore.config import Config
+except ImportError:  # pragma: no cover - optional dependency
+    boto3 = Config = None
+
+logger = logging.getLogger(__name__)
+
+MODES = ('live', 'record', 'replay')
+ATTRIBUTE_SETS = ('DEFAULT', 'ALL')
+
+
+class RekognitionUnavailable(RuntimeError):
+    """Raised when boto3 is missing or the rate limiter gives up waiting."""
+
+
+class RecordingNotFound(LookupError):
+    """Raised in replay mode when no recording exists for an image."""
+
+
+class TokenBucket:
+    """Blocking token bucket: rate tokens/second, up to capacity banked"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting if needed; returns seconds waited, or None on timeout"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            if timeout is not None and waited + wait > timeout:
+                return None
+            time.sleep(wait)
+            waited += wait
+
+
+def normalize_attributes(attributes):
+    """['DEFAULT'] / ['ALL'] from None, a string or a list"""
+    if not attributes:
+        return ['DEFAULT']
+    if isinstance(attributes, str):
+        attributes = [a.strip() for a in attributes.split(',') if a.strip()]
+    attributes = [a.upper() for a in attributes]
+    for attribute in attributes:
+        if attribute not in ATTRIBUTE_SETS:
+            raise ValueError(f"Unknown face attributes '{attribute}' (expected DEFAULT or ALL)")
+    return attributes
+
+
+class RekognitionClient:
+    def __init__(self, region='us-east-1', pool_size=32, max_attempts=5, connect_timeout=5,
+                 read_timeout=30, tps=25, burst=None, max_wait=10, mode='live', record_dir=None):
+        if mode not in MODES:
+            raise ValueError(f"REKOGNITION_MODE must be one of {', '.join(MODES)}")
+        self.region = region
+        self.pool_size = pool_size
+        self.max_attempts = max_attempts
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_wait = max_wait
+        self.mode = mode
+        self.record_dir = record_dir
+        self.bucket = TokenBucket(tps, burst) if tps else None
+        self._client = None
+        self._lock = threading.Lock()
+        self._counts = {
+            'calls': 0, 'replayed': 0, 'recorded': 0, 'errors': 0,
+            'rateLimited': 0, 'rateLimitSeconds': 0.0
+        }
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+
+    @property
+    def client(self):
+        """The boto3 client, created on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if boto3 is None:
+                        raise RekognitionUnavailable("boto3 is not installed")
+                    self._client = boto3.client(
+                        'rekognition',
+                        region_name=self.region,
+                        config=Config(
+                            max_pool_connections=self.pool_size,
+                            retries={'mode': 'adaptive', 'total_max_attempts': self.max_attempts},
+                            connect_timeout=self.connect_timeout,
+                            read_timeout=self.read_timeout,
+                            tcp_keepalive=True
+                        )
+                    )
+                    logger.info(f"🔌 Rekognition client ready ({self.region}, pool {self.pool_size})")
+        return self._client
+
+    def _recording_path(self, operation, image_sha256, attributes):
+        name = f"{image_sha256}.{operation}.{'-'.join(attributes).lower()}.json"
+        return os.path.join(self.record_dir, name)
+
+    def _replay(self, operation, image_sha256, attributes):
+        path = self._recording_path(operation, image_sha256, attributes)
+        try:
+            with open(path) as f:
+                recording = json.load(f)
+        except FileNotFoundError:
+            raise RecordingNotFound(f"No recorded {operation} for image {image_sha256[:12]} ({path})")
+        with self._lock:
+            self._counts['replayed'] += 1
+        return recording['response']
+
+    def _record(self, operation, image_sha256, attributes, response):
+        response = {k: v for k, v in response.items() if k != 'ResponseMetadata'}
+        path = self._recording_path(operation, image_sha256, attributes)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'operation': operation,
+                'imageSha256': image_sha256,
+                'attributes': attributes,
+                'recordedAt': datetime.now().isoformat(),
+                'response': response
+            }, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._counts['recorded'] += 1
+
+    def _throttle(self):
+        if self.bucket is None:
+            return
+        waited = self.bucket.acquire(timeout=self.max_wait)
+        if waited is None:
+            raise RekognitionUnavailable(f"Rekognition rate limit: no slot within {self.max_wait}s")
+        if waited > 0:
+            with self._lock:
+                self._counts['rateLimited'] += 1
+                self._counts['rateLimitSeconds'] += waited
+
+    def detect_faces(self, image_bytes, attributes=None, image_sha256=None):
+        """DetectFaces on raw image bytes; attributes is DEFAULT (default) or ALL"""
+        attributes = normalize_attributes(attributes)
+        if self.record_dir and image_sha256 is None:
+            image_sha256 = hashlib.sha256(image_bytes).hexdigest()
+
+        if self.mode == 'replay':
+            return self._replay('detect_faces', image_sha256, attributes)
+
+        self._throttle()
+        with self._lock:
+            self._counts['calls'] += 1
+        try:
+            with stage('rekognition_detect_faces'):
+                response = self.client.detect_faces(
+                    Image={'Bytes': image_bytes}, Attributes=attributes
+                )
+        except Exception:
+            with self._lock:
+                self._counts['errors'] += 1
+            raise
+
+        if self.mode == 'record':
+            self._record('detect_faces', image_sha256, attributes, response)
+        return response
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['rateLimitSeconds'] = round(counts['rateLimitSeconds'], 3)
+        return {
+            **counts,
+            'mode': self.mode,
+            'tps': self.bucket.rate if self.bucket else None,
+            'poolSize': self.pool_size,
+        }
+
+
+def faces_from_response(response):
+    """DetectFaces FaceDetails in content_router's face schema"""
+    faces = []
+    for index, detail in enumerate(response.get('FaceDetails') or []):
+        face = {
+            'faceId': f'face_{index}',
+            'confidence': detail.get('Confidence'),
+            'boundingBox': detail.get('BoundingBox'),
+            'landmarks': [
+                {'Type': landmark['Type'], 'X': landmark['X'], 'Y': landmark['Y']}
+                for landmark in detail.get('Landmarks') or []
+            ],
+            'pose': detail.get('Pose'),
+            'quality': detail.get('Quality'),
+        }
+        # Only present with Attributes=['ALL']
+        for key, name in (('Emotions', 'emotions'), ('AgeRange', 'ageRange'), ('Gender', 'gender'),
+                          ('Smile', 'smile'), ('Eyeglasses', 'eyeglasses'), ('EyesOpen', 'eyesOpen')):
+            if key in detail:
+                face[name] = detail[key]
+        faces.append(face)
+    return faces
+
+
+# One client (and one connection pool / rate limiter) per process
+client = RekognitionClient(
+    region=os.environ.get('AWS_REGION', 'us-east-1'),
+    pool_size=int(os.environ.get('REKOGNITION_POOL_SIZE', '32')),
+    max_attempts=int(os.environ.get('REKOGNITION_MAX_ATTEMPTS', '5')),
+    connect_timeout=float(os.environ.get('REKOGNITION_CONNECT_TIMEOUT', '5')),
+    read_timeout=float(os.environ.get('REKOGNITION_READ_TIMEOUT', '30')),
+    tps=float(os.environ.get('REKOGNITION_TPS', '25')),
+    burst=int(os.environ['REKOGNITION_BURST']) if os.environ.get('REKOGNITION_BURST') else None,
+    max_wait=float(os.environ.get('REKOGNITION_MAX_WAIT', '10')),
+    mode=os.environ.get('REKOGNITION_MODE', 'live').lower(),
+    record_dir=os.environ.get(
+        'REKOGNITION_RECORD_DIR', os.path.expanduser('~/.cache/infitwin/rekognition')
+    ) if os.environ.get('REKOGNITION_MODE', 'live').lower() != 'live' else None
+)
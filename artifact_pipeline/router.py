@@ -0,0 +1,167 @@
+"""
+Process-wide loader for the ArtifactProcessor content_router.
+
+content_router has to be imported from inside the ArtifactProcessor tree
+(it resolves its own config relative to the working directory). Doing that
+once at startup keeps the import off the request path and keeps os.chdir()
+away from request threads.
+
+A failed import is retried by the same background thread, with the delay
+doubling from ROUTER_LOAD_RETRY_SECONDS up to ROUTER_LOAD_RETRY_MAX_SECONDS.
+Request threads never import (or chdir); they get RouterUnavailable with
+the time until the next attempt.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+from artifact_pipeline.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_PROCESSOR_ROOT = os.environ.get(
+    'ARTIFACT_PROCESSOR_ROOT', '/home/tim/current-projects/ArtifactProcessor'
+)
+ARTIFACT_PROCESSOR_DIR = os.path.join(ARTIFACT_PROCESSOR_ROOT, 'artifact_processor')
+
+ROUTER_LOAD_RETRY_SECONDS = float(os.environ.get('ROUTER_LOAD_RETRY_SECONDS', '30'))
+ROUTER_LOAD_RETRY_MAX_SECONDS = float(os.environ.get('ROUTER_LOAD_RETRY_MAX_SECONDS', '600'))
+
+
+class RouterUnavailable(Exception):
+    """Raised when content_router could not be loaded.
+
+    retry_after: seconds until the next load attempt, if one is scheduled.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ContentRouter:
+    """Loads content_router once and hands out route_content to callers."""
+
+    def __init__(self, root=ARTIFACT_PROCESSOR_ROOT):
+        self.root = root
+        self.package_dir = os.path.join(root, 'artifact_processor')
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()  # not _lock: that is held for the whole import
+        self._done = threading.Event()
+        self._thread = None
+        self._route_content = None
+        self.error = None
+        self.warmup_seconds = None
+        self.attempts = 0
+        self._next_attempt = 0.0
+
+    def load(self):
+        """Import content_router (and its ML/AWS deps); after a failure, not again until the backoff passes."""
+        with self._lock:
+            if self._route_content is not None:
+                return True
+            if self._done.is_set() and time.monotonic() < self._next_attempt:
+                return False
+
+            self.attempts += 1
+
+            started = time.time()
+            logger.info("🔧 Warming up content_router...")
+            for path in (self.package_dir, self.root):
+                if path not in sys.path:
+                    sys.path.insert(0, path)
+
+            saved_cwd = os.getcwd()
+            try:
+                os.chdir(self.package_dir)
+                with stage('router_import'):
+                    from content_router import route_content
+                    # Pull in the image pipeline too so the Rekognition client
+                    # and model code are initialised before the first request.
+                    image_dir = os.path.join(self.package_dir, 'image_processing')
+                    if os.path.isdir(image_dir):
+                        if image_dir not in sys.path:
+                            sys.path.insert(0, image_dir)
+                        import visual_analysis_orchestrator  # noqa: F401
+                self._route_content = route_content
+                self.error = None
+                logger.info("✅ content_router loaded")
+            except Exception as e:
+                self.error = str(e)
+                delay = min(
+                    ROUTER_LOAD_RETRY_SECONDS * 2 ** (self.attempts - 1), ROUTER_LOAD_RETRY_MAX_SECONDS
+                )
+                self._next_attempt = time.monotonic() + delay
+                logger.error(
+                    f"❌ Failed to import content_router (attempt {self.attempts}, retrying in {delay:.0f}s): {e}",
+                    exc_info=True
+                )
+            finally:
+                os.chdir(saved_cwd)
+                self.warmup_seconds = round(time.time() - started, 3)
+                self._done.set()
+
+            return self._route_content is not None
+
+    def _warmup(self):
+        # Keep retrying until the import works
+        while not self.load():
+            time.sleep(max(self.retry_in() or 0.0, 1.0))
+
+    def start_warmup(self):
+        """Load in a background thread so the server can answer /health meanwhile.
+
+        Also restarts the thread where it didn't survive a fork (gunicorn
+        workers of a parent whose import failed).
+        """
+        with self._thread_lock:
+            if self._route_content is None and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(
+                    target=self._warmup, name='content-router-warmup', daemon=True
+                )
+                self._thread.start()
+            return self._thread
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._done.is_set() and self._route_content is not None
+
+    def retry_in(self):
+        """Seconds until the next load attempt after a failure (0 = due now)"""
+        if self._route_content is not None or not self._done.is_set():
+            return None
+        return max(0.0, self._next_attempt - time.monotonic())
+
+    def status(self):
+        retry_in = self.retry_in()
+        return {
+            'ready': self.ready,
+            'warmedUp': self._done.is_set(),
+            'warmupSeconds': self.warmup_seconds,
+            'error': self.error,
+            'attempts': self.attempts,
+            'retryInSeconds': round(retry_in, 1) if retry_in is not None else None,
+        }
+
+    def unavailable(self):
+        """RouterUnavailable for the current state, with when to try again"""
+        if not self._done.is_set():
+            return RouterUnavailable('content_router is still warming up')
+        return RouterUnavailable(self.error or 'content_router not loaded', retry_after=self.retry_in())
+
+    def route_content(self, **kwargs):
+        """Call content_router.route_content; RouterUnavailable until it has loaded."""
+        if self._route_content is None:
+            self.start_warmup()
+            raise self.unavailable()
+        return self._route_content(**kwargs)
+
+
+# One router per process; the processors share it.
+router = ContentRouter()
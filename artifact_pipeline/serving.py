@@ -0,0 +1,167 @@
+"""
+Serving modes for the processor scripts.
+
+SERVE_MODE=dev (the default) keeps the Werkzeug dev server with the
+reloader. SERVE_MODE=production runs the same Flask app under gunicorn:
+
+- SERVE_WORKERS pre-forked processes x SERVE_THREADS threads each
+- preload hooks (e.g. the content_router warm-up) run in the parent before
+  forking, so workers share the loaded models copy-on-write
+- SIGTERM drains gracefully: gunicorn stops accepting, in-flight requests
+  get SERVE_GRACEFUL_TIMEOUT seconds, then shutdown hooks (e.g. the job
+  queue) drain before the worker exits
+- workers are recycled after SERVE_MAX_REQUESTS requests (+ jitter) to
+  contain memory growth
+
+Job queues (async jobs, deferred retries, results waiting to be polled)
+live in the worker's memory, so they only work in one long-lived process:
+the dev server, or production with SERVE_WORKERS=1 and
+SERVE_MAX_REQUESTS=0. Otherwise jobs_enabled() is False and the
+processors refuse job mode (polls would reach workers that never saw the
+job, and a recycled worker drops its results) while synchronous requests
+keep working on every worker.
+
+An external gunicorn can use the app factory instead:
+  gunicorn -c gunicorn.conf.py "artifact_pipeline.serving:create_app('local')"
+"""
+
+import os
+import logging
+import importlib.util
+
+from artifact_pipeline.logs import configure_logging
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVE_MODE = os.environ.get('SERVE_MODE', 'dev').lower()
+SERVE_WORKERS = int(os.environ.get('SERVE_WORKERS', str(os.cpu_count() or 2)))
+SERVE_THREADS = int(os.environ.get('SERVE_THREADS', '8'))
+SERVE_MAX_REQUESTS = int(os.environ.get('SERVE_MAX_REQUESTS', '1000'))  # 0 = never recycle
+SERVE_MAX_REQUESTS_JITTER = int(os.environ.get('SERVE_MAX_REQUESTS_JITTER', '100'))
+SERVE_TIMEOUT = int(os.environ.get('SERVE_TIMEOUT', '120'))
+SERVE_GRACEFUL_TIMEOUT = int(os.environ.get('SERVE_GRACEFUL_TIMEOUT', '30'))
+
+# Processor scripts that create_app() knows how to load
+PROCESSORS = {
+    'local': 'local-artifact-processor.py',
+    'simple': 'simple-artifact-processor.py',
+    'webhook': 'start-local-artifact-processor-simple.py',
+}
+
+JOBS_UNAVAILABLE = (
+    "Async jobs are off: they need a single long-lived worker "
+    "(SERVE_WORKERS=1, SERVE_MAX_REQUESTS=0). Send the request without async"
+)
+
+_preload_hooks = []
+_shutdown_hooks = []
+_wsgi = False  # set by create_app(): an external WSGI server runs the app
+
+
+def on_preload(hook):
+    """Run hook in the parent before workers fork (or before the dev server starts)"""
+    _preload_hooks.append(hook)
+    return hook
+
+
+def on_shutdown(hook):
+    """Run hook(timeout) when a worker exits, after in-flight requests finish"""
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+def jobs_enabled():
+    """True if in-process job queues are safe: everything runs in one long-lived process"""
+    if SERVE_MODE != 'production' and not _wsgi:
+        return True
+    return SERVE_WORKERS == 1 and SERVE_MAX_REQUESTS == 0
+
+
+def run_preload():
+    for hook in _preload_hooks:
+        hook()
+
+
+def run_shutdown(timeout=SERVE_GRACEFUL_TIMEOUT):
+    for hook in _shutdown_hooks:
+        try:
+            hook(timeout)
+        except Exception as e:
+            logger.error(f"❌ Shutdown hook failed: {e}", exc_info=True)
+
+
+def _post_fork(server, worker):
+    # Threads don't survive fork(): restart the queued log listener
+    configure_logging()
+
+
+def _worker_exit(server, worker):
+    logger.info(f"👋 Worker {worker.pid} exiting, draining background work...")
+    run_shutdown()
+
+
+def gunicorn_options(bind='0.0.0.0:8080'):
+    """gunicorn settings for the production mode (also read by gunicorn.conf.py)"""
+    return {
+        'bind': os.environ.get('SERVE_BIND', bind),
+        'workers': SERVE_WORKERS,
+        'threads': SERVE_THREADS,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'max_requests': SERVE_MAX_REQUESTS,
+        'max_requests_jitter': SERVE_MAX_REQUESTS_JITTER,
+        'timeout': SERVE_TIMEOUT,
+        'graceful_timeout': SERVE_GRACEFUL_TIMEOUT,
+        'post_fork': _post_fork,
+        'worker_exit': _worker_exit,
+    }
+
+
+def load_script(name):
+    """Import one of the (hyphen-named) processor scripts as a module"""
+    path = os.path.join(REPO_DIR, PROCESSORS.get(name, name))
+    module_name = os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_app(processor=None):
+    """App factory for WSGI servers: load a processor script and preload it"""
+    global _wsgi
+    _wsgi = True
+    processor = processor or os.environ.get('PROCESSOR', 'local')
+    app = load_script(processor).app
+    run_preload()
+    return app
+
+
+def run(app, port):
+    """Entry point for the processor scripts' __main__ blocks"""
+    if SERVE_MODE != 'production':
+        app.run(host='0.0.0.0', port=port, debug=True)
+        return
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        logger.error("❌ SERVE_MODE=production needs gunicorn (pip install gunicorn)")
+        raise
+
+    class ProcessorApplication(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options(f'0.0.0.0:{port}').items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    run_preload()
+    recycling = f"recycling after ~{SERVE_MAX_REQUESTS} requests" if SERVE_MAX_REQUESTS else "no recycling"
+    logger.info(f"🏭 Production mode: {SERVE_WORKERS} workers x {SERVE_THREADS} threads, {recycling}")
+    if not jobs_enabled():
+        logger.warning("⚠️ Async/webhook jobs are off with several or recycled workers; requests run synchronously")
+    ProcessorApplication().run()
@@ -0,0 +1,58 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+The first caller for a key runs the function; callers that arrive with the
+same key while it is still running wait for that run and share its result
+(or its exception) instead of starting their own.
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counts = {'leaders': 0, 'coalesced': 0}
+
+    def do(self, key, fn):
+        """Return (result, shared) where shared is True if another call's result was reused"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._counts['coalesced'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._counts['leaders'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, 'inFlight': len(self._calls)}
@@ -0,0 +1,178 @@
+"""
+Binary image uploads staged straight to scratch disk.
+
+Raw (application/octet-stream, image/*) and multipart bodies are copied to
+a scratch file in fixed-size chunks while being hashed, so the image never
+has to sit in memory as one string and the cache key is ready as soon as
+the upload finishes.
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_MB', '25')) * 1024 * 1024
+SCRATCH_DIR = os.environ.get('SCRATCH_DIR') or tempfile.gettempdir()
+CHUNK_SIZE = 64 * 1024
+
+# Payload fields that can travel as query parameters / form fields
+METADATA_FIELDS = (
+    'fileId', 'fileName', 'userId', 'twinId', 'uploadedAt', 'contentType', 'noCache', 'detector',
+    'faceAttributes'
+)
+
+
+class InvalidUpload(ValueError):
+    """Raised for an upload the processor can't use (answered with 400)."""
+
+
+class ScratchImage:
+    """An image written to a scratch file, hashed on the way in."""
+
+    def __init__(self, suffix='.jpg', max_bytes=MAX_UPLOAD_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(
+            delete=False, suffix=suffix, dir=SCRATCH_DIR
+        )
+        self.path = self._file.name
+
+    @classmethod
+    def from_bytes(cls, image_bytes, suffix='.jpg'):
+        scratch = cls(suffix=suffix, max_bytes=None)
+        scratch.write(image_bytes)
+        scratch.close()
+        return scratch
+
+    @classmethod
+    def from_stream(cls, stream, suffix='.jpg', max_bytes=MAX_UPLOAD_BYTES):
+        scratch = cls(suffix=suffix, max_bytes=max_bytes)
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                scratch.write(chunk)
+        except Exception:
+            scratch.cleanup()
+            raise
+        scratch.close()
+        return scratch
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise RequestEntityTooLarge(
+                f"Upload exceeds {self.max_bytes // (1024 * 1024)} MB limit"
+            )
+        self._sha256.update(chunk)
+        return self._file.write(chunk)
+
+    def set_suffix(self, suffix):
+        """Rename the (closed) scratch file so its extension matches the content"""
+        root, current = os.path.splitext(self.path)
+        if current == suffix:
+            return
+        self.close()
+        os.rename(self.path, root + suffix)
+        self.path = root + suffix
+
+    def read_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def __getattr__(self, name):
+        # Werkzeug's multipart parser treats this as a file (seek, read, ...)
+        if name == '_file':
+            raise AttributeError(name)
+        return getattr(self._file, name)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def cleanup(self):
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadRequest(Request):
+    """Flask request class that spools multipart file parts into ScratchImage"""
+
+    @property
+    def max_content_length(self):
+        # Only binary uploads are capped here; JSON bodies keep the app limit
+        if is_binary_upload(self) or is_multipart_upload(self):
+            return MAX_UPLOAD_BYTES + 1024 * 1024  # room for form fields
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        scratch = ScratchImage()
+        # Tracked so a parse that fails half way can still remove them
+        self.__dict__.setdefault('scratch_files', []).append(scratch)
+        return scratch
+
+    def discard_scratch_files(self, keep=None):
+        """Remove every multipart scratch file except keep"""
+        for scratch in self.__dict__.get('scratch_files', ()):
+            if scratch is not keep:
+                scratch.cleanup()
+
+
+def is_binary_upload(req):
+    return req.mimetype == 'application/octet-stream' or req.mimetype.startswith('image/')
+
+
+def is_multipart_upload(req):
+    return req.mimetype == 'multipart/form-data'
+
+
+def read_upload(req):
+    """Stage a raw or multipart upload; returns (payload, ScratchImage)
+
+    Raises InvalidUpload for a multipart body without a file part and
+    RequestEntityTooLarge past MAX_UPLOAD_MB; no scratch file is left behind
+    either way.
+    """
+    if is_multipart_upload(req):
+        scratch = None
+        try:
+            file = req.files.get('file') or req.files.get('image')
+            if file is None:
+                raise InvalidUpload("Multipart upload needs a 'file' part")
+            data = {field: req.form[field] for field in METADATA_FIELDS if field in req.form}
+            data.setdefault('fileName', file.filename)
+            if file.mimetype and file.mimetype != 'application/octet-stream':
+                data.setdefault('contentType', file.mimetype)
+            file.stream.close()
+            scratch = file.stream
+        finally:
+            # Parts we won't use, or all of them if parsing failed part way
+            if isinstance(req, UploadRequest):
+                req.discard_scratch_files(keep=scratch)
+    else:
+        data = {field: req.args[field] for field in METADATA_FIELDS if field in req.args}
+        if req.mimetype.startswith('image/'):
+            data.setdefault('contentType', req.mimetype)
+        scratch = ScratchImage.from_stream(req.stream)
+
+    if isinstance(data.get('noCache'), str):
+        data['noCache'] = data['noCache'].lower() == 'true'
+    data.setdefault('contentType', 'image/jpeg')
+    logger.info(f"📥 Staged {scratch.size} byte upload to {scratch.path}")
+    return data, scratch
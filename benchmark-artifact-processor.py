@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Load generator for the artifact processor endpoints.
+
+Replays a corpus of local images against /process-artifact or
+/process-webhook, either closed-loop (--concurrency N workers sending
+back-to-back) or open-loop (--rate R requests/second, latency measured from
+the scheduled send time so a slow server can't hide queueing).
+
+Upload modes:
+  base64  JSON body with imageData (what the frontend sends today)
+  url     JSON body with fileUrl, served from a built-in local HTTP server
+  raw     application/octet-stream body with metadata in the query string
+
+Reports p50/p95/p99 latency, throughput, error rate and (with --server-pid)
+the server's RSS, and writes everything to a JSON file tagged with the git
+commit so runs can be compared (--compare previous.json).
+
+Works offline against the mock backends, e.g.
+  ARTIFACT_BACKEND=mock RESULT_CACHE_ENABLED=false python3 local-artifact-processor.py &
+  python3 benchmark-artifact-processor.py --mode raw --concurrency 16 --duration 30 --server-pid $!
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import argparse
+import threading
+import subprocess
+import http.server
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+CONTENT_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp'}
+
+
+def load_corpus(path):
+    """All images under path, as (name, content type, bytes)"""
+    corpus = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            ext = os.path.splitext(name)[1].lower()
+            if ext in IMAGE_EXTENSIONS:
+                with open(os.path.join(root, name), 'rb') as f:
+                    corpus.append((name, CONTENT_TYPES[ext], f.read()))
+    return corpus
+
+
+def serve_corpus(corpus):
+    """Serve the corpus over HTTP for --mode url; returns the base URL"""
+    blobs = {f'/{i}/{name}': (content_type, body) for i, (name, content_type, body) in enumerate(corpus)}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            blob = blobs.get(self.path)
+            if blob is None:
+                self.send_error(404)
+                return
+            content_type, body = blob
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class RequestBuilder:
+    """Turns corpus item i into the (url, kwargs) for one request"""
+
+    def __init__(self, args, corpus):
+        self.args = args
+        self.corpus = corpus
+        self.encoded = [base64.b64encode(body).decode('ascii') for _, _, body in corpus]
+        self.blob_base = serve_corpus(corpus) if args.mode == 'url' or args.endpoint == '/process-webhook' else None
+
+    def build(self, i):
+        index = i % len(self.corpus)
+        name, content_type, body = self.corpus[index]
+        # Unique ids so the server's single-flight doesn't merge our requests
+        file_id = f'bench_{uuid.uuid4().hex[:12]}'
+        fields = {
+            'fileId': file_id,
+            'fileName': name,
+            'contentType': content_type,
+            'userId': 'bench_user',
+            'twinId': 'bench_twin',
+        }
+        if self.args.no_cache:
+            fields['noCache'] = True
+        url = self.args.url.rstrip('/') + self.args.endpoint
+        params = {'embedding': self.args.embedding} if self.args.embedding else {}
+
+        if self.args.endpoint == '/process-webhook':
+            fields['fileUrl'] = f'{self.blob_base}/{index}/{name}'
+            return url, {'json': fields, 'params': params}
+        if self.args.mode == 'raw':
+            params.update({k: str(v).lower() if isinstance(v, bool) else v for k, v in fields.items()})
+            return url, {
+                'data': body, 'params': params,
+                'headers': {'Content-Type': 'application/octet-stream'}
+            }
+        if self.args.mode == 'url':
+            fields['fileUrl'] = f'{self.blob_base}/{index}/{name}'
+        else:
+            fields['imageData'] = self.encoded[index]
+        return url, {'json': fields, 'params': params}
+
+
+class RssSampler:
+    """Samples a process's resident set size from /proc while the run lasts"""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read_rss(self):
+        total = 0
+        # The server and (under gunicorn) its worker children
+        pids = [self.pid]
+        try:
+            with open(f'/proc/{self.pid}/task/{self.pid}/children') as f:
+                pids += [int(p) for p in f.read().split()]
+        except OSError:
+            pass
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            total += int(line.split()[1]) * 1024
+            except OSError:
+                continue
+        return total or None
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = self._read_rss()
+            if rss:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if not self.samples:
+            return None
+        return {
+            'startBytes': self.samples[0],
+            'peakBytes': max(self.samples),
+            'endBytes': self.samples[-1],
+            'meanBytes': int(sum(self.samples) / len(self.samples)),
+        }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def run_load(args, builder):
+    """Send requests until --requests or --duration is reached; returns samples"""
+    samples = []
+    lock = threading.Lock()
+    local = threading.local()
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    counter = iter(range(args.requests or sys.maxsize))
+
+    def send(i, scheduled):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        url, kwargs = builder.build(i)
+        sent = time.perf_counter()
+        status, error, size = None, None, 0
+        try:
+            response = session.post(url, timeout=args.timeout, **kwargs)
+            status = response.status_code
+            size = len(response.content)
+            if status >= 400:
+                error = f'HTTP {status}'
+        except requests.RequestException as e:
+            error = type(e).__name__
+        done = time.perf_counter()
+        with lock:
+            samples.append({
+                'latency': done - (scheduled if scheduled is not None else sent),
+                'status': status,
+                'error': error,
+                'bytes': size,
+                'finished': done,
+            })
+
+    def next_index():
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        return next(counter, None)
+
+    if args.rate:
+        # Open loop: fire on schedule whatever the server is doing
+        interval = 1.0 / args.rate
+        with ThreadPoolExecutor(max_workers=args.max_inflight) as pool:
+            start = time.perf_counter()
+            n = 0
+            while True:
+                i = next_index()
+                if i is None:
+                    break
+                scheduled = start + n * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, i, scheduled)
+                n += 1
+    else:
+        # Closed loop: N workers, each sends as soon as its last response arrives
+        def worker():
+            while True:
+                with lock:
+                    i = next_index()
+                if i is None:
+                    return
+                send(i, None)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return samples
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s['latency'] for s in samples)
+    errors = [s for s in samples if s['error']]
+    by_error = {}
+    for s in errors:
+        by_error[s['error']] = by_error.get(s['error'], 0) + 1
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'requests': len(samples),
+        'errors': len(errors),
+        'errorRate': round(len(errors) / len(samples), 4) if samples else None,
+        'errorsByType': by_error,
+        'elapsedSeconds': round(elapsed, 3),
+        'throughputRps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'latencyMs': {
+            'min': ms(latencies[0]) if latencies else None,
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(latencies[-1]) if latencies else None,
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+        },
+        'meanResponseBytes': int(sum(s['bytes'] for s in samples) / len(samples)) if samples else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(result, baseline=None):
+    summary = result['summary']
+    lat = summary['latencyMs']
+    print(f"\n📊 {summary['requests']} requests in {summary['elapsedSeconds']}s "
+          f"({summary['throughputRps']} req/s)")
+    print(f"   latency ms  p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"   errors      {summary['errors']} ({(summary['errorRate'] or 0):.1%}) {summary['errorsByType'] or ''}")
+    if result.get('serverRss'):
+        rss = result['serverRss']
+        print(f"   server RSS  start {rss['startBytes'] / 2**20:.1f} MB  peak {rss['peakBytes'] / 2**20:.1f} MB  "
+              f"end {rss['endBytes'] / 2**20:.1f} MB")
+
+    if baseline:
+        before = baseline['summary']
+        print(f"\n🔁 vs {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')})")
+        for label, old, new in (
+            ('throughput rps', before['throughputRps'], summary['throughputRps']),
+            ('p50 ms', before['latencyMs']['p50'], lat['p50']),
+            ('p95 ms', before['latencyMs']['p95'], lat['p95']),
+            ('p99 ms', before['latencyMs']['p99'], lat['p99']),
+            ('error rate', before['errorRate'], summary['errorRate']),
+        ):
+            if old and new is not None:
+                print(f"   {label:<15}{old:>10} -> {new:<10} ({(new - old) / old:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the artifact processor endpoints')
+    parser.add_argument('--url', default='http://localhost:8080', help='processor base URL')
+    parser.add_argument('--endpoint', default='/process-artifact',
+                        choices=('/process-artifact', '/process-webhook'))
+    parser.add_argument('--mode', default='base64', choices=('base64', 'url', 'raw'))
+    parser.add_argument('--corpus', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'images'),
+                        help='directory of images to replay')
+    parser.add_argument('--concurrency', type=int, default=8, help='closed-loop workers')
+    parser.add_argument('--rate', type=float, help='open-loop requests/second (overrides --concurrency)')
+    parser.add_argument('--max-inflight', type=int, default=256, help='open-loop cap on outstanding requests')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run (0 = until --requests)')
+    parser.add_argument('--requests', type=int, help='stop after this many requests')
+    parser.add_argument('--warmup', type=int, default=0, help='requests to send (and discard) first')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--embedding', help='ask for a packed embedding encoding (f32, f16, int8)')
+    parser.add_argument('--no-cache', action='store_true', help='send noCache so the result cache is bypassed')
+    parser.add_argument('--server-pid', type=int, help='sample this process\'s RSS (Linux /proc)')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='previous results JSON to compare against')
+    parser.add_argument('--label', help='free-form label stored with the results')
+    args = parser.parse_args()
+
+    if not args.duration and not args.requests:
+        parser.error('need --duration or --requests')
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        parser.error(f'no images found under {args.corpus}')
+    builder = RequestBuilder(args, corpus)
+
+    print(f"🚀 {args.endpoint} ({args.mode}) at {args.url} with {len(corpus)} images, "
+          + (f"{args.rate} req/s open-loop" if args.rate else f"{args.concurrency} concurrent"))
+
+    if args.warmup:
+        warmup_args = argparse.Namespace(**{**vars(args), 'requests': args.warmup, 'duration': 0, 'rate': None})
+        run_load(warmup_args, builder)
+
+    sampler = RssSampler(args.server_pid) if args.server_pid else None
+    if sampler:
+        sampler.start()
+    started = time.perf_counter()
+    samples = run_load(args, builder)
+    elapsed = time.perf_counter() - started
+    rss = sampler.stop() if sampler else None
+
+    result = {
+        'timestamp': datetime.now().isoformat(),
+        'commit': git_commit(),
+        'label': args.label,
+        'config': {
+            'url': args.url, 'endpoint': args.endpoint, 'mode': args.mode,
+            'concurrency': None if args.rate else args.concurrency, 'rate': args.rate,
+            'duration': args.duration, 'requests': args.requests, 'embedding': args.embedding,
+            'noCache': args.no_cache, 'corpusImages': len(corpus),
+            'corpusBytes': sum(len(body) for _, _, body in corpus),
+        },
+        'summary': summarize(samples, elapsed),
+        'serverRss': rss,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Compare face-detection backends against recorded Rekognition output.
+
+For every image in --corpus, runs each --detector in-process and matches
+its faces to the recorded Rekognition faces by bounding-box IoU. Reports
+per backend: precision, recall, F1, mean IoU of matched faces, and latency
+(p50/p95/mean).
+
+Recordings live in --recorded as <image sha256>.json or <image name>.json,
+or are the files REKOGNITION_MODE=record writes (<sha256>.detect_faces.<attributes>.json).
+They may hold a raw DetectFaces response ({"FaceDetails": [...]}), a
+content_router result ({"analysis": {"faces": [...]}}) or a bare face
+list. Images without a recording are only timed.
+
+  LOCAL_FACE_DETECTOR_MODEL=models/face_detection_yunet.onnx \\
+  python3 benchmark-detectors.py --corpus photos/ --recorded recordings/ \\
+      --detector local --detector mock --json detectors.json
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+from artifact_pipeline import detectors, preprocess
+from artifact_pipeline.pipeline import DEFAULT_OPTIONS
+from artifact_pipeline.uploads import ScratchImage
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def load_corpus(path):
+    images = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                images.append(os.path.join(root, name))
+    return images
+
+
+def box_of(face):
+    box = face.get('boundingBox') or face.get('BoundingBox') or {}
+    return (box.get('Left', 0), box.get('Top', 0), box.get('Width', 0), box.get('Height', 0))
+
+
+def load_recording(recorded_dir, image_path, hashes):
+    """Recorded faces for an image as a list of boxes, or None
+
+    hashes are the sha256s of the original file and of what was sent to
+    detection (they differ after preprocessing).
+    """
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    candidates = [
+        name for sha in hashes
+        for name in (f'{sha}.detect_faces.default', f'{sha}.detect_faces.all', sha)
+    ] + [stem, os.path.basename(image_path)]
+    for name in candidates:
+        path = os.path.join(recorded_dir, f'{name}.json')
+        if os.path.exists(path):
+            break
+    else:
+        return None
+    with open(path) as f:
+        recording = json.load(f)
+    if isinstance(recording, dict):
+        if 'response' in recording:
+            recording = recording['response']
+        faces = recording.get('FaceDetails') or (recording.get('analysis') or {}).get('faces') \
+            or recording.get('faces') or []
+    else:
+        faces = recording
+    return [box_of(face) for face in faces]
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0.0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0.0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(expected, found, threshold):
+    """Greedy one-to-one matching by IoU; returns the IoUs of matched pairs"""
+    pairs = sorted(
+        ((iou(e, f), i, j) for i, e in enumerate(expected) for j, f in enumerate(found)),
+        reverse=True
+    )
+    used_expected, used_found, matched = set(), set(), []
+    for score, i, j in pairs:
+        if score < threshold:
+            break
+        if i in used_expected or j in used_found:
+            continue
+        used_expected.add(i)
+        used_found.add(j)
+        matched.append(score)
+    return matched
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def run_detector(name, images, args):
+    backend = detectors.get(name)
+    totals = {'expected': 0, 'found': 0, 'matched': 0, 'ious': [], 'latencies': [], 'unrecorded': 0, 'errors': 0}
+    for image_path in images:
+        upload = ScratchImage.from_bytes(open(image_path, 'rb').read(), suffix=os.path.splitext(image_path)[1])
+        prepared = preprocess.prepare(upload) if args.preprocess else None
+        sent_path = prepared.path if prepared else upload.path
+        with open(sent_path, 'rb') as f:
+            hashes = (upload.sha256, hashlib.sha256(f.read()).hexdigest())
+        try:
+            started = time.perf_counter()
+            result = backend.route_content(
+                file_path=sent_path,
+                content_type=prepared.content_type if prepared else None,
+                options=dict(DEFAULT_OPTIONS, generate_embeddings=not args.no_embeddings),
+                metadata={'artifact_id': os.path.basename(image_path)}
+            )
+            totals['latencies'].append(time.perf_counter() - started)
+        except Exception as e:
+            print(f"   ❌ {name} failed on {image_path}: {e}")
+            totals['errors'] += 1
+            continue
+        finally:
+            if prepared:
+                prepared.cleanup()
+            upload.cleanup()
+
+        found = [box_of(face) for face in (result.get('analysis') or {}).get('faces') or []]
+        expected = load_recording(args.recorded, image_path, hashes) if args.recorded else None
+        if expected is None:
+            totals['unrecorded'] += 1
+            continue
+        matched = match(expected, found, args.iou)
+        totals['expected'] += len(expected)
+        totals['found'] += len(found)
+        totals['matched'] += len(matched)
+        totals['ious'].extend(matched)
+        if args.verbose:
+            print(f"   {os.path.basename(image_path)}: expected {len(expected)}, found {len(found)}, matched {len(matched)}")
+
+    latencies = sorted(totals['latencies'])
+    precision = totals['matched'] / totals['found'] if totals['found'] else None
+    recall = totals['matched'] / totals['expected'] if totals['expected'] else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else None
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'detector': name,
+        'status': backend.status(),
+        'images': len(images),
+        'errors': totals['errors'],
+        'unrecorded': totals['unrecorded'],
+        'expectedFaces': totals['expected'],
+        'foundFaces': totals['found'],
+        'matchedFaces': totals['matched'],
+        'precision': round(precision, 4) if precision is not None else None,
+        'recall': round(recall, 4) if recall is not None else None,
+        'f1': round(f1, 4) if f1 is not None else None,
+        'meanIou': round(sum(totals['ious']) / len(totals['ious']), 4) if totals['ious'] else None,
+        'latencyMs': {
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare face detectors against recorded Rekognition output')
+    parser.add_argument('--corpus', required=True, help='directory of images')
+    parser.add_argument('--recorded', help='directory of recorded Rekognition responses')
+    parser.add_argument('--detector', action='append', choices=detectors.DETECTORS,
+                        help='backend to evaluate (repeatable, default: local)')
+    parser.add_argument('--iou', type=float, default=0.5, help='IoU needed to count a match')
+    parser.add_argument('--preprocess', action='store_true', help='run the preprocess stage first, as the server does')
+    parser.add_argument('--no-embeddings', action='store_true', help='time detection without embeddings')
+    parser.add_argument('--json', help='write results JSON here')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    images = load_corpus(args.corpus)
+    if not images:
+        parser.error(f'no images found under {args.corpus}')
+
+    results = []
+    for name in args.detector or ['local']:
+        print(f"🔍 {name}: {len(images)} images")
+        try:
+            results.append(run_detector(name, images, args))
+        except detectors.DetectorUnavailable as e:
+            print(f"   ⚠️ skipped: {e}")
+
+    print(f"\n{'detector':<10}{'precision':>10}{'recall':>8}{'f1':>8}{'IoU':>8}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for r in results:
+        def cell(value, width):
+            return f"{'-' if value is None else value:>{width}}"
+        print(f"{r['detector']:<10}{cell(r['precision'], 10)}{cell(r['recall'], 8)}{cell(r['f1'], 8)}"
+              f"{cell(r['meanIou'], 8)}{cell(r['latencyMs']['p50'], 10)}{cell(r['latencyMs']['p95'], 10)}"
+              f"{r['errors']:>8}")
+    if results and results[0]['unrecorded']:
+        print(f"\nℹ️ {results[0]['unrecorded']} images had no recording (timed only)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'iou': args.iou, 'preprocess': args.preprocess, 'results': results}, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
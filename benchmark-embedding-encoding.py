@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark the embedding wire encodings offered by the artifact processors.
+
+For each encoding (json, f32, f16, int8) this measures, over a response
+with N faces of 512-d embeddings:
+  - serialized JSON size
+  - encode time (pack + json.dumps) and decode time (json.loads + unpack)
+  - cosine-similarity error against the original float vectors
+
+Usage: python3 benchmark-embedding-encoding.py [--faces 10] [--dim 512] [--runs 50] [--json out.json]
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import argparse
+
+from artifact_pipeline import embeddings
+
+
+def random_embedding(dim, rng):
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector]
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def benchmark(encoding, response, vectors, runs):
+    encode_times = []
+    decode_times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        body = json.dumps(embeddings.encode_embeddings(response, encoding))
+        encode_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        parsed = json.loads(body)
+        decoded = [embeddings.decode_vector(face['embedding']) for face in parsed['analysis']['faces']]
+        decode_times.append(time.perf_counter() - started)
+
+    errors = [1 - cosine(original, roundtrip) for original, roundtrip in zip(vectors, decoded)]
+    return {
+        'encoding': encoding,
+        'bytes': len(body.encode('utf-8')),
+        'encodeMs': round(sorted(encode_times)[len(encode_times) // 2] * 1000, 3),
+        'decodeMs': round(sorted(decode_times)[len(decode_times) // 2] * 1000, 3),
+        'meanCosineError': max(sum(errors) / len(errors), 0.0),
+        'maxCosineError': max(max(errors), 0.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--faces', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='also write results to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vectors = [random_embedding(args.dim, rng) for _ in range(args.faces)]
+    response = {
+        'analysis': {
+            'faces': [
+                {'faceId': f'face_{i}', 'confidence': 99.0, 'embedding': vector}
+                for i, vector in enumerate(vectors)
+            ]
+        }
+    }
+
+    print(f"📊 {args.faces} faces x {args.dim}-d embeddings, median of {args.runs} runs\n")
+    print(f"{'encoding':<10}{'bytes':>10}{'vs json':>9}{'encode ms':>11}{'decode ms':>11}{'mean cos err':>15}{'max cos err':>14}")
+    results = [benchmark(encoding, response, vectors, args.runs) for encoding in embeddings.ENCODINGS]
+    baseline = results[0]['bytes']
+    for r in results:
+        print(
+            f"{r['encoding']:<10}{r['bytes']:>10}{r['bytes'] / baseline:>8.0%} "
+            f"{r['encodeMs']:>10.3f} {r['decodeMs']:>10.3f}"
+            f"{r['meanCosineError']:>15.2e}{r['maxCosineError']:>14.2e}"
+        )
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'faces': args.faces, 'dim': args.dim, 'runs': args.runs, 'results': results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import subprocess
-import time
 import base64
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -8,6 +7,8 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from screenshot_pipeline import readiness
+
 def take_screenshot():
     options = Options()
     options.add_argument('--headless')
@@ -22,8 +23,13 @@ def take_screenshot():
         print("📸 Navigating to My Files page...")
         driver.get('http://localhost:8357/pages/my-files.html')
         
-        # Wait for page to load
-        time.sleep(5)
+        # Wait for the page to settle instead of a fixed 5 s: network quiet,
+        # web fonts loaded, and the file list out of its loading state
+        report = readiness.wait_until_ready_sync(driver, readiness.parse({
+            'predicate': "!document.getElementById('loadingState') || "
+                         "document.getElementById('loadingState').offsetParent === null"
+        }))
+        print(f"⏱️ Page ready after {report['waitedMs']} ms {report['steps']}")
         
         # Take screenshot
         driver.save_screenshot('my-files-current-state.png')
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
-"""Direct AWS Rekognition test to verify it works"""
+"""Direct AWS Rekognition test to verify it works
+
+Usage: python3 direct-aws-test.py [DEFAULT|ALL]
+(REKOGNITION_MODE=record / replay to save or reuse the response)
+"""
 
 import sys
 import os
-import boto3
 import base64
 import json
 
@@ -12,19 +15,16 @@ sys.path.insert(0, '/home/tim/current-projects/ArtifactProcessor')
 import dotenv
 dotenv.load_dotenv('/home/tim/credentials/.env')
 
-# Initialize AWS
-region = os.getenv('AWS_REGION', 'us-east-1')
+# Shared client: pooled, adaptive retries, rate limited (reads AWS_* from the environment)
+from artifact_pipeline.rekognition import client as rekognition
+
 access_key = os.getenv('AWS_ACCESS_KEY_ID')
 secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
 
 print(f"AWS credentials check - Access Key exists: {bool(access_key)}, Secret Key exists: {bool(secret_key)}")
 
-rekognition = boto3.client(
-    'rekognition',
-    region_name=region,
-    aws_access_key_id=access_key,
-    aws_secret_access_key=secret_key
-)
+# DEFAULT is faster and lighter; ALL adds emotions, age, gender, ...
+attributes = sys.argv[1].upper() if len(sys.argv) > 1 else 'DEFAULT'
 
 # Read test image
 with open('/home/tim/wsl-test-images/test-image1.jpg', 'rb') as f:
@@ -34,10 +34,7 @@ print(f"Image size: {len(image_bytes)} bytes")
 
 # Test face detection
 try:
-    response = rekognition.detect_faces(
-        Image={'Bytes': image_bytes},
-        Attributes=['ALL']
-    )
+    response = rekognition.detect_faces(image_bytes, attributes=attributes)
     
     faces = response.get('FaceDetails', [])
     print(f"\n✅ AWS Rekognition detected {len(faces)} faces")
@@ -46,9 +43,11 @@ try:
         print("\nFirst face details:")
         face = faces[0]
         print(f"  Confidence: {face.get('Confidence', 0):.2f}%")
-        print(f"  Age Range: {face.get('AgeRange', {}).get('Low', 0)}-{face.get('AgeRange', {}).get('High', 0)}")
-        print(f"  Gender: {face.get('Gender', {}).get('Value', 'Unknown')} ({face.get('Gender', {}).get('Confidence', 0):.2f}%)")
-        print(f"  Emotions: {[f'{e['Type']} ({e['Confidence']:.1f}%)' for e in face.get('Emotions', [])[:3]]}")
+        if attributes == 'ALL':
+            print(f"  Age Range: {face.get('AgeRange', {}).get('Low', 0)}-{face.get('AgeRange', {}).get('High', 0)}")
+            print(f"  Gender: {face.get('Gender', {}).get('Value', 'Unknown')} ({face.get('Gender', {}).get('Confidence', 0):.2f}%)")
+            emotions = [f"{e['Type']} ({e['Confidence']:.1f}%)" for e in face.get('Emotions', [])[:3]]
+            print(f"  Emotions: {emotions}")
         
 except Exception as e:
     print(f"\n❌ Error: {e}")
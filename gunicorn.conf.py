@@ -0,0 +1,11 @@
+"""
+gunicorn settings for the artifact processors, e.g.
+
+  gunicorn -c gunicorn.conf.py "artifact_pipeline.serving:create_app('local')"
+
+Tuned with the SERVE_* environment variables (see artifact_pipeline/serving.py).
+"""
+
+from artifact_pipeline.serving import gunicorn_options
+
+globals().update(gunicorn_options())
@@ -76,7 +76,9 @@ export async function extractAllFaces(imageUrl, faces) {
     
     const facePromises = faces.map(async (face, index) => {
         try {
-            const faceDataUrl = await extractFaceFromImage(imageUrl, face.BoundingBox || face.boundingBox);
+            // Crops made by the processor at detection time; no need to download the original
+            const faceDataUrl = face.thumbnailUrl
+                || await extractFaceFromImage(imageUrl, face.BoundingBox || face.boundingBox);
             return {
                 index: index,
                 dataUrl: faceDataUrl,
@@ -6,26 +6,30 @@ Local artifact processor with working content_router for testing
 import sys
 import os
 import json
+import time
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 
-# Add the artifact processor to Python path
-sys.path.insert(0, '/home/tim/current-projects/ArtifactProcessor')
-sys.path.insert(0, '/home/tim/current-projects/ArtifactProcessor/artifact_processor')
+from artifact_pipeline import batch, breaker, crops, detectors, embeddings, pipeline, serving, uploads
+from artifact_pipeline.jobs import JobQueue, QueueFull
+from artifact_pipeline.logs import configure_logging, log_payload
+from artifact_pipeline.metrics import instrument_app, registry, stage
+from artifact_pipeline.router import router
 
-# Store original directory for later
-original_cwd = os.getcwd()
-
-# Set up detailed logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Set up detailed logging (LOG_FORMAT=json for structured, size-capped output)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# Stream raw/multipart image uploads straight to scratch files
+app.request_class = uploads.UploadRequest
 CORS(app)
+# Per-stage timings, payload sizes and errors at /metrics (+ OTEL spans if configured)
+instrument_app(app, 'local-artifact-processor')
+# Face crops and thumbnails made at detection time: /faces/<key>.jpg, /thumbnails/<key>.jpg
+app.register_blueprint(crops.blueprint)
 
 # Set up credentials
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = '/home/tim/credentials/infitwin-e18a0d2082de.json'
@@ -40,142 +44,185 @@ if os.environ.get('AWS_ACCESS_KEY_ID'):
 else:
     logger.warning("⚠️ AWS credentials not found in environment")
 
+# Load content_router (and its ML/AWS clients) once, off the request path.
+# Under gunicorn the warm-up is finished in the parent before workers fork.
+if pipeline.ARTIFACT_BACKEND == 'router':
+    router.start_warmup()
+    serving.on_preload(router.load)
+
+# Background job mode: bounded worker pool for POST /process-artifact?async=true
+jobs = JobQueue(
+    pipeline.process_artifact,
+    workers=int(os.environ.get('JOB_WORKERS', '4')),
+    max_queue=int(os.environ.get('JOB_QUEUE_SIZE', '100')),
+    name='artifact-jobs'
+)
+serving.on_shutdown(jobs.shutdown)
+
+@breaker.on_state_change
+def resume_deferred(name, state):
+    """Feed jobs deferred during an outage back in as the backend recovers"""
+    if state == breaker.HALF_OPEN:
+        jobs.requeue_deferred(limit=1)  # the trial call
+    elif state == breaker.CLOSED:
+        jobs.requeue_deferred()
+
+# Batch mode: how many items of one /process-artifacts request run at once
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '8'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', '32'))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '500'))
+
+registry.gauge('artifact_job_queue_depth', 'Jobs waiting for a worker',
+               lambda: jobs.stats()['queueDepth'])
+registry.gauge('artifact_job_active_workers', 'Workers currently running a job',
+               lambda: jobs.stats()['activeWorkers'])
+registry.gauge('artifact_cache_hits', 'Result cache hits (memory + disk)',
+               lambda: pipeline.cache_stats().get('memoryHits', 0) + pipeline.cache_stats().get('diskHits', 0))
+registry.gauge('artifact_cache_misses', 'Result cache misses',
+               lambda: pipeline.cache_stats().get('misses'))
+registry.gauge('artifact_coalesced_requests', 'Requests that joined an identical in-flight run',
+               lambda: pipeline.in_flight_stats()['coalesced'])
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({
         "status": "healthy",
-        "service": "local-artifact-processor-with-content-router"
+        "service": "local-artifact-processor-with-content-router",
+        "jobs": jobs.stats(),
+        "cache": pipeline.cache_stats(),
+        "fetcher": pipeline.fetch_stats(),
+        "inFlight": pipeline.in_flight_stats(),
+        "backend": pipeline.backend_status(),
+        "breakers": breaker.stats(),
+        "crops": pipeline.crop_stats()
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe - only ready once content_router has warmed up"""
+    status = pipeline.backend_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.errorhandler(embeddings.UnknownEncoding)
+def unknown_encoding(e):
+    return jsonify({
+        "result": {"success": False, "error": str(e)}
+    }), 400
+
+def embedding_encoding():
+    """Embedding wire format asked for with ?embedding= or the Accept header"""
+    return embeddings.negotiate(request.args, request.headers.get('Accept'))
+
+def wants_async():
+    """Job mode is requested with ?async=true or 'Prefer: respond-async'"""
+    if request.args.get('async', 'false').lower() == 'true':
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
 @app.route('/process-artifact', methods=['POST'])
 def process_artifact():
     """Process artifact using the real content_router with Firebase updates"""
+    encoding = embedding_encoding()
+    upload = None
     try:
         logger.info("🚀 Received process-artifact request")
         
-        # Log request details
-        data = request.get_json()
-        logger.info(f"📤 Request payload: {json.dumps(data, indent=2)}")
+        if uploads.is_binary_upload(request) or uploads.is_multipart_upload(request):
+            # Binary body: streamed to a scratch file, metadata from query/form
+            with stage('upload'):
+                data, upload = uploads.read_upload(request)
+            log_payload(logger, "📤 Upload metadata", data)
+        else:
+            # Log request details
+            data = request.get_json()
+            log_payload(logger, "📤 Request payload", data)
         
-        if not data:
+        if not data and upload is None:
             return jsonify({
                 "result": {"success": False, "error": "No data provided"}
             }), 400
+        if not isinstance(data, dict):
+            return jsonify({
+                "result": {"success": False, "error": "Request body must be a JSON object"}
+            }), 400
 
-        # Extract file info
-        file_url = data.get('fileUrl')
-        image_data_b64 = data.get('imageData')  # Base64 encoded image
-        content_type = data.get('contentType', 'image/jpeg')
-        file_id = data.get('fileId')
-        user_id = data.get('userId')
-        twin_id = data.get('twinId')
-        
-        logger.info(f"🔍 Processing: {file_id}")
-        logger.info(f"🔍 User: {user_id}, Twin: {twin_id}")
-        
-        # Handle image data (base64 or URL)
-        import tempfile
-        import base64
-        
-        if image_data_b64:
-            logger.info("📥 Using provided base64 image data...")
+        # Reject an unknown 'detector' before queueing anything
+        detectors.resolve(data.get('detector'))
+
+        if wants_async():
+            if not serving.jobs_enabled():
+                if upload is not None:
+                    upload.cleanup()
+                return jsonify({
+                    "result": {"success": False, "error": serving.JOBS_UNAVAILABLE}
+                }), 501
             try:
-                image_bytes = base64.b64decode(image_data_b64)
-                logger.info(f"📊 Decoded image: {len(image_bytes)} bytes")
-            except Exception as e:
-                raise Exception(f"Failed to decode base64 image: {e}")
-        elif file_url:
-            logger.info(f"📥 Downloading image from: {file_url}")
-            import requests
-            
-            response = requests.get(file_url)
-            if response.status_code != 200:
-                raise Exception(f"Failed to download image: {response.status_code}")
-            image_bytes = response.content
-        else:
-            raise Exception("No image data provided (need fileUrl or imageData)")
-        
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            temp_file.write(image_bytes)
-            temp_file_path = temp_file.name
-        
-        logger.info(f"📁 Image saved to: {temp_file_path}")
+                job = jobs.submit(data, upload=upload)
+            except QueueFull as e:
+                if upload is not None:
+                    upload.cleanup()
+                logger.warning(f"⚠️ {e}")
+                return jsonify({
+                    "result": {"success": False, "error": str(e)}
+                }), 429, {"Retry-After": "5"}
+            logger.info(f"📬 Queued job {job.id} for {data.get('fileId')}")
+            upload = None  # the job owns it now
+            return jsonify(job.to_dict()), 202, {"Location": f"/jobs/{job.id}"}
+
+        try:
+            result = pipeline.process_artifact(data, upload=upload)
+        except pipeline.DetectionDeferred as e:
+            upload = e.kwargs.get('upload')
+            # Backend down: park the request and run it once the backend is back
+            try:
+                if not serving.jobs_enabled():
+                    # No job to park it in: the caller retries instead
+                    raise QueueFull(str(e))
+                job = jobs.defer(data, error=str(e), **e.kwargs)
+            except QueueFull as full:
+                if upload is not None:
+                    upload.cleanup()
+                return jsonify({
+                    "result": {"success": False, "status": "deferred", "error": str(full)}
+                }), 503, {"Retry-After": str(int(e.retry_after or 30))}
+            upload = None  # the deferred job owns it now
+            return jsonify({
+                "result": {
+                    "success": False,
+                    "status": "deferred",
+                    "error": str(e),
+                    "jobId": job.id,
+                    "statusUrl": f"/jobs/{job.id}"
+                }
+            }), 202, {"Location": f"/jobs/{job.id}", "Retry-After": str(int(e.retry_after or 30))}
         
-        # Now use the real content_router
-        logger.info("🔧 Importing content_router...")
+        log_payload(logger, "✅ content_router result", result)
         
-        # Import with proper path setup
-        try:
-            # Change directory temporarily for imports
-            saved_cwd = os.getcwd()
-            os.chdir('/home/tim/current-projects/ArtifactProcessor/artifact_processor')
-            
-            from content_router import route_content
-            logger.info("✅ content_router imported successfully")
-            
-            # Change back
-            os.chdir(saved_cwd)
-        except Exception as e:
-            logger.error(f"❌ Failed to import content_router: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            # Fall back to mock response
+        # Return the result
+        with stage('serialize'):
             return jsonify({
                 "result": {
                     "success": True,
-                    "data": {
-                        "analysis": {
-                            "faces": [{"faceId": "mock_face", "confidence": 95.0}],
-                            "embedding": [0.1] * 512
-                        }
-                    }
+                    "data": embeddings.encode_embeddings(result, encoding)
                 }
             })
         
-        # Prepare metadata for content_router
-        metadata = {
-            'artifact_id': file_id,
-            'user_id': user_id,
-            'twin_id': twin_id,
-            'name': data.get('fileName', 'image.jpg'),
-            'contentType': content_type,
-            'uploadedAt': data.get('uploadedAt')
-        }
-        
-        # Process options
-        options = {
-            'extract_text': False,
-            'analyze_content': True,
-            'generate_embeddings': True
-        }
-        
-        logger.info("🚀 Calling content_router.route_content...")
-        logger.info(f"📋 Metadata: {metadata}")
-        logger.info(f"⚙️ Options: {options}")
-        
-        # Call the real content router
-        result = route_content(
-            file_path=temp_file_path,
-            content_type=content_type,
-            options=options,
-            metadata=metadata
-        )
-        
-        logger.info(f"✅ content_router result: {json.dumps(result, indent=2, default=str)}")
-        
-        # Clean up temp file
-        os.unlink(temp_file_path)
-        
-        # Return the result
+    except (detectors.UnknownDetector, uploads.InvalidUpload) as e:
+        if upload is not None:
+            upload.cleanup()
         return jsonify({
-            "result": {
-                "success": True,
-                "data": result
-            }
-        })
-        
+            "result": {"success": False, "error": str(e)}
+        }), 400
+
+    except RequestEntityTooLarge as e:
+        logger.warning(f"⚠️ Upload rejected: {e.description}")
+        return jsonify({
+            "result": {"success": False, "error": e.description}
+        }), 413
+
     except Exception as e:
+        if upload is not None:
+            upload.cleanup()
         logger.error(f"❌ Error processing artifact: {str(e)}")
         import traceback
         logger.error(f"❌ Traceback: {traceback.format_exc()}")
@@ -187,9 +234,85 @@ def process_artifact():
             }
         }), 500
 
+def defer_item(item, error):
+    """Park a batch item whose backend is down, like a deferred /process-artifact"""
+    return jobs.defer(item, error=str(error), **error.kwargs)
+
+def batch_defer():
+    """defer_item, unless jobs are off (items are then reported deferred without a job)"""
+    return defer_item if serving.jobs_enabled() else None
+
+@app.route('/process-artifacts', methods=['POST'])
+def process_artifacts():
+    """Process many artifacts in one request, running items in parallel"""
+    started = time.time()
+    encoding = embedding_encoding()
+    data = request.get_json()
+    try:
+        items = batch.expand_items(data)
+        concurrency = batch.parse_concurrency(
+            request.args.get('concurrency') or (data.get('concurrency') if isinstance(data, dict) else None),
+            BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY
+        )
+    except ValueError as e:
+        return jsonify({
+            "result": {"success": False, "error": str(e)}
+        }), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({
+            "result": {"success": False, "error": f"Too many items ({len(items)} > {BATCH_MAX_ITEMS})"}
+        }), 413
+
+    logger.info(f"📦 Received batch of {len(items)} artifacts")
+
+    if request.args.get('stream', 'false').lower() == 'true':
+        # NDJSON: one line per item as it finishes, then a summary line
+        def generate():
+            results = []
+            for item_result in batch.run_batch(items, pipeline.process_artifact, concurrency, batch_defer()):
+                results.append(item_result)
+                yield json.dumps(embeddings.encode_embeddings(item_result, encoding), default=str) + "\n"
+            yield json.dumps({"summary": batch.summarize(results, started)}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    results = sorted(
+        batch.run_batch(items, pipeline.process_artifact, concurrency, batch_defer()),
+        key=lambda r: r['index']
+    )
+    summary = batch.summarize(results, started)
+    logger.info(f"✅ Batch finished: {summary}")
+    with stage('serialize'):
+        return jsonify({
+            "result": {
+                "success": summary['succeeded'] == summary['total'],
+                "summary": summary,
+                "items": embeddings.encode_embeddings(results, encoding)
+            }
+        })
+
+@app.route('/cache', methods=['GET'])
+def cache_stats():
+    """Result cache hit/miss counters and sizes"""
+    return jsonify(pipeline.cache_stats())
+
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    """Queue depth, worker usage and average per-job timings"""
+    return jsonify(jobs.stats())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status (and result, once finished) of a queued job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(embeddings.encode_embeddings(job.to_dict(), embedding_encoding()))
+
 if __name__ == '__main__':
     logger.info("🚀 Starting local artifact processor with real content_router...")
     logger.info("🌐 Will listen on http://localhost:8080")
     logger.info("🔧 Using real content_router with Firebase updates")
     
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    # SERVE_MODE=production runs pre-forked gunicorn workers instead of the dev server
+    serving.run(app, port=8080)
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""
+Shared building blocks for the screenshot service.
+
+screenshot_service.py is a plain script; the browser pool and anything
+else it needs to share with the capture scripts lives in this package.
+"""
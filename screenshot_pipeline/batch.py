@@ -0,0 +1,237 @@
+"""
+Screenshot a matrix of URLs x viewport/device profiles in one call.
+
+A request names the URLs directly ('urls') and/or as a glob of repo files
+served by the static server ('pages': 'pages/*.html' under 'baseUrl').
+Every URL is captured with every profile. Captures run concurrently on
+the browser pool, at most `concurrency` at a time so a big batch doesn't
+sit in the pool's queue until it times out. Results come back in
+completion order, so callers can stream them.
+
+Captures whose page hasn't changed since it was last captured the same
+way are answered from the screenshot cache (cache.py) first, without
+taking a browser.
+
+With 'outputDir' the images are written there as
+<host>-<page>--<profile>.png (.jpg/.webp for other formats) and results
+carry the path; otherwise they carry the image base64-encoded.
+
+Only http(s) URLs are captured, and 'pages' globs must stay inside the
+repo, so a request can't render arbitrary local files.
+"""
+
+import os
+import re
+import glob
+import time
+import base64
+import logging
+import concurrent.futures
+from urllib.parse import urlsplit
+
+from screenshot_pipeline import capture, readiness
+from screenshot_pipeline.cache import cache, cache_key
+from screenshot_pipeline.pool import pool
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCREENSHOT_BASE_URL = os.environ.get('SCREENSHOT_BASE_URL', 'http://localhost:8080').rstrip('/')
+SCREENSHOT_BATCH_MAX = int(os.environ.get('SCREENSHOT_BATCH_MAX', '500'))
+# outputDir must be inside this directory
+SCREENSHOT_OUTPUT_ROOT = os.path.abspath(os.environ.get('SCREENSHOT_OUTPUT_ROOT', REPO_DIR))
+
+DEFAULT_PROFILES = ('desktop', 'mobile')
+FINGERPRINT_WORKERS = 8
+
+
+def expand_urls(data):
+    """The request's 'urls' plus its 'pages' glob(s) turned into URLs
+
+    URLs must be http(s) and pages must resolve to files inside the repo;
+    raises ValueError otherwise.
+    """
+    urls = list(data.get('urls') or [])
+    patterns = data.get('pages') or []
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    base_url = (data.get('baseUrl') or SCREENSHOT_BASE_URL).rstrip('/')
+    for pattern in patterns:
+        # Checked before globbing, so '/**' doesn't walk the whole disk first
+        if not isinstance(pattern, str) or os.path.isabs(pattern) or '..' in re.split(r'[\\/]', pattern):
+            raise ValueError(f"'{pattern}' must be a pattern relative to the repo")
+        matches = sorted(glob.glob(os.path.join(REPO_DIR, pattern), recursive=True))
+        if not matches:
+            raise ValueError(f"No files match '{pattern}'")
+        for path in matches:
+            resolved = os.path.realpath(path)
+            if os.path.commonpath([resolved, os.path.realpath(REPO_DIR)]) != os.path.realpath(REPO_DIR):
+                raise ValueError(f"'{pattern}' matches files outside the repo")
+            urls.append(f"{base_url}/{os.path.relpath(path, REPO_DIR).replace(os.sep, '/')}")
+    for url in urls:
+        check_url(url)
+    return urls
+
+
+def check_url(url):
+    """Raise ValueError unless url is an http(s) URL"""
+    parts = urlsplit(url) if isinstance(url, str) else None
+    if parts is None or parts.scheme not in ('http', 'https') or not parts.netloc:
+        raise ValueError(f"Only http(s) URLs can be captured, not {url!r}")
+
+
+def expand_jobs(data):
+    """One job per (url, profile), profiles validated up front"""
+    profiles = data.get('profiles') or list(DEFAULT_PROFILES)
+    for profile in profiles:
+        capture.resolve_profile(profile)
+    return [
+        {'url': url, 'profile': profile}
+        for url in expand_urls(data)
+        for profile in profiles
+    ]
+
+
+def parse_concurrency(value):
+    """A batch's concurrency as an int >= 1, or None for the pool's capacity; raises ValueError"""
+    if value is None:
+        return None
+    try:
+        concurrency = int(value)
+    except (TypeError, ValueError):
+        concurrency = 0
+    if concurrency < 1 or (isinstance(value, float) and value != concurrency):
+        raise ValueError(f"concurrency must be a whole number of at least 1, not {value!r}")
+    return concurrency
+
+
+def output_dir(path):
+    """Absolute outputDir, refusing anything outside SCREENSHOT_OUTPUT_ROOT
+
+    Only validates; run_batch() creates it once the request is accepted.
+    """
+    resolved = os.path.abspath(os.path.join(SCREENSHOT_OUTPUT_ROOT, path))
+    if os.path.commonpath([resolved, SCREENSHOT_OUTPUT_ROOT]) != SCREENSHOT_OUTPUT_ROOT:
+        raise ValueError(f"outputDir must be inside {SCREENSHOT_OUTPUT_ROOT}")
+    return resolved
+
+
+def file_name(url, profile_name, image_format='png'):
+    """http://localhost:8080/pages/dashboard.html + mobile -> localhost-8080-pages-dashboard--mobile.png"""
+    parts = urlsplit(url)
+    path = re.sub(r'\.html?$', '', parts.path.strip('/')) or 'index'
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '-', f"{parts.netloc}/{path}").strip('-')
+    profile_slug = re.sub(r'[^A-Za-z0-9_.-]+', '-', profile_name).strip('-').lower()
+    return f"{slug}--{profile_slug}.{capture.EXTENSIONS[image_format]}"
+
+
+def cache_keys(jobs, wait, full_page, options):
+    """Cache key per job index (None where the page can't be fingerprinted)"""
+    urls = sorted({job['url'] for job in jobs})
+    with concurrent.futures.ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS) as executor:
+        fingerprints = dict(zip(urls, executor.map(cache.fingerprinter.fingerprint, urls)))
+    keys = {}
+    for index, job in enumerate(jobs):
+        fingerprint = fingerprints[job['url']]
+        if fingerprint is not None:
+            keys[index] = cache_key(
+                job['url'], fingerprint, **capture.settings(job['profile'], wait, full_page, options)
+            )
+    return keys
+
+
+def run_batch(jobs, wait=None, full_page=False, options=None, target_dir=None,
+              concurrency=None, timeout=None, use_cache=True):
+    """Capture every job, yielding per-job results as they finish
+
+    Cache hits come first. timeout: give up on the rest if no capture
+    finishes for this many seconds.
+    """
+    concurrency = max(1, concurrency or pool.size * pool.contexts_per_browser)
+    if target_dir:
+        os.makedirs(target_dir, exist_ok=True)
+    wait = wait or readiness.parse({})
+    options = options or capture.image_options({})
+    keys = cache_keys(jobs, wait, full_page, options) if use_cache and cache is not None else {}
+    to_capture = []
+    for index, job in enumerate(jobs):
+        image = cache.get(keys[index]) if index in keys else None
+        if image is None:
+            to_capture.append((index, job))
+            continue
+        yield _result(index, job, time.time(), image=image, target_dir=target_dir,
+                      image_format=options['format'], cached=True)
+
+    logger.info(f"📸 Capturing {len(to_capture)} of {len(jobs)} screenshots ({concurrency} at a time)")
+    pending = iter(to_capture)
+    running = {}
+
+    def start_next():
+        index, job = next(pending, (None, None))
+        if job is not None:
+            future = capture.submit(job['url'], job['profile'], wait, full_page, options)
+            running[future] = (index, job, time.time())
+
+    for _ in range(concurrency):
+        start_next()
+    try:
+        while running:
+            done, _ = concurrent.futures.wait(running, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                # Nothing finished within the timeout: give up on what's left
+                for future, (index, job, started) in list(running.items()):
+                    yield _result(index, job, started, error=f'Timed out after {timeout:.0f}s')
+                for index, job in pending:
+                    yield _result(index, job, time.time(), error='Not started (batch timed out)')
+                return
+            for future in done:
+                index, job, started = running.pop(future)
+                start_next()
+                try:
+                    image, report = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Screenshot of {job['url']} ({job['profile']}) failed: {e}")
+                    yield _result(index, job, started, error=str(e) or type(e).__name__)
+                    continue
+                if index in keys:
+                    cache.put(keys[index], image)
+                yield _result(index, job, started, image=image, target_dir=target_dir,
+                              image_format=options['format'], readiness=report)
+    finally:
+        # Timed out, or a streaming client went away: free the browsers
+        for future in running:
+            future.cancel()
+
+
+def _result(index, job, started, image=None, error=None, target_dir=None, image_format='png', cached=False,
+            readiness=None):
+    profile_name = capture.resolve_profile(job['profile'])[0]
+    result = {'index': index, 'url': job['url'], 'profile': profile_name, 'success': error is None}
+    if error is None:
+        result['cached'] = cached
+    if readiness is not None:
+        result['readiness'] = readiness
+    if error is not None:
+        result['error'] = error
+    elif target_dir:
+        path = os.path.join(target_dir, file_name(job['url'], profile_name, image_format))
+        with open(path, 'wb') as f:
+            f.write(image)
+        result['path'] = path
+        result['bytes'] = len(image)
+    else:
+        result['screenshot'] = base64.b64encode(image).decode('utf-8')
+        result['bytes'] = len(image)
+    result['seconds'] = round(time.time() - started, 3)
+    return result
+
+
+def summarize(results, started):
+    succeeded = sum(1 for r in results if r['success'])
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'seconds': round(time.time() - started, 3)
+    }
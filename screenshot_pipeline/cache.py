@@ -0,0 +1,265 @@
+"""
+Cache of screenshots, keyed by what was captured and what the page is made of.
+
+The key covers the URL, the profile, the wait and image options, and a
+fingerprint of the page content: the HTML plus every same-origin
+script, stylesheet, image and module/@import it references (followed
+recursively). Assets are re-checked with conditional requests
+(If-None-Match / If-Modified-Since), so an unchanged page costs a handful
+of 304s instead of a render, and a CSS edit only re-renders the pages that
+load that stylesheet.
+
+What the fingerprint can't see: data the page fetches at runtime (e.g.
+Firestore) and cross-origin assets. SCREENSHOT_CACHE_TTL bounds how stale
+that can get; cache=false on a request bypasses the cache.
+
+Images live under SCREENSHOT_CACHE_DIR within a SCREENSHOT_CACHE_MB
+budget, least recently used evicted first.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_CACHE_ENABLED = os.environ.get('SCREENSHOT_CACHE_ENABLED', 'true').lower() == 'true'
+SCREENSHOT_CACHE_DIR = os.environ.get('SCREENSHOT_CACHE_DIR', os.path.expanduser('~/.cache/infitwin/screenshots'))
+SCREENSHOT_CACHE_MB = int(os.environ.get('SCREENSHOT_CACHE_MB', '1024'))
+SCREENSHOT_CACHE_TTL = float(os.environ.get('SCREENSHOT_CACHE_TTL', '86400'))
+FINGERPRINT_TIMEOUT = float(os.environ.get('SCREENSHOT_FINGERPRINT_TIMEOUT', '5'))
+FINGERPRINT_MAX_ASSETS = int(os.environ.get('SCREENSHOT_FINGERPRINT_MAX_ASSETS', '300'))
+
+JS_IMPORT = re.compile(r'''(?:\bimport|\bexport)\b[^'"`;]*?\bfrom\s*['"]([^'"]+)['"]|\bimport\s*\(?\s*['"]([^'"]+)['"]''')
+CSS_IMPORT = re.compile(r'''@import\s+(?:url\(\s*)?['"]?([^'")\s;]+)|url\(\s*['"]?([^'")]+?)['"]?\s*\)''')
+
+
+class _References(HTMLParser):
+    """src= of any tag and href= of <link> tags"""
+
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if attrs.get('src'):
+            self.urls.append(attrs['src'])
+        if tag == 'link' and attrs.get('href') and 'preconnect' not in (attrs.get('rel') or ''):
+            self.urls.append(attrs['href'])
+
+
+def _references(url, content_type, body):
+    if 'html' in content_type:
+        parser = _References()
+        parser.feed(body.decode('utf-8', 'replace'))
+        found = parser.urls
+    elif 'css' in content_type or url.endswith('.css'):
+        found = [a or b for a, b in CSS_IMPORT.findall(body.decode('utf-8', 'replace'))]
+    elif 'javascript' in content_type or url.endswith(('.js', '.mjs')):
+        # Only relative specifiers; bare ones ('firebase/auth') come from an import map or CDN
+        found = [a or b for a, b in JS_IMPORT.findall(body.decode('utf-8', 'replace'))]
+        found = [ref for ref in found if ref.startswith(('./', '../', '/'))]
+    else:
+        return []
+    return [urljoin(url, ref.strip()) for ref in found if not ref.startswith(('data:', '#', 'javascript:'))]
+
+
+class Fingerprinter:
+    """Hashes a page and its same-origin assets, revalidating with conditional GETs"""
+
+    def __init__(self, timeout=FINGERPRINT_TIMEOUT, max_assets=FINGERPRINT_MAX_ASSETS):
+        self.timeout = timeout
+        self.max_assets = max_assets
+        self._session = requests.Session()
+        self._validators = {}  # url -> (etag, last_modified, sha256, references)
+        self._lock = threading.Lock()
+        self._counts = {'fetched': 0, 'notModified': 0, 'failed': 0}
+
+    def _check(self, url):
+        """(sha256, references) for one URL"""
+        with self._lock:
+            known = self._validators.get(url)
+        headers = {}
+        if known:
+            if known[0]:
+                headers['If-None-Match'] = known[0]
+            if known[1]:
+                headers['If-Modified-Since'] = known[1]
+        response = self._session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and known:
+            with self._lock:
+                self._counts['notModified'] += 1
+            return known[2], known[3]
+        response.raise_for_status()
+        sha256 = hashlib.sha256(response.content).hexdigest()
+        references = _references(url, response.headers.get('Content-Type', ''), response.content)
+        with self._lock:
+            self._counts['fetched'] += 1
+            self._validators[url] = (
+                response.headers.get('ETag'), response.headers.get('Last-Modified'), sha256, references
+            )
+        return sha256, references
+
+    def fingerprint(self, url):
+        """sha256 over the page and everything it pulls in, or None if it can't be fetched"""
+        url = url.split('#')[0]
+        origin = urlsplit(url)[:2]
+        if origin[0] not in ('http', 'https'):
+            return None
+        hashes, pending, seen = {}, [url], {url}
+        while pending:
+            current = pending.pop()
+            try:
+                sha256, references = self._check(current)
+            except requests.RequestException as e:
+                if current == url:
+                    with self._lock:
+                        self._counts['failed'] += 1
+                    logger.warning(f"⚠️ Could not fingerprint {url}: {e}")
+                    return None
+                # A broken asset renders as broken; that's part of the fingerprint
+                sha256, references = f'error:{getattr(e.response, "status_code", type(e).__name__)}', []
+            hashes[current] = sha256
+            for reference in references:
+                if reference not in seen and urlsplit(reference)[:2] == origin and len(seen) < self.max_assets:
+                    seen.add(reference)
+                    pending.append(reference)
+        digest = hashlib.sha256()
+        for asset_url in sorted(hashes):
+            digest.update(f'{asset_url}\n{hashes[asset_url]}\n'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, 'knownAssets': len(self._validators)}
+
+
+def cache_key(url, fingerprint, **settings):
+    """sha256 over the URL, the content fingerprint and the capture settings"""
+    digest = hashlib.sha256(f'{url}\n{fingerprint}\n'.encode('utf-8'))
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ScreenshotCache:
+    """Image files on disk, least recently used evicted past the budget"""
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024, ttl=SCREENSHOT_CACHE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.fingerprinter = Fingerprinter()
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.img')
+
+    def key(self, url, **settings):
+        """Cache key for a capture, or None if the page can't be fingerprinted"""
+        fingerprint = self.fingerprinter.fingerprint(url)
+        if fingerprint is None:
+            with self._lock:
+                self._counts['bypassed'] += 1
+            return None
+        return cache_key(url, fingerprint, **settings)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            # mtime is when it was captured, atime when it was last served
+            if self.ttl and time.time() - stat.st_mtime > self.ttl:
+                os.unlink(path)
+                with self._lock:
+                    self._bytes -= stat.st_size
+                    self._counts['expired'] += 1
+                    self._counts['misses'] += 1
+                return None
+            with open(path, 'rb') as f:
+                image = f.read()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            with self._lock:
+                self._counts['misses'] += 1
+            return None
+        with self._lock:
+            self._counts['hits'] += 1
+        return image
+
+    def put(self, key, image):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(image)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not cache screenshot {key}: {e}")
+            return
+        with self._lock:
+            self._counts['stores'] += 1
+            self._bytes += len(image) - replaced
+            over_budget = self._bytes > self.max_bytes
+        if over_budget:
+            self._prune()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.img'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_atime, stat.st_size, path
+
+    def _prune(self):
+        # Least recently used first, down to 90% of the budget
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._bytes = total
+            self._counts['evictions'] += evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counts['hits'] + self._counts['misses']
+            return {
+                **self._counts,
+                'hitRate': round(self._counts['hits'] / lookups, 3) if lookups else None,
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'dir': self.directory,
+                'fingerprints': self.fingerprinter.stats(),
+            }
+
+
+cache = ScreenshotCache(
+    SCREENSHOT_CACHE_DIR, max_bytes=SCREENSHOT_CACHE_MB * 1024 * 1024
+) if SCREENSHOT_CACHE_ENABLED else None
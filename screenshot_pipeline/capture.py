@@ -0,0 +1,151 @@
+"""
+One screenshot of one URL with one viewport/device profile.
+
+Both /screenshot and the /screenshots batch go through submit(), which
+runs the capture on the shared browser pool and returns a future.
+
+A profile is a name from PROFILES, any Playwright device name
+('iPhone 12', 'Pixel 5', ...), or a dict:
+{'name': 'tablet', 'width': 768, 'height': 1024} or
+{'name': 'phone', 'device': 'iPhone 12'}.
+
+Images are PNG by default; JPEG and WebP take a quality (1-100). WebP
+isn't offered by page.screenshot(), so it is captured through Chromium's
+DevTools protocol directly. A clip (x, y, width, height in CSS pixels)
+captures just that region.
+
+Before capturing, the page is waited on with a readiness spec
+(readiness.parse(); networkidle + fonts by default) rather than a fixed
+sleep. Captures return (image bytes, readiness report).
+"""
+
+import base64
+import concurrent.futures
+
+from screenshot_pipeline import readiness
+from screenshot_pipeline.pool import pool
+
+CONTENT_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+
+PROFILES = {
+    'desktop': {'width': 1920, 'height': 1080},
+    'mobile': {'device': 'iPhone 12'},
+}
+
+
+def resolve_profile(profile):
+    """(name, context_options, device) for a profile name or dict"""
+    if isinstance(profile, str):
+        name = profile
+        profile = PROFILES.get(profile, {'device': profile})
+    elif isinstance(profile, dict):
+        name = profile.get('name') or profile.get('device') or f"{profile.get('width')}x{profile.get('height')}"
+    else:
+        raise ValueError(f"Invalid profile: {profile!r}")
+
+    if profile.get('device'):
+        return name, None, profile['device']
+    try:
+        viewport = {'width': int(profile['width']), 'height': int(profile['height'])}
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Profile '{name}' needs a device or a width and height")
+    return name, {'viewport': viewport}, None
+
+
+def image_options(source):
+    """{'format', 'quality', 'clip'} from query args or a JSON body; raises ValueError"""
+    image_format = str(source.get('format') or 'png').lower()
+    image_format = 'jpeg' if image_format == 'jpg' else image_format
+    if image_format not in CONTENT_TYPES:
+        raise ValueError(f"Unknown format '{image_format}' (expected png, jpeg or webp)")
+
+    quality = source.get('quality')
+    if quality is not None:
+        if image_format == 'png':
+            raise ValueError("quality only applies to jpeg and webp")
+        try:
+            quality = int(quality)
+        except (TypeError, ValueError):
+            raise ValueError("quality must be a number between 1 and 100")
+        if not 1 <= quality <= 100:
+            raise ValueError("quality must be between 1 and 100")
+
+    clip = source.get('clip')
+    if clip:
+        try:
+            if isinstance(clip, str):
+                x, y, width, height = (float(v) for v in clip.split(','))
+            else:
+                x, y, width, height = (float(clip[k]) for k in ('x', 'y', 'width', 'height'))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("clip must be x,y,width,height")
+        if width <= 0 or height <= 0:
+            raise ValueError("clip width and height must be positive")
+        clip = {'x': x, 'y': y, 'width': width, 'height': height}
+    return {'format': image_format, 'quality': quality, 'clip': clip or None}
+
+
+async def screenshot(page, full_page=False, image_format='png', quality=None, clip=None):
+    """Encoded screenshot bytes of the page as it is now"""
+    if image_format != 'webp':
+        return await page.screenshot(full_page=full_page, type=image_format, quality=quality, clip=clip)
+
+    session = await page.context.new_cdp_session(page)
+    try:
+        params = {'format': 'webp', 'captureBeyondViewport': full_page}
+        if quality is not None:
+            params['quality'] = quality
+        if clip is None and full_page:
+            size = (await session.send('Page.getLayoutMetrics'))['cssContentSize']
+            clip = {'x': 0, 'y': 0, 'width': size['width'], 'height': size['height']}
+        if clip is not None:
+            params['clip'] = {**clip, 'scale': 1}
+        data = await session.send('Page.captureScreenshot', params)
+    finally:
+        await session.detach()
+    return base64.b64decode(data['data'])
+
+
+def settings(profile, wait=None, full_page=False, options=None):
+    """Everything besides the URL that shapes the image (for cache keys)"""
+    _, context_options, device = resolve_profile(profile)
+    return {
+        'contextOptions': context_options,
+        'device': device,
+        'wait': wait or readiness.parse({}),
+        'fullPage': bool(full_page),
+        'image': options or image_options({}),
+    }
+
+
+def submit(url, profile, wait=None, full_page=False, options=None):
+    """Capture url on the pool; returns a concurrent.futures.Future of (image, report)
+
+    wait comes from readiness.parse() and options from image_options()
+    (defaults: networkidle + fonts, PNG of the whole viewport).
+    """
+    _, context_options, device = resolve_profile(profile)
+    wait = wait or readiness.parse({})
+    options = options or image_options({})
+
+    async def capture(page):
+        watcher = readiness.NetworkWatcher(page) if 'networkidle' in wait['strategies'] else None
+        await page.goto(url)
+        report = await readiness.wait_until_ready(page, wait, watcher)
+        image = await screenshot(
+            page, full_page, options['format'], options['quality'], options['clip']
+        )
+        return image, report
+
+    return pool.submit(capture, context_options, device)
+
+
+def run(url, profile, wait=None, full_page=False, options=None, timeout=None):
+    """submit() and wait; a capture that times out is cancelled"""
+    future = submit(url, profile, wait, full_page, options)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
@@ -0,0 +1,414 @@
+"""
+A warm pool of headless Chromium browsers for the screenshot service.
+
+Launching Chromium costs 1-2 s, so instead of one browser per request the
+service keeps SCREENSHOT_BROWSERS browsers running on one long-lived
+asyncio loop (in its own thread). Each capture gets a fresh browser
+context, so cookies, storage and cache never leak between requests.
+
+- at most SCREENSHOT_CONTEXTS_PER_BROWSER contexts run per browser; extra
+  requests wait up to SCREENSHOT_QUEUE_TIMEOUT seconds, then get PoolBusy
+- a browser is recycled after SCREENSHOT_RECYCLE_USES contexts or once its
+  process tree's RSS passes SCREENSHOT_RECYCLE_RSS_MB: it takes no new
+  work, a replacement is launched, and it's closed when its last capture ends
+- every SCREENSHOT_HEALTH_SECONDS each browser must open and close a
+  context within SCREENSHOT_HEALTH_TIMEOUT; a browser that fails, or
+  disconnects, is replaced
+
+Flask threads call pool.run(coroutine_fn, ...) and block on the result.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import itertools
+import threading
+import concurrent.futures
+
+try:
+    from playwright.async_api import async_playwright
+except ImportError:  # pragma: no cover - optional dependency
+    async_playwright = None
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_BROWSERS = int(os.environ.get('SCREENSHOT_BROWSERS', '2'))
+SCREENSHOT_CONTEXTS_PER_BROWSER = int(os.environ.get('SCREENSHOT_CONTEXTS_PER_BROWSER', '4'))
+SCREENSHOT_QUEUE_TIMEOUT = float(os.environ.get('SCREENSHOT_QUEUE_TIMEOUT', '30'))
+SCREENSHOT_RECYCLE_USES = int(os.environ.get('SCREENSHOT_RECYCLE_USES', '200'))
+SCREENSHOT_RECYCLE_RSS_MB = float(os.environ.get('SCREENSHOT_RECYCLE_RSS_MB', '1024'))
+SCREENSHOT_HEALTH_SECONDS = float(os.environ.get('SCREENSHOT_HEALTH_SECONDS', '30'))
+SCREENSHOT_HEALTH_TIMEOUT = float(os.environ.get('SCREENSHOT_HEALTH_TIMEOUT', '5'))
+SCREENSHOT_LAUNCH_ARGS = os.environ.get('SCREENSHOT_LAUNCH_ARGS', '--disable-dev-shm-usage').split()
+
+READY, RETIRING, CLOSED = 'ready', 'retiring', 'closed'
+
+
+class PoolUnavailable(RuntimeError):
+    """Raised when Playwright is missing or no browser could be launched."""
+
+
+class PoolBusy(RuntimeError):
+    """Raised when no capture slot frees up within the queue timeout."""
+
+    def __init__(self, waited):
+        super().__init__(f"All browsers busy (waited {waited:.1f}s)")
+        self.waited = waited
+
+
+# --- Process tree RSS (Linux /proc) ---------------------------------------
+
+def _child_pids(pid):
+    children = []
+    try:
+        tasks = os.listdir(f'/proc/{pid}/task')
+    except OSError:
+        return children
+    for task in tasks:
+        try:
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                children += [int(p) for p in f.read().split()]
+        except OSError:
+            continue
+    return children
+
+
+def descendant_pids(pid=None):
+    """Every process below pid (default: this one)"""
+    found, pending = set(), [pid or os.getpid()]
+    while pending:
+        for child in _child_pids(pending.pop()):
+            if child not in found:
+                found.add(child)
+                pending.append(child)
+    return found
+
+
+def tree_rss(pid):
+    """RSS in bytes of pid and its descendants, or None if unreadable"""
+    total = 0
+    for p in {pid} | descendant_pids(pid):
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total or None
+
+
+# --- Pool -----------------------------------------------------------------
+
+class PooledBrowser:
+    def __init__(self, browser_id, browser, pid):
+        self.id = browser_id
+        self.browser = browser
+        self.pid = pid  # root Chromium process, None where /proc isn't available
+        self.state = READY
+        self.uses = 0
+        self.active = 0
+        self.launched_at = time.time()
+        self.rss = None
+
+    @property
+    def available(self):
+        return self.state == READY and self.browser.is_connected()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'uses': self.uses,
+            'active': self.active,
+            'ageSeconds': round(time.time() - self.launched_at, 1),
+            'rssMb': round(self.rss / 1024 ** 2, 1) if self.rss else None,
+        }
+
+
+class BrowserPool:
+    def __init__(self, size=SCREENSHOT_BROWSERS, contexts_per_browser=SCREENSHOT_CONTEXTS_PER_BROWSER,
+                 queue_timeout=SCREENSHOT_QUEUE_TIMEOUT, recycle_uses=SCREENSHOT_RECYCLE_USES,
+                 recycle_rss_mb=SCREENSHOT_RECYCLE_RSS_MB, health_seconds=SCREENSHOT_HEALTH_SECONDS,
+                 launch_args=SCREENSHOT_LAUNCH_ARGS):
+        self.size = size
+        self.contexts_per_browser = contexts_per_browser
+        self.queue_timeout = queue_timeout
+        self.recycle_uses = recycle_uses
+        self.recycle_rss = recycle_rss_mb * 1024 ** 2 if recycle_rss_mb else None
+        self.health_seconds = health_seconds
+        self.launch_args = launch_args
+        self.loop = None
+        self.error = None
+        self._playwright = None
+        self._browsers = []
+        self._launching = 0
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+        self._counts = {'captures': 0, 'launched': 0, 'recycled': 0, 'unhealthy': 0, 'busy': 0, 'waiting': 0}
+
+    def start(self):
+        """Start the event loop thread and launch the browsers (non-blocking)"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            if async_playwright is None:
+                self.error = "playwright is not installed (pip install playwright && playwright install chromium)"
+                raise PoolUnavailable(self.error)
+            self._thread = threading.Thread(target=self._run_loop, name='browser-pool', daemon=True)
+            self._thread.start()
+        self._started.wait()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # Created on the loop so they bind to it
+        self._capacity = asyncio.Condition()
+        self._launch_lock = asyncio.Lock()
+        self._playwright_lock = asyncio.Lock()
+        self.loop.create_task(self._warm_up())
+        self._started.set()
+        self.loop.run_forever()
+
+    def run(self, fn, context_options=None, device=None, timeout=None):
+        """Run `await fn(page)` on a fresh context; blocks the calling thread for the result"""
+        future = self.submit(fn, context_options, device)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Stop the capture too, so it gives its slot back
+            future.cancel()
+            raise
+
+    def submit(self, fn, context_options=None, device=None):
+        """Like run() but returns a concurrent.futures.Future"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.capture(fn, context_options, device), self.loop)
+
+    def call(self, coro_fn, timeout=None):
+        """Run any coroutine function on the pool's loop and wait for it"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro_fn(), self.loop).result(timeout)
+
+    async def devices(self):
+        """Playwright's device descriptors ('iPhone 12', 'Pixel 5', ...)"""
+        await self._ensure_playwright()
+        return self._playwright.devices
+
+    async def capture(self, fn, context_options=None, device=None):
+        """Run `await fn(page)` on a fresh context of a pooled browser
+
+        device is a Playwright device name ('iPhone 12'); context_options
+        are applied on top of it.
+        """
+        if device:
+            devices = await self.devices()
+            if device not in devices:
+                raise ValueError(f"Unknown device '{device}'")
+            context_options = {**devices[device], **(context_options or {})}
+        pooled = await self._acquire()
+        context = None
+        try:
+            context = await pooled.browser.new_context(**(context_options or {}))
+            page = await context.new_page()
+            return await fn(page)
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f"⚠️ Closing context on browser {pooled.id} failed: {e}")
+            await self._release(pooled)
+
+    # Everything below runs on self.loop
+
+    async def _ensure_playwright(self):
+        async with self._playwright_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+
+    async def _warm_up(self):
+        try:
+            await self._ensure_playwright()
+            await asyncio.gather(*(self._launch() for _ in range(self.size)))
+            logger.info(f"🌐 Browser pool ready: {self.size} browsers x {self.contexts_per_browser} contexts")
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"❌ Browser pool warm-up failed: {e}")
+        self.loop.create_task(self._health_loop())
+
+    async def _launch(self):
+        """Launch one browser and add it to the pool"""
+        self._launching += 1
+        try:
+            await self._ensure_playwright()
+            async with self._launch_lock:
+                # Launches are serialized so the new Chromium can be told apart:
+                # it's the new process whose parent is the Playwright driver
+                before = descendant_pids()
+                browser = await self._playwright.chromium.launch(args=self.launch_args)
+                drivers = set(_child_pids(os.getpid()))
+                roots = [pid for pid in descendant_pids() - before if _parent_pid(pid) in drivers]
+        finally:
+            self._launching -= 1
+        pooled = PooledBrowser(next(self._ids), browser, roots[0] if len(roots) == 1 else None)
+        browser.on('disconnected', lambda _: self._on_disconnected(pooled))
+        self._browsers.append(pooled)
+        self._counts['launched'] += 1
+        self.error = None
+        logger.info(f"🚀 Browser {pooled.id} launched (pid {pooled.pid})")
+        async with self._capacity:
+            self._capacity.notify_all()
+        return pooled
+
+    def _on_disconnected(self, pooled):
+        if pooled.state in (READY, RETIRING):
+            logger.warning(f"⚠️ Browser {pooled.id} disconnected")
+            self._counts['unhealthy'] += 1
+            self.loop.create_task(self._retire(pooled, replace=True))
+
+    def _pick(self):
+        candidates = [b for b in self._browsers if b.available and b.active < self.contexts_per_browser]
+        return min(candidates, key=lambda b: b.active) if candidates else None
+
+    async def _acquire(self):
+        if not self._browsers and not self._launching and self.error:
+            raise PoolUnavailable(self.error)
+        started = time.monotonic()
+        self._counts['waiting'] += 1
+        try:
+            async with self._capacity:
+                try:
+                    await asyncio.wait_for(
+                        self._capacity.wait_for(lambda: self._pick() is not None),
+                        self.queue_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self._counts['busy'] += 1
+                    if not self._browsers and self.error:
+                        raise PoolUnavailable(self.error)
+                    raise PoolBusy(time.monotonic() - started)
+                pooled = self._pick()
+                pooled.active += 1
+                pooled.uses += 1
+                self._counts['captures'] += 1
+        finally:
+            self._counts['waiting'] -= 1
+        if self.recycle_uses and pooled.uses >= self.recycle_uses:
+            self.loop.create_task(self._retire(pooled, replace=True))
+        return pooled
+
+    async def _release(self, pooled):
+        pooled.active -= 1
+        if pooled.state == RETIRING and pooled.active == 0:
+            await self._close(pooled)
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    async def _retire(self, pooled, replace=False):
+        """Stop giving pooled new work; close it once idle and launch a replacement"""
+        if pooled.state != READY:
+            return
+        pooled.state = RETIRING
+        self._counts['recycled'] += 1
+        logger.info(f"♻️ Recycling browser {pooled.id} after {pooled.uses} uses")
+        if replace:
+            try:
+                await self._launch()
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"❌ Replacement browser failed to launch: {e}")
+        if pooled.active == 0 or not pooled.browser.is_connected():
+            await self._close(pooled)
+
+    async def _close(self, pooled):
+        if pooled.state == CLOSED:
+            return
+        pooled.state = CLOSED
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Closing browser {pooled.id} failed: {e}")
+
+    async def _check(self, pooled):
+        """Open and close a context; update RSS. Returns False if the browser should go"""
+        if not pooled.browser.is_connected():
+            return False
+        try:
+            context = await asyncio.wait_for(pooled.browser.new_context(), SCREENSHOT_HEALTH_TIMEOUT)
+            await asyncio.wait_for(context.close(), SCREENSHOT_HEALTH_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"⚠️ Browser {pooled.id} failed its health check: {e}")
+            return False
+        return True
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_seconds)
+            for pooled in list(self._browsers):
+                if pooled.state != READY:
+                    continue
+                if pooled.pid is not None:
+                    pooled.rss = await self.loop.run_in_executor(None, tree_rss, pooled.pid)
+                if not await self._check(pooled):
+                    self._counts['unhealthy'] += 1
+                    await self._retire(pooled, replace=True)
+                elif self.recycle_rss and pooled.rss and pooled.rss > self.recycle_rss:
+                    logger.info(f"🧠 Browser {pooled.id} at {pooled.rss / 1024 ** 2:.0f} MB RSS")
+                    await self._retire(pooled, replace=True)
+            # Top back up if launches failed earlier
+            missing = self.size - self._launching - sum(1 for b in self._browsers if b.state == READY)
+            for _ in range(max(0, missing)):
+                try:
+                    await self._launch()
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error(f"❌ Browser launch failed: {e}")
+                    break
+
+    def close(self, timeout=10):
+        """Close every browser and stop the loop"""
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            for pooled in list(self._browsers):
+                await self._close(pooled)
+            if self._playwright is not None:
+                await self._playwright.stop()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Browser pool shutdown: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def stats(self):
+        browsers = list(self._browsers)
+        return {
+            'ready': any(b.available for b in browsers),
+            'error': self.error,
+            'size': self.size,
+            'contextsPerBrowser': self.contexts_per_browser,
+            'inFlight': sum(b.active for b in browsers),
+            **self._counts,
+            'browsers': [b.to_dict() for b in browsers],
+        }
+
+
+def _parent_pid(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # comm may contain spaces; ppid is the second field after it
+            return int(f.read().rsplit(')', 1)[1].split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# One pool per process
+pool = BrowserPool()
@@ -0,0 +1,239 @@
+"""
+Wait until a page is ready to capture, instead of sleeping a fixed time.
+
+Strategies, run in order after the page's load event, sharing one
+maxWaitMs budget (SCREENSHOT_MAX_WAIT_MS):
+
+- networkidle: no requests in flight for quietMs (SCREENSHOT_QUIET_MS).
+  Long-lived connections matching SCREENSHOT_IDLE_IGNORE (Firestore's
+  listen channel, event streams) don't count
+- selector:    a CSS selector is visible
+- predicate:   a JS expression is truthy, e.g. window.__appReady
+- fonts:       document.fonts.ready has resolved
+- fixed:       sleep waitFor ms (what every capture used to do)
+
+The default is networkidle then fonts. A request that only gives the old
+waitFor keeps the fixed sleep. Running out of budget doesn't fail the
+capture: the page is captured as it is, and the report says which
+strategies timed out.
+
+Every wait returns a report: {'strategies', 'waitedMs', 'steps': {name:
+ms}, 'timedOut': [names]}.
+
+wait_until_ready() drives a Playwright page (the screenshot service);
+wait_until_ready_sync() drives a Selenium WebDriver (take_screenshot.py,
+capture-screenshot.py), using the Resource Timing API to see network
+activity.
+"""
+
+import os
+import re
+import time
+import asyncio
+
+STRATEGIES = ('networkidle', 'selector', 'predicate', 'fonts', 'fixed')
+DEFAULT_STRATEGIES = ('networkidle', 'fonts')
+
+SCREENSHOT_MAX_WAIT_MS = int(os.environ.get('SCREENSHOT_MAX_WAIT_MS', '10000'))
+SCREENSHOT_QUIET_MS = int(os.environ.get('SCREENSHOT_QUIET_MS', '500'))
+SCREENSHOT_IDLE_IGNORE = re.compile(os.environ.get(
+    'SCREENSHOT_IDLE_IGNORE', r'/Listen/channel|/Write/channel|/sockjs|\.hot-update\.'
+))
+
+POLL_SECONDS = 0.05
+
+VISIBLE_JS = '''
+const el = document.querySelector(arguments[0]);
+return !!el && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+'''
+FONTS_ASYNC_JS = '''
+const done = arguments[arguments.length - 1];
+document.fonts.ready.then(() => done(true));
+'''
+RESOURCE_COUNT_JS = "return performance.getEntriesByType('resource').length"
+
+
+def parse(source):
+    """Readiness spec from query args or a JSON body; raises ValueError"""
+    names = source.get('wait')
+    if isinstance(names, str):
+        names = [name.strip().lower() for name in names.split(',') if name.strip()]
+    names = list(names or [])
+    fixed_ms = source.get('waitFor')
+    if not names:
+        # The old waitFor alone means "sleep this long"
+        names = ['fixed'] if fixed_ms is not None else list(DEFAULT_STRATEGIES)
+    selector = source.get('selector')
+    predicate = source.get('predicate')
+    if selector and 'selector' not in names:
+        names.append('selector')
+    if predicate and 'predicate' not in names:
+        names.append('predicate')
+
+    for name in names:
+        if name not in STRATEGIES:
+            raise ValueError(f"Unknown wait strategy '{name}' (expected {', '.join(STRATEGIES)})")
+    if 'selector' in names and not selector:
+        raise ValueError("wait=selector needs a selector")
+    if 'predicate' in names and not predicate:
+        raise ValueError("wait=predicate needs a predicate")
+    try:
+        spec = {
+            'strategies': names,
+            'maxWaitMs': int(source.get('maxWait', SCREENSHOT_MAX_WAIT_MS)),
+            'quietMs': int(source.get('quietMs', SCREENSHOT_QUIET_MS)),
+            'fixedMs': int(fixed_ms or 0),
+            'selector': selector or None,
+            'predicate': predicate or None,
+        }
+    except (TypeError, ValueError):
+        raise ValueError("maxWait, quietMs and waitFor must be milliseconds")
+    if 'fixed' in names and spec['fixedMs'] <= 0:
+        raise ValueError("wait=fixed needs waitFor (milliseconds)")
+    return spec
+
+
+class _Report:
+    def __init__(self, spec):
+        self.spec = spec
+        self.started = time.monotonic()
+        self.deadline = self.started + spec['maxWaitMs'] / 1000
+        self.steps = {}
+        self.timed_out = []
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def step(self, name, started, ok):
+        self.steps[name] = round((time.monotonic() - started) * 1000)
+        if not ok:
+            self.timed_out.append(name)
+
+    def to_dict(self):
+        return {
+            'strategies': self.spec['strategies'],
+            'waitedMs': round((time.monotonic() - self.started) * 1000),
+            'steps': self.steps,
+            'timedOut': self.timed_out,
+        }
+
+
+# --- Playwright (async) ----------------------------------------------------
+
+class NetworkWatcher:
+    """Counts a page's in-flight requests; attach before page.goto()"""
+
+    def __init__(self, page):
+        self.inflight = set()
+        self.last_change = time.monotonic()
+        page.on('request', self._started)
+        page.on('requestfinished', self._ended)
+        page.on('requestfailed', self._ended)
+
+    def _started(self, request):
+        if not SCREENSHOT_IDLE_IGNORE.search(request.url):
+            self.inflight.add(request)
+            self.last_change = time.monotonic()
+
+    def _ended(self, request):
+        if request in self.inflight:
+            self.inflight.discard(request)
+            self.last_change = time.monotonic()
+
+    async def wait_idle(self, quiet_seconds, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if not self.inflight and now - self.last_change >= quiet_seconds:
+                return True
+            if now >= deadline:
+                return False
+            await asyncio.sleep(POLL_SECONDS)
+
+
+async def wait_until_ready(page, spec, watcher=None):
+    """Run the spec's strategies on a loaded Playwright page; returns the report"""
+    report = _Report(spec)
+    for name in spec['strategies']:
+        started = time.monotonic()
+        timeout = report.remaining()
+        if timeout <= 0:
+            # Playwright treats timeout=0 as "wait forever"
+            report.step(name, started, False)
+            continue
+        ok = True
+        try:
+            if name == 'networkidle':
+                if watcher is not None:
+                    ok = await watcher.wait_idle(spec['quietMs'] / 1000, timeout)
+                else:
+                    await page.wait_for_load_state('networkidle', timeout=timeout * 1000)
+            elif name == 'selector':
+                await page.wait_for_selector(spec['selector'], state='visible', timeout=timeout * 1000)
+            elif name == 'predicate':
+                await page.wait_for_function(spec['predicate'], timeout=timeout * 1000)
+            elif name == 'fonts':
+                await asyncio.wait_for(page.evaluate('document.fonts.ready.then(() => true)'), timeout)
+            elif name == 'fixed':
+                await asyncio.sleep(min(spec['fixedMs'] / 1000, timeout))
+        except Exception as e:
+            # Playwright's TimeoutError, or asyncio's
+            if 'timeout' not in type(e).__name__.lower():
+                raise
+            ok = False
+        report.step(name, started, ok)
+    return report.to_dict()
+
+
+# --- Selenium (sync) -------------------------------------------------------
+
+def _poll(check, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        if check():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_SECONDS)
+
+
+def wait_until_ready_sync(driver, spec):
+    """Run the spec's strategies on a Selenium WebDriver; returns the report"""
+    report = _Report(spec)
+    for name in spec['strategies']:
+        started = time.monotonic()
+        timeout = report.remaining()
+        if timeout <= 0:
+            report.step(name, started, False)
+            continue
+        if name == 'networkidle':
+            # No request events in WebDriver: wait for the load event, then
+            # for the resource count to stop growing for the quiet window
+            state = {'count': -1, 'since': time.monotonic()}
+
+            def idle():
+                if driver.execute_script('return document.readyState') != 'complete':
+                    return False
+                count = driver.execute_script(RESOURCE_COUNT_JS)
+                if count != state['count']:
+                    state['count'], state['since'] = count, time.monotonic()
+                return time.monotonic() - state['since'] >= spec['quietMs'] / 1000
+
+            ok = _poll(idle, timeout)
+        elif name == 'selector':
+            ok = _poll(lambda: driver.execute_script(VISIBLE_JS, spec['selector']), timeout)
+        elif name == 'predicate':
+            ok = _poll(lambda: driver.execute_script(f"return !!({spec['predicate']})"), timeout)
+        elif name == 'fonts':
+            driver.set_script_timeout(timeout)
+            try:
+                ok = bool(driver.execute_async_script(FONTS_ASYNC_JS))
+            except Exception as e:
+                if 'timeout' not in type(e).__name__.lower():
+                    raise
+                ok = False
+        else:
+            time.sleep(min(spec['fixedMs'] / 1000, timeout))
+            ok = True
+        report.step(name, started, ok)
+    return report.to_dict()
@@ -2,90 +2,219 @@
 """
 Screenshot Service for Infitwin Testing
 Based on SCREENSHOT-SERVICE-SETUP.md
+
+Captures run on a warm pool of browsers (screenshot_pipeline/pool.py):
+each request gets a fresh browser context instead of a new Chromium.
 """
 
-from playwright.async_api import async_playwright
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+import os
+import json
+import time
+import atexit
 import base64
-import asyncio
+import concurrent.futures
+import logging
 from datetime import datetime
-import json
+
+from screenshot_pipeline import batch, capture, readiness
+from screenshot_pipeline.cache import cache
+from screenshot_pipeline.pool import pool, PoolBusy, PoolUnavailable
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_TIMEOUT = float(os.environ.get('SCREENSHOT_TIMEOUT', '60'))  # whole capture, seconds
+SCREENSHOT_BATCH_TIMEOUT = float(os.environ.get('SCREENSHOT_BATCH_TIMEOUT', '120'))  # with no progress
 
 app = Flask(__name__)
 
+def wants_binary():
+    """output=binary|json, else binary only if the client asks for an image"""
+    output = request.args.get('output')
+    if output:
+        return output.lower() == 'binary'
+    accept = request.accept_mimetypes
+    best = accept.best_match(['application/json', *capture.CONTENT_TYPES.values()])
+    # */* counts for JSON, so plain curl and existing clients keep getting JSON
+    return best is not None and best.startswith('image/') and accept[best] > accept['application/json']
+
 @app.route('/screenshot', methods=['GET'])
 def take_screenshot():
-    """Take screenshot endpoint"""
+    """Take screenshot endpoint
+
+    format=png|jpeg|webp, quality=1-100 (jpeg/webp), clip=x,y,width,height.
+    output=binary (or an Accept: image/* header) answers with the image
+    bytes instead of base64 inside JSON. Unchanged pages are served from the
+    screenshot cache; cache=false forces a fresh capture.
+
+    Readiness: wait=networkidle,selector,predicate,fonts,fixed (default
+    networkidle,fonts), selector=<css>, predicate=<js expression>,
+    quietMs, maxWait; waitFor=<ms> alone keeps the old fixed sleep.
+    """
     url = request.args.get('url')
     width = int(request.args.get('width', 1200))
     height = int(request.args.get('height', 800))
     mobile = request.args.get('mobile', 'false').lower() == 'true'
     full_page = request.args.get('fullPage', 'false').lower() == 'true'
-    wait_for = request.args.get('waitFor', '2000')  # milliseconds
-    
+
     if not url:
         return jsonify({'success': False, 'error': 'URL parameter required'})
-    
-    async def capture():
-        try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch()
-                
-                if mobile:
-                    context = await browser.new_context(**p.devices['iPhone 12'])
-                else:
-                    context = await browser.new_context(
-                        viewport={'width': width, 'height': height}
-                    )
-                
-                page = await context.new_page()
-                await page.goto(url)
-                await page.wait_for_timeout(int(wait_for))
-                
-                screenshot_bytes = await page.screenshot(full_page=full_page)
-                screenshot_b64 = base64.b64encode(screenshot_bytes).decode('utf-8')
-                
-                await browser.close()
-                
-                return {
-                    'success': True,
-                    'screenshot': screenshot_b64,
-                    'url': url,
-                    'viewport': {'width': width, 'height': height},
-                    'mobile': mobile,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
-    
-    # Run async function
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    result = loop.run_until_complete(capture())
-    loop.close()
-    
-    return jsonify(result)
+    try:
+        batch.check_url(url)
+        options = capture.image_options(request.args)
+        wait = readiness.parse(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    profile = 'mobile' if mobile else {'width': width, 'height': height}
+    key = None
+    if cache is not None and request.args.get('cache', 'true').lower() != 'false':
+        key = cache.key(url, **capture.settings(profile, wait, full_page, options))
+    screenshot_bytes = cache.get(key) if key else None
+    cache_status = 'hit' if screenshot_bytes is not None else ('miss' if key else 'bypass')
+    report = None
+
+    try:
+        if screenshot_bytes is None:
+            screenshot_bytes, report = capture.run(url, profile, wait, full_page, options, timeout=SCREENSHOT_TIMEOUT)
+            if key:
+                cache.put(key, screenshot_bytes)
+    except PoolBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': '5'}
+    except PoolUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except concurrent.futures.TimeoutError:
+        return jsonify({'success': False, 'error': f'Capture timed out after {SCREENSHOT_TIMEOUT:.0f}s'}), 504
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e) or type(e).__name__})
+
+    if wants_binary():
+        # The encoded image goes out as-is: no base64 copy, no JSON string
+        headers = {
+            'Content-Disposition': f'inline; filename="screenshot.{capture.EXTENSIONS[options["format"]]}"',
+            'X-Screenshot-Cache': cache_status
+        }
+        if report is not None:
+            headers['X-Screenshot-Wait-Ms'] = str(report['waitedMs'])
+            headers['X-Screenshot-Ready'] = ','.join(
+                f"{name}={ms}{'(timeout)' if name in report['timedOut'] else ''}"
+                for name, ms in report['steps'].items()
+            )
+        return Response(screenshot_bytes, mimetype=capture.CONTENT_TYPES[options['format']], headers=headers)
+
+    return jsonify({
+        'success': True,
+        'screenshot': base64.b64encode(screenshot_bytes).decode('utf-8'),
+        'format': options['format'],
+        'cached': cache_status == 'hit',
+        'readiness': report,
+        'url': url,
+        'viewport': {'width': width, 'height': height},
+        'mobile': mobile,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/screenshots', methods=['POST'])
+def take_screenshots():
+    """Capture every URL with every viewport/device profile, concurrently
+
+    {"pages": "pages/*.html", "baseUrl": "http://localhost:8080",
+     "urls": [...], "profiles": ["desktop", "mobile", {"name": "tablet", "width": 768, "height": 1024}],
+     "fullPage": false, "wait": "networkidle,fonts", "selector": "#app", "predicate": "window.__appReady",
+     "maxWait": 10000, "quietMs": 500, "format": "png", "quality": 80, "clip": {...},
+     "outputDir": "screenshots/sweep", "concurrency": 8, "cache": true}
+
+    ?stream=true answers NDJSON, one line per capture as it finishes, then a summary line.
+    """
+    started = time.time()
+    data = request.get_json(silent=True) or {}
+    try:
+        jobs = batch.expand_jobs(data)
+        options = capture.image_options(data)
+        wait = readiness.parse(data)
+        concurrency = batch.parse_concurrency(data.get('concurrency'))
+        target_dir = batch.output_dir(data['outputDir']) if data.get('outputDir') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not jobs:
+        return jsonify({'success': False, 'error': 'urls or pages required'}), 400
+    if len(jobs) > batch.SCREENSHOT_BATCH_MAX:
+        return jsonify({
+            'success': False,
+            'error': f'Too many captures ({len(jobs)} > {batch.SCREENSHOT_BATCH_MAX})'
+        }), 413
+
+    try:
+        pool.start()
+    except PoolUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+    results = batch.run_batch(
+        jobs,
+        wait=wait,
+        full_page=bool(data.get('fullPage')),
+        options=options,
+        target_dir=target_dir,
+        concurrency=concurrency,
+        timeout=SCREENSHOT_BATCH_TIMEOUT,
+        use_cache=data.get('cache', True) is not False
+    )
+
+    if request.args.get('stream', 'false').lower() == 'true':
+        def generate():
+            finished = []
+            for result in results:
+                finished.append(result)
+                yield json.dumps(result) + "\n"
+            yield json.dumps({'summary': batch.summarize(finished, started)}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    finished = sorted(results, key=lambda r: r['index'])
+    summary = batch.summarize(finished, started)
+    logger.info(f"📸 Batch finished: {summary}")
+    return jsonify({
+        'success': summary['failed'] == 0,
+        'summary': summary,
+        'outputDir': target_dir,
+        'results': finished
+    })
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'service': 'screenshot-service'})
+    stats = pool.stats()
+    return jsonify({
+        'status': 'healthy' if stats['ready'] else 'degraded',
+        'service': 'screenshot-service',
+        'pool': stats,
+        'cache': cache.stats() if cache is not None else {'enabled': False}
+    })
 
 @app.route('/', methods=['GET'])
 def root():
     """Root endpoint with service info"""
     return jsonify({
         'service': 'Infitwin Screenshot Service',
-        'version': '1.0',
+        'version': '1.1',
         'endpoints': {
             '/screenshot': 'Take screenshots of web pages',
-            '/health': 'Service health check'
+            '/screenshots': 'POST a batch of URLs x viewport/device profiles',
+            '/health': 'Service health check and browser pool status'
         },
-        'usage': 'GET /screenshot?url=<target_url>&width=1200&height=800'
+        'usage': 'GET /screenshot?url=<target_url>&width=1200&height=800[&format=webp&quality=80&output=binary]'
     })
 
 if __name__ == '__main__':
     print("🚀 Starting Infitwin Screenshot Service on port 8081...")
     print("📸 Usage: curl 'http://localhost:8081/screenshot?url=http://localhost:8080/index.html'")
-    app.run(host='0.0.0.0', port=8081, debug=False)
\ No newline at end of file
+    print("📸 Batch: curl -X POST localhost:8081/screenshots -H 'Content-Type: application/json' "
+          "-d '{\"pages\": \"pages/*.html\", \"outputDir\": \"screenshots/sweep\"}'")
+    # Launch the browsers now so the first request doesn't pay for it
+    try:
+        pool.start()
+        atexit.register(pool.close)
+    except PoolUnavailable as e:
+        print(f"⚠️ {e}")
+    app.run(host='0.0.0.0', port=8081, debug=False, threaded=True)
@@ -5,15 +5,25 @@ Simple artifact processor for debugging face detection issue
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import json
+import os
+import hashlib
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+from artifact_pipeline import embeddings, serving
+from artifact_pipeline.mock_backend import MockBackend
+from artifact_pipeline.logs import configure_logging, log_payload
+from artifact_pipeline.metrics import instrument_app
+
+# Set up logging (LOG_FORMAT=json for structured, size-capped output)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# ARTIFACT_BACKEND=mock: realistic latency, failures and faces (see MOCK_* settings)
+mock_backend = MockBackend.from_env() if os.environ.get('ARTIFACT_BACKEND') == 'mock' else None
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS
+instrument_app(app, 'simple-artifact-processor')  # /metrics
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -23,20 +33,28 @@ def health():
         "service": "simple-artifact-processor-debug"
     })
 
+@app.errorhandler(embeddings.UnknownEncoding)
+def unknown_encoding(e):
+    return jsonify({
+        "result": {"success": False, "error": str(e)}
+    }), 400
+
 @app.route('/process-artifact', methods=['POST'])
 def process_artifact():
     """Debug endpoint to capture and log the vectorization request"""
+    # Embedding wire format (?embedding=f32|f16|int8 or Accept: ...; embedding=)
+    encoding = embeddings.negotiate(request.args, request.headers.get('Accept'))
     try:
         logger.info("🚀 Received process-artifact request")
         
         # Log request details
         logger.info(f"📍 Request method: {request.method}")
-        logger.info(f"📍 Request headers: {dict(request.headers)}")
+        log_payload(logger, "📍 Request headers", dict(request.headers))
         logger.info(f"📍 Request content type: {request.content_type}")
         
         # Get request data
         data = request.get_json()
-        logger.info(f"📤 Request payload: {json.dumps(data, indent=2)}")
+        log_payload(logger, "📤 Request payload", data)
         
         if not data:
             logger.error("❌ No JSON data received")
@@ -65,25 +83,28 @@ def process_artifact():
         logger.info("🔬 Simulating face detection processing...")
         
         # Mock face detection result
-        mock_faces = [
-            {
-                "faceId": "face_0",
-                "confidence": 99.5,
-                "boundingBox": {
-                    "Width": 0.23,
-                    "Height": 0.30,
-                    "Left": 0.35,
-                    "Top": 0.20
-                },
-                "landmarks": [],
-                "emotions": [{"Type": "HAPPY", "Confidence": 85.2}],
-                "ageRange": {"Low": 25, "High": 35},
-                "gender": {"Value": "Male", "Confidence": 96.1}
-            }
-        ]
+        if mock_backend is not None:
+            mock_faces = mock_backend.detect(hashlib.sha256(f"{file_id}:{file_url}".encode()).hexdigest())
+        else:
+            mock_faces = [
+                {
+                    "faceId": "face_0",
+                    "confidence": 99.5,
+                    "boundingBox": {
+                        "Width": 0.23,
+                        "Height": 0.30,
+                        "Left": 0.35,
+                        "Top": 0.20
+                    },
+                    "landmarks": [],
+                    "emotions": [{"Type": "HAPPY", "Confidence": 85.2}],
+                    "ageRange": {"Low": 25, "High": 35},
+                    "gender": {"Value": "Male", "Confidence": 96.1}
+                }
+            ]
         
         logger.info(f"🎯 Mock result: Found {len(mock_faces)} faces")
-        logger.info(f"🎯 Face data: {json.dumps(mock_faces, indent=2)}")
+        log_payload(logger, "🎯 Face data", mock_faces)
         
         # Return success response
         response = {
@@ -103,7 +124,7 @@ def process_artifact():
         }
         
         logger.info("✅ Returning success response")
-        return jsonify(response)
+        return jsonify(embeddings.encode_embeddings(response, encoding))
         
     except Exception as e:
         logger.error(f"❌ Error processing request: {str(e)}")
@@ -122,4 +143,5 @@ if __name__ == '__main__':
     logger.info("🌐 Will listen on http://localhost:8080")
     logger.info("🔧 CORS enabled for cross-origin requests")
     
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    # SERVE_MODE=production runs pre-forked gunicorn workers instead of the dev server
+    serving.run(app, port=8080)
\ No newline at end of file
@@ -5,45 +5,82 @@ No deployment needed - runs immediately!
 """
 
 import os
-import sys
-import json
-import time
-import threading
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
-import tempfile
 from datetime import datetime
 
+from artifact_pipeline import breaker, crops, embeddings, pipeline, serving
+from artifact_pipeline.jobs import JobQueue, QueueFull
+from artifact_pipeline.metrics import instrument_app
+
 # Create Flask app with CORS enabled
 app = Flask(__name__)
 CORS(app, origins="*")  # Allow all origins for local testing
+instrument_app(app, 'artifact-processor-local')  # /metrics
+app.register_blueprint(crops.blueprint)  # /faces/<key>.jpg, /thumbnails/<key>.jpg
 
 print("🚀 Starting Simple Local Artifact Processor")
 print("=" * 50)
 
+def process_in_background(data):
+    """Run a webhook payload through the same pipeline as /process-artifact"""
+    result = pipeline.process_artifact(data)
+    print(f"✅ Processed {data.get('fileName')} successfully!")
+    return result
+
+# Fixed worker pool with a bounded queue; a full queue answers 429
+WEBHOOK_RETRY_AFTER = os.environ.get('WEBHOOK_RETRY_AFTER', '5')
+jobs = JobQueue(
+    process_in_background,
+    workers=int(os.environ.get('WEBHOOK_WORKERS', '4')),
+    max_queue=int(os.environ.get('WEBHOOK_QUEUE_SIZE', '50')),
+    name='webhook'
+)
+serving.on_shutdown(jobs.shutdown)
+
+@breaker.on_state_change
+def resume_deferred(name, state):
+    """Jobs deferred while the detection backend was down run again once it's back"""
+    if state == breaker.HALF_OPEN:
+        jobs.requeue_deferred(limit=1)  # the trial call
+    elif state == breaker.CLOSED:
+        jobs.requeue_deferred()
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
+    stats = jobs.stats()
     return jsonify({
         'status': 'healthy',
         'service': 'artifact-processor-local',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'queueDepth': stats['queueDepth'],
+        'activeWorkers': stats['activeWorkers'],
+        'jobs': stats,
+        'breakers': breaker.stats()
     })
 
+@app.errorhandler(embeddings.UnknownEncoding)
+def unknown_encoding(e):
+    return jsonify({'error': str(e), 'status': 'error'}), 400
+
 @app.route('/process-webhook', methods=['POST', 'OPTIONS'])
 def process_webhook():
     """
     Webhook endpoint that mimics the production ArtifactProcessor.
-    Accepts image files and returns mock face extraction data.
+    Queues the image for processing and answers 202 with the job to poll.
     """
     # Handle CORS preflight
     if request.method == 'OPTIONS':
         return '', 204
+    if not serving.jobs_enabled():
+        return jsonify({'error': serving.JOBS_UNAVAILABLE, 'status': 'error'}), 501
     
     try:
         # Get request data
         data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object', 'status': 'error'}), 400
         print(f"\n📥 Received vectorization request for: {data.get('fileName', 'unknown')}")
         
         # Validate required fields
@@ -54,58 +91,25 @@ def process_webhook():
                 'error': f'Missing required fields: {", ".join(missing)}'
             }), 400
         
-        file_id = data['fileId']
         file_name = data['fileName']
-        file_url = data['fileUrl']
-        content_type = data.get('contentType', 'image/jpeg')
         
         # Start processing in background
-        def process_async():
-            time.sleep(2)  # Simulate processing time
-            print(f"✅ Processed {file_name} successfully!")
-        
-        threading.Thread(target=process_async, daemon=True).start()
+        try:
+            job = jobs.submit(data)
+        except QueueFull as e:
+            print(f"⚠️ {e}")
+            return jsonify({
+                'error': str(e),
+                'status': 'busy'
+            }), 429, {'Retry-After': WEBHOOK_RETRY_AFTER}
         
-        # Return immediate response
-        response = {
+        # Faces come from the job once it finishes: poll statusUrl for them
+        print(f"📬 Queued job {job.id} for {file_name}")
+        return jsonify({
             'status': 'processing_started',
-            'fileId': file_id,
-            'message': f'Processing started for {file_name}',
-            'estimatedTime': '2-5 seconds',
-            'success': True,
-            'results': [
-                {
-                    'success': True,
-                    'faces': [
-                        {
-                            'confidence': 0.98,
-                            'boundingBox': {
-                                'x': 120,
-                                'y': 80,
-                                'width': 150,
-                                'height': 180
-                            },
-                            'thumbnail': file_url,  # Use original as thumbnail for demo
-                            'embedding': [0.1] * 512  # Mock 512D vector
-                        },
-                        {
-                            'confidence': 0.95,
-                            'boundingBox': {
-                                'x': 300,
-                                'y': 90,
-                                'width': 140,
-                                'height': 170
-                            },
-                            'thumbnail': file_url,
-                            'embedding': [0.2] * 512
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        print(f"📤 Returning mock face data: {len(response['results'][0]['faces'])} faces")
-        return jsonify(response), 200
+            'jobId': job.id,
+            'statusUrl': f'/jobs/{job.id}'
+        }), 202, {'Location': f'/jobs/{job.id}'}
         
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -114,9 +118,18 @@ def process_webhook():
             'status': 'error'
         }), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status and real processing result of a webhook job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    encoding = embeddings.negotiate(request.args, request.headers.get('Accept'))
+    return jsonify(embeddings.encode_embeddings(job.to_dict(), encoding))
+
 @app.route('/process-artifact', methods=['POST'])
 def process_artifact():
-    """Alternate endpoint for compatibility"""
+    """Alternate endpoint for compatibility (same 202 + jobId response as the webhook)"""
     return process_webhook()
 
 if __name__ == '__main__':
@@ -124,10 +137,11 @@ if __name__ == '__main__':
     print("📍 Endpoints:")
     print("   - http://localhost:8000/health")
     print("   - http://localhost:8000/process-webhook")
+    print("   - http://localhost:8000/jobs/<jobId>")
     print("\n🔧 CORS: Enabled for all origins")
-    print("📊 Mock Response: Returns 2 detected faces per image")
+    print("📊 Responses: 202 with a jobId; GET /jobs/<jobId> for the detected faces")
     print("\n⚡ Starting server on port 8000...")
     print("Press Ctrl+C to stop\n")
     
-    # Run the server
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    # Run the server (SERVE_MODE=production for pre-forked gunicorn workers)
+    serving.run(app, port=8000)
\ No newline at end of file
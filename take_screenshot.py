@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
-import sys
+import argparse
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-import time
 
-if len(sys.argv) != 3:
-    print("Usage: python3 take_screenshot.py <url> <output_file>")
-    sys.exit(1)
+from screenshot_pipeline import readiness
 
-url = sys.argv[1]
-output_file = sys.argv[2]
+parser = argparse.ArgumentParser(description='Screenshot a page once it is ready')
+parser.add_argument('url')
+parser.add_argument('output_file')
+parser.add_argument('--wait', help='readiness strategies (default: networkidle,fonts)')
+parser.add_argument('--selector', help='wait until this CSS selector is visible')
+parser.add_argument('--predicate', help='wait until this JS expression is truthy, e.g. window.__appReady')
+parser.add_argument('--max-wait', type=int, help='give up waiting after this many ms (default 10000)')
+args = parser.parse_args()
+
+url = args.url
+output_file = args.output_file
+wait = readiness.parse({
+    key: value for key, value in (
+        ('wait', args.wait), ('selector', args.selector),
+        ('predicate', args.predicate), ('maxWait', args.max_wait)
+    ) if value is not None
+})
 
 # Set up Chrome options
 chrome_options = Options()
@@ -25,8 +37,10 @@ try:
     # Load the page
     driver.get(url)
     
-    # Wait for page to load
-    time.sleep(3)
+    # Wait until the page is ready rather than a fixed 3 s
+    report = readiness.wait_until_ready_sync(driver, wait)
+    print(f"Page ready after {report['waitedMs']} ms {report['steps']}"
+          + (f" (timed out: {', '.join(report['timedOut'])})" if report['timedOut'] else ""))
     
     # Take screenshot
     driver.save_screenshot(output_file)
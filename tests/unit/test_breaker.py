@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker state change tests (run with pytest from the repo root)
+"""
+
+import time
+
+import pytest
+
+from artifact_pipeline import breaker as breakers
+from artifact_pipeline.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+@pytest.fixture
+def changes(monkeypatch):
+    seen = []
+    monkeypatch.setattr(breakers, '_listeners', [])
+    breakers.on_state_change(lambda name, state: seen.append((name, state)))
+    return seen
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+def fail(breaker, seconds=0.1):
+    breaker.allow()
+    breaker.record(seconds, failed=True)
+
+
+def test_consecutive_failures_open_the_breaker(changes):
+    breaker = CircuitBreaker('test', consecutive_failures=3, min_calls=100, open_seconds=60)
+    fail(breaker)
+    fail(breaker)
+    assert breaker.state == CLOSED
+
+    fail(breaker)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.allow()
+    assert 0 < raised.value.retry_after <= 60
+    assert breaker.stats()['rejected'] == 1
+    wait_for(lambda: changes == [('test', OPEN)])
+
+
+def test_failure_rate_opens_the_breaker():
+    breaker = CircuitBreaker('test', window=4, min_calls=4, failure_rate=0.5, consecutive_failures=100)
+    for failed in (True, False, False):
+        breaker.allow()
+        breaker.record(0.1, failed=failed)
+    assert breaker.state == CLOSED
+
+    fail(breaker)
+
+    assert breaker.state == OPEN
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker('test', consecutive_failures=2, slow_seconds=1)
+    for _ in range(2):
+        breaker.allow()
+        breaker.record(5)
+
+    assert breaker.state == OPEN
+    assert breaker.stats()['slowCalls'] == 2
+
+
+def test_half_open_trial_success_closes(changes):
+    breaker = CircuitBreaker('test', consecutive_failures=1, open_seconds=0.05)
+    fail(breaker)
+    wait_for(lambda: breaker.state == HALF_OPEN)
+
+    breaker.allow()
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record(0.1)
+
+    assert breaker.state == CLOSED
+    wait_for(lambda: changes == [('test', OPEN), ('test', HALF_OPEN), ('test', CLOSED)])
+
+
+def test_half_open_trial_failure_opens_again():
+    breaker = CircuitBreaker('test', consecutive_failures=1, open_seconds=0.05)
+    fail(breaker)
+    wait_for(lambda: breaker.state == HALF_OPEN)
+
+    fail(breaker)
+
+    assert breaker.state == OPEN
+    assert breaker.stats()['opened'] == 2
+
+
+def test_release_frees_the_trial_call():
+    breaker = CircuitBreaker('test', consecutive_failures=1, open_seconds=0.05)
+    fail(breaker)
+    wait_for(lambda: breaker.state == HALF_OPEN)
+
+    breaker.allow()
+    breaker.release()
+    breaker.allow()
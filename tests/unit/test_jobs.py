@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+JobQueue tests: deferral and re-queueing (run with pytest from the repo root)
+"""
+
+import time
+
+import pytest
+
+from artifact_pipeline.jobs import Deferred, JobQueue, QueueFull
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class Backend:
+    """Handler that defers until it is marked up"""
+
+    def __init__(self):
+        self.up = False
+        self.calls = []
+
+    def __call__(self, payload, upload=None):
+        self.calls.append((payload['fileId'], upload))
+        if not self.up:
+            raise Deferred("backend down", retry_after=5, upload='scratch')
+        return {'fileId': payload['fileId']}
+
+
+@pytest.fixture
+def backend():
+    return Backend()
+
+
+@pytest.fixture
+def jobs(backend):
+    queue = JobQueue(backend, workers=1, max_queue=10, name='test-jobs')
+    yield queue
+    queue.shutdown(timeout=1)
+
+
+def test_deferred_job_is_parked_with_its_error(jobs):
+    job = jobs.submit({'fileId': 'f1'})
+    wait_for(lambda: job.status == 'deferred')
+
+    assert job.to_dict()['result'] == {'success': False, 'status': 'deferred', 'error': 'backend down'}
+    stats = jobs.stats()
+    assert stats['deferredJobs'] == 1
+    assert stats['jobs']['deferred'] == 1
+    # A deferral isn't a finished job
+    assert stats['avgRunSeconds'] is None
+
+
+def test_requeue_runs_with_the_deferred_kwargs_and_clears_the_error(jobs, backend):
+    job = jobs.submit({'fileId': 'f1'})
+    wait_for(lambda: job.status == 'deferred')
+
+    backend.up = True
+    assert jobs.requeue_deferred() == 1
+    wait_for(lambda: job.status == 'completed')
+
+    assert backend.calls == [('f1', None), ('f1', 'scratch')]
+    assert job.error is None
+    assert job.result == {'fileId': 'f1'}
+    stats = jobs.stats()
+    assert stats['deferredJobs'] == 0
+    assert stats['jobs']['requeued'] == 1
+    assert stats['jobs']['completed'] == 1
+
+
+def test_requeue_limit_moves_oldest_first(jobs, backend):
+    first = jobs.defer({'fileId': 'f1'}, error='down')
+    second = jobs.defer({'fileId': 'f2'}, error='down')
+    backend.up = True
+
+    assert jobs.requeue_deferred(limit=1) == 1
+    wait_for(lambda: first.status == 'completed')
+
+    assert second.status == 'deferred'
+    assert jobs.stats()['deferredJobs'] == 1
+
+
+def test_unlimited_requeue_drains_every_parked_job(jobs, backend):
+    parked = [jobs.defer({'fileId': f'f{i}'}) for i in range(3)]
+    backend.up = True
+
+    jobs.requeue_deferred()
+    wait_for(lambda: all(job.status == 'completed' for job in parked))
+
+    assert jobs.stats()['deferredJobs'] == 0
+
+
+def test_defer_is_bounded(backend):
+    queue = JobQueue(backend, workers=1, max_deferred=1)
+    queue.defer({'fileId': 'f1'})
+
+    with pytest.raises(QueueFull):
+        queue.defer({'fileId': 'f2'})
+    assert queue.stats()['jobs']['rejected'] == 1
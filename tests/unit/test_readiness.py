@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Screenshot readiness spec parsing tests (run with pytest from the repo root)
+"""
+
+import pytest
+
+from screenshot_pipeline import readiness
+
+
+def test_defaults():
+    spec = readiness.parse({})
+
+    assert spec['strategies'] == list(readiness.DEFAULT_STRATEGIES)
+    assert spec['maxWaitMs'] == readiness.SCREENSHOT_MAX_WAIT_MS
+    assert spec['fixedMs'] == 0
+
+
+def test_wait_for_alone_keeps_the_fixed_sleep():
+    spec = readiness.parse({'waitFor': '3000'})
+
+    assert spec['strategies'] == ['fixed']
+    assert spec['fixedMs'] == 3000
+
+
+def test_comma_separated_names_from_query_args():
+    spec = readiness.parse({'wait': ' NetworkIdle, fonts ,', 'maxWait': '2000', 'quietMs': '250'})
+
+    assert spec['strategies'] == ['networkidle', 'fonts']
+    assert (spec['maxWaitMs'], spec['quietMs']) == (2000, 250)
+
+
+def test_selector_and_predicate_add_their_strategies():
+    spec = readiness.parse({'wait': ['fonts'], 'selector': '#app', 'predicate': 'window.__appReady'})
+
+    assert spec['strategies'] == ['fonts', 'selector', 'predicate']
+    assert spec['selector'] == '#app'
+    assert spec['predicate'] == 'window.__appReady'
+
+
+@pytest.mark.parametrize('source, message', [
+    ({'wait': 'sleep'}, "Unknown wait strategy 'sleep'"),
+    ({'wait': 'selector'}, 'needs a selector'),
+    ({'wait': 'predicate'}, 'needs a predicate'),
+    ({'wait': 'fixed'}, 'needs waitFor'),
+    ({'maxWait': 'soon'}, 'must be milliseconds'),
+])
+def test_invalid_specs(source, message):
+    with pytest.raises(ValueError, match=message):
+        readiness.parse(source)
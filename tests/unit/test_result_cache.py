@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Result cache tests for the artifact pipeline (run with pytest from the repo root)
+"""
+
+import io
+import base64
+
+import pytest
+from PIL import Image
+
+from artifact_pipeline import crops, detectors, pipeline
+from artifact_pipeline.cache import ResultCache
+
+
+@pytest.fixture
+def mock_backend(monkeypatch, tmp_path):
+    backend = detectors.MockDetector(latency_median_ms=1, faces='1')
+    monkeypatch.setitem(detectors._instances, 'mock', backend)
+    monkeypatch.setattr(crops, 'store', crops.CropStore(str(tmp_path / 'crops')))
+    monkeypatch.setattr(pipeline, 'result_cache', ResultCache(disk_dir=None))
+    return backend
+
+
+def payload(file_id, user_id='u1'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 80)).save(buffer, 'JPEG')
+    return {
+        'fileId': file_id,
+        'userId': user_id,
+        'twinId': 't1',
+        'detector': 'mock',
+        'imageData': base64.b64encode(buffer.getvalue()).decode('utf-8'),
+    }
+
+
+def test_same_bytes_under_another_file_id_is_a_hit_with_its_own_id(mock_backend):
+    first = pipeline.process_artifact(payload('f1'))
+    second = pipeline.process_artifact(payload('f2'))
+
+    assert first['analysis']['metadata']['artifact_id'] == 'f1'
+    assert second['analysis']['metadata']['artifact_id'] == 'f2'
+    assert second['analysis']['faces'] == first['analysis']['faces']
+    assert mock_backend.stats()['calls'] == 1
+    assert pipeline.result_cache.stats()['memoryHits'] == 1
+
+
+def test_hit_does_not_change_the_cached_entry(mock_backend):
+    pipeline.process_artifact(payload('f1'))
+    pipeline.process_artifact(payload('f2'))
+    third = pipeline.process_artifact(payload('f1'))
+
+    assert third['analysis']['metadata']['artifact_id'] == 'f1'
+    assert mock_backend.stats()['calls'] == 1
+
+
+def test_no_cache_goes_to_the_backend(mock_backend):
+    pipeline.process_artifact(payload('f1'))
+    pipeline.process_artifact({**payload('f1'), 'noCache': True})
+
+    assert mock_backend.stats()['calls'] == 2
+
+
+def test_with_owner_only_replaces_fields_the_result_has():
+    result = {'analysis': {'metadata': {'artifact_id': 'f1', 'user_id': 'u1', 'processed_by': 'x'}}}
+
+    relabelled = pipeline.with_owner(result, {'fileId': 'f2', 'userId': 'u2', 'twinId': 't2'})
+
+    assert relabelled['analysis']['metadata'] == {'artifact_id': 'f2', 'user_id': 'u2', 'processed_by': 'x'}
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+SingleFlight coalescing tests (run with pytest from the repo root)
+"""
+
+import threading
+import concurrent.futures
+
+import pytest
+
+from artifact_pipeline.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        release.wait(5)
+        return 'faces'
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, 'f1', work)
+        while flight.stats()['inFlight'] == 0:
+            pass
+        followers = [pool.submit(flight.do, 'f1', work) for _ in range(3)]
+        while flight.stats()['coalesced'] < 3:
+            pass
+        release.set()
+
+        assert leader.result() == ('faces', False)
+        assert [f.result() for f in followers] == [('faces', True)] * 3
+    assert len(runs) == 1
+    assert flight.stats() == {'leaders': 1, 'coalesced': 3, 'inFlight': 0}
+
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        raise RuntimeError('backend down')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'f1', work)
+        while flight.stats()['inFlight'] == 0:
+            pass
+        follower = pool.submit(flight.do, 'f1', work)
+        while flight.stats()['coalesced'] == 0:
+            pass
+        release.set()
+
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match='backend down'):
+                future.result()
+
+
+def test_finished_keys_run_again():
+    flight = SingleFlight()
+
+    assert flight.do('f1', lambda: 1) == (1, False)
+    assert flight.do('f1', lambda: 2) == (2, False)
+    assert flight.do('f2', lambda: 3) == (3, False)
+    assert flight.stats()['leaders'] == 3